@@ -0,0 +1,93 @@
+'''
+Benchmark of the auction pivot kernel against the previous pandas implementation.
+
+Builds a year of synthetic EAC auction records (six FR products per EFA block,
+or two BR products per settlement period with --service br), with UTC delivery
+starts spanning both clock changes and a share of duplicated records. Each
+implementation pivots the records to price and volume time series (best of
+--repeat runs), and the two outputs are checked for equality.
+
+Usage:
+    python benchmarks/bench_auction_pivot.py --days 365 --repeat 5 --service fr
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from frcast.data.preprocessing import pivot_auction_results
+
+SERVICES = {'fr': (['DCL', 'DCH', 'DML', 'DMH', 'DRL', 'DRH'], '4h'),
+            'br': (['PBR', 'NBR'], '30min')}
+
+
+def make_auction_records(n_days=365, service='fr', duplicate_share=0.01, seed=0):
+    '''Random auction results with UTC delivery starts on the London-local grid of the service'''
+    rng = np.random.default_rng(seed)
+    products, freq = SERVICES[service]
+    local_starts = pd.date_range('2024-12-31 23:00', periods=n_days*pd.Timedelta('1D')//pd.Timedelta(freq), freq=freq)
+    utc_starts = (local_starts.tz_localize('Europe/London', ambiguous='NaT', nonexistent='NaT')
+                  .dropna().tz_convert('UTC').tz_localize(None))
+    records = pd.DataFrame({'delivery_start': np.repeat(utc_starts.to_numpy(), len(products)),
+                            'auction_product': np.tile(products, len(utc_starts)),
+                            'clearing_price': rng.gamma(2, 2, len(utc_starts)*len(products)).round(2),
+                            'cleared_volume': rng.integers(0, 500, len(utc_starts)*len(products)).astype(float)})
+    records['delivery_end'] = records['delivery_start'] + pd.Timedelta(freq)
+    duplicates = records.sample(frac=duplicate_share, random_state=seed).assign(clearing_price=-1.0)
+    return pd.concat([records, duplicates], ignore_index=True)
+
+
+def reference_pivot(eac_auction_df, extracting_value):
+    '''The previous get_eac_auction_volume_or_price (to_datetime, set_index, unstack)'''
+    service_stacked_df = eac_auction_df.copy()
+    service_stacked_df.delivery_start = pd.to_datetime(service_stacked_df.delivery_start, utc=True).dt.tz_convert('Europe/London').dt.tz_localize(None, nonexistent='shift_forward')
+    service_stacked_df.delivery_end = pd.to_datetime(service_stacked_df.delivery_end, utc=True).dt.tz_convert('Europe/London').dt.tz_localize(None, nonexistent='shift_forward')
+    service_stacked_df.index = service_stacked_df.delivery_start
+    extracting_column = {'price': 'clearing_price', 'volume': 'cleared_volume'}[extracting_value]
+    df_indexed = service_stacked_df[['delivery_start', 'auction_product', extracting_column]].set_index(['delivery_start', 'auction_product'])
+    df_indexed = df_indexed[~df_indexed.index.duplicated(keep='first')]
+    unstacked_df = df_indexed.unstack()
+    unstacked_df.columns = unstacked_df.columns.get_level_values(1)
+    unstacked_df = unstacked_df.rename_axis('delivery_start')
+    unstacked_df.sort_index(inplace=True)
+    unstacked_df.columns = [(col+'_'+extracting_value).lower() for col in unstacked_df.columns]
+    return unstacked_df
+
+
+def best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--service', choices=sorted(SERVICES), default='fr')
+    args = parser.parse_args()
+
+    records = make_auction_records(args.days, args.service)
+    freq = SERVICES[args.service][1]
+    reference_seconds, reference = best_time(lambda: {value: reference_pivot(records, value)
+                                                      for value in ('price', 'volume')}, args.repeat)
+    kernel_seconds, pivoted = best_time(lambda: pivot_auction_results(records, ('price', 'volume'), freq),
+                                        args.repeat)
+    for value in ('price', 'volume'):
+        pd.testing.assert_frame_equal(reference[value], pivoted[value], check_freq=False)
+
+    print(f'{len(records)} {args.service.upper()} records, price and volume (outputs identical)')
+    print(f'{"reference (to_datetime + unstack)":<36} {reference_seconds*1e3:>9.1f} ms')
+    print(f'{"pivot_auction_results":<36} {kernel_seconds*1e3:>9.1f} ms')
+    print(f'{"speedup":<36} {reference_seconds/kernel_seconds:>9.1f} x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+'''
+Benchmark of the feature matrix build (FeatureMatrix) against the previous pd.concat assembly.
+
+The previous build_features_df joined five separately indexed float64/int64
+frames with pd.concat(axis=1), and built the temporal features from an
+object-dtype frame with a per-row apply. reference_build_features_df below
+reproduces it. Both builders run on the synthetic NESO stand-in with a warm
+Parquet cache:
+
+    features  the lag and temporal features and the assembly, with the fetched
+              margins, demand, BR price and FR price inputs computed up front
+    build     the whole build_features_df (including the cached reads), each
+              variant in a fresh subprocess
+
+For each variant the script reports wall time, the tracemalloc peak, the
+process max RSS (build only) and the size of the resulting frame, and checks
+that both produce the same features (to float32 precision). Note that the
+frame pd.concat returns shares the producers' frames, which are allocated
+before the features stage is measured, so its peak leaves them out; the
+matrix path copies them into the matrix, and the producers' frames can then be
+dropped. Most of the build's peak comes from reading the cached records.
+
+Usage:
+    python benchmarks/bench_feature_matrix.py --days 730
+'''
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from frcast.data import neso_api, neso_cache
+from frcast.data.br_price import BR_PRICE_FEATURES, aggregate_br_price
+from frcast.data.feature_matrix import FeatureMatrix
+from frcast.data.fr_prices import create_lag_shifted_df, get_historical_fr_price, get_lag_fetch_periods
+from frcast.data.lag_features import get_lag_feature_names
+from frcast.data.preprocessing import get_temporal_feature_values
+from frcast.data.system_demand import DEMAND_FEATURES, aggregate_demand
+from frcast.data.system_margins import MARGINS_FEATURES, resample_margins
+from frcast.data.time_periods import get_efa_index
+from frcast.data.train_predict_data import PARAMETERS_LAGS, TEMPORAL_FEATURES, build_features_df
+from neso_standin import make_datasets, start_server
+
+
+def reference_temporal_features_df(start_date, end_date, temporal_features):
+    '''Previous create_temporal_features_df (object-dtype frame and a per-row apply)'''
+    efa_index = get_efa_index(start_date, end_date)
+    temporal_features_df = pd.DataFrame(index = efa_index, columns = temporal_features)
+    if('month' in temporal_features):
+        temporal_features_df.loc[:, 'month'] = efa_index.month
+    if('working day' in temporal_features):
+        temporal_features_df.loc[:, 'weekday'] = efa_index.weekday
+        temporal_features_df.loc[:, 'working day'] = temporal_features_df.weekday.apply(lambda x:0 if x<5 else 1)
+        if('weekday' not in temporal_features):
+            temporal_features_df.drop('weekday', axis = 1, inplace = True)
+    return temporal_features_df.astype('int64')
+
+
+def fetch_inputs(start_date, end_date):
+    '''Margins, demand and BR price features, as the producers return them (float64, own indexes)'''
+    return [resample_margins(start_date, end_date), aggregate_demand(start_date, end_date),
+            aggregate_br_price(start_date, end_date)]
+
+
+def reference_features(start_date, end_date, inputs, clearing_price_fr):
+    lag_shifted_df = create_lag_shifted_df(start_date, end_date, PARAMETERS_LAGS, clearing_price_fr)
+    temporal_features_df = reference_temporal_features_df(start_date, end_date, TEMPORAL_FEATURES)
+    return pd.concat(inputs + [lag_shifted_df, temporal_features_df], axis = 1)
+
+
+def matrix_features(start_date, end_date, inputs, clearing_price_fr):
+    efa_index = get_efa_index(start_date, end_date)
+    lag_features = get_lag_feature_names(PARAMETERS_LAGS)
+    matrix = FeatureMatrix(efa_index, MARGINS_FEATURES + DEMAND_FEATURES + BR_PRICE_FEATURES + lag_features,
+                           TEMPORAL_FEATURES)
+    for block in inputs:
+        matrix.write(block)
+    create_lag_shifted_df(start_date, end_date, PARAMETERS_LAGS, clearing_price_fr, out = matrix.view(lag_features))
+    for temporal_feature in TEMPORAL_FEATURES:
+        matrix.write_int(temporal_feature, get_temporal_feature_values(efa_index, temporal_feature))
+    return matrix.to_frame()
+
+
+def reference_build_features_df(start_date, end_date, clearing_price_fr):
+    return reference_features(start_date, end_date, fetch_inputs(start_date, end_date), clearing_price_fr)
+
+
+def measure(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak/2**20, result
+
+
+def run_child(variant, start_date, end_date):
+    '''One full build in this (fresh) process; prints its measurements as JSON'''
+    clearing_price_fr = get_historical_fr_price(*get_lag_fetch_periods(start_date, end_date))
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+    tracemalloc.start()
+    start = time.perf_counter()
+    if(variant == 'reference'):
+        X = reference_build_features_df(start_date, end_date, clearing_price_fr)
+    else:
+        X = build_features_df(start_date, end_date, clearing_price_fr)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(json.dumps({'seconds': seconds, 'peak_mb': peak/2**20, 'frame_mb': X.memory_usage().sum()/2**20,
+                      'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024,
+                      'rss_growth_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024 - rss_before}))
+
+
+def print_row(stage, variant, seconds, peak_mb, frame_mb, rss=''):
+    print(f'{stage:<9} {variant:<10} {seconds:>9.4f} {peak_mb:>12.2f} {frame_mb:>10.2f} {rss:>14}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--end-date', default='2025-12-31')
+    parser.add_argument('--child', choices=['reference', 'matrix'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    end_date = pd.Timestamp(args.end_date)
+    start_date = end_date - pd.Timedelta(days=args.days)
+    if(args.child):
+        return run_child(args.child, start_date, end_date)
+
+    datasets = make_datasets(start_date - pd.Timedelta(days=10), end_date + pd.Timedelta(days=3))
+    server, api_url, _ = start_server(datasets)
+    cache_dir = tempfile.mkdtemp(prefix='frcast-bench-')
+    neso_api.NESO_API_URL, neso_cache.CACHE_DIR = api_url, cache_dir
+    try:
+        clearing_price_fr = get_historical_fr_price(*get_lag_fetch_periods(start_date, end_date))
+        inputs = fetch_inputs(start_date, end_date) # also warms the cache for the children
+        print(f'{"stage":<9} {"variant":<10} {"seconds":>9} {"peak MB":>12} {"frame MB":>10} {"max RSS MB":>14}')
+        results = {}
+        for variant, features in [('reference', reference_features), ('matrix', matrix_features)]:
+            seconds, peak_mb, X = measure(lambda: features(start_date, end_date, inputs, clearing_price_fr))
+            results[variant] = X
+            print_row('features', variant, seconds, peak_mb, X.memory_usage().sum()/2**20)
+        reference, X = results['reference'], results['matrix']
+        assert list(reference.columns) == list(X.columns) and reference.index.equals(X.index)
+        np.testing.assert_array_equal(reference.to_numpy(np.float32), X.to_numpy(np.float32))
+
+        env = {**os.environ, 'NESO_API_URL': api_url, 'FRCAST_CACHE_DIR': cache_dir}
+        for variant in ['reference', 'matrix']:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--days', str(args.days),
+                                     '--end-date', args.end_date, '--child', variant],
+                                    env=env, capture_output=True, text=True, check=True).stdout
+            child = json.loads(output.strip().splitlines()[-1])
+            print_row('build', variant, child['seconds'], child['peak_mb'], child['frame_mb'],
+                      f'{child["max_rss_mb"]:.0f} (+{child["rss_growth_mb"]:.0f})')
+        print(f'{len(X)} EFA blocks x {X.shape[1]} features: same feature values (float32)')
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
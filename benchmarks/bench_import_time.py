@@ -0,0 +1,74 @@
+'''
+Import-time benchmark of the frcast package, and a guard against import regressions.
+
+Each scenario runs in a fresh interpreter (best of --repeat runs) and reports
+the wall time of the import and which heavy dependencies it loaded. Data-only
+scenarios must not load the model stack (mlflow, optuna, xgboost, sklearn);
+the script exits with status 1 when one does, or when a scenario is slower
+than --max-seconds, so it can run as a check in CI or cron.
+
+Usage:
+    python benchmarks/bench_import_time.py --repeat 5 --max-seconds 2
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+HEAVY_MODULES = ['mlflow', 'optuna', 'xgboost', 'sklearn']
+
+# (name, statement, whether the model stack may be loaded)
+SCENARIOS = [
+    ('import frcast', 'import frcast', False),
+    ('frcast.get_efa_index', 'import frcast; frcast.get_efa_index', False),
+    ('frcast.get_historical_fr_price', 'import frcast; frcast.get_historical_fr_price', False),
+    ('frcast.get_train_features_target_df', 'import frcast; frcast.get_train_features_target_df', False),
+    ('frcast.run_xgb_optuna_tuning', 'import frcast; frcast.run_xgb_optuna_tuning', True),
+]
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def time_import(statement, repeat=3):
+    '''Best wall time (seconds) of a statement over fresh interpreters, and the heavy modules it loaded'''
+    results = []
+    env = {**os.environ, 'PYTHONPATH': REPO_ROOT, 'MLFLOW_DISABLE_AGENT_HINT': '1'}
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(statement=statement, heavy=HEAVY_MODULES)],
+                                capture_output=True, text=True, check=True, env=env).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return min(result['seconds'] for result in results), results[-1]['loaded']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help='fail when a data-only scenario takes longer than this')
+    args = parser.parse_args()
+
+    failures = []
+    print(f'{"scenario":<38} {"seconds":>8}  heavy modules loaded')
+    for name, statement, heavy_allowed in SCENARIOS:
+        seconds, loaded = time_import(statement, args.repeat)
+        print(f'{name:<38} {seconds:>8.3f}  {", ".join(loaded) or "-"}')
+        if loaded and not heavy_allowed:
+            failures.append(f'{name} loads {", ".join(loaded)}')
+        if args.max_seconds is not None and not heavy_allowed and seconds > args.max_seconds:
+            failures.append(f'{name} takes {seconds:.3f}s > {args.max_seconds}s')
+
+    for failure in failures:
+        print('REGRESSION:', failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
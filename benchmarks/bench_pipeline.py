@@ -0,0 +1,240 @@
+'''
+End-to-end pipeline benchmark against the synthetic NESO stand-in (no network needed).
+
+Serves synthetic records from benchmarks/neso_standin.py on a local port and
+times every stage of the daily forecast separately:
+
+    fetch           cold-cache download of the four datasets (HTTP + decoding)
+    json_decode     JSON parsing and typed decoding of the same response bodies
+    auction_pivot   get_eac_auction_volume_or_price on the FR and BR records
+    sp_to_efa       aggregate_sp_to_efa of the BR settlement-period prices
+    lag_features    create_lag_shifted_df from the FR prices
+    feature_concat  concatenating the feature blocks
+    features_warm   get_train_features_target_df with a warm cache
+    optuna_trial    one Optuna trial (all CV folds)
+    fit_predict     final XGBoost fit and next-day prediction
+
+Each stage reports its best wall time over --repeat runs, its throughput and
+its peak traced memory (tracemalloc, measured in a separate run so tracing does
+not slow the timings). The data covers the production training window
+(TRAIN_WINDOW_DAYS up to --end-date), which the tuning folds need in full.
+
+Results are compared with a baseline file: a stage more than --time-tolerance
+(default 25%) slower, or --memory-tolerance larger, than its baseline is
+reported. Timings depend on the machine (cores, load, library versions), so the
+comparison is report-only by default. To gate on it, save a baseline on the
+same machine first and pass --fail-on-regression, which exits with status 1 on
+any regression. The baseline is refreshed with --save-baseline.
+
+Usage:
+    python benchmarks/bench_pipeline.py --repeat 3
+    python benchmarks/bench_pipeline.py --save-baseline
+    python benchmarks/bench_pipeline.py --fail-on-regression
+'''
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+import xgboost as xgb
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from frcast.data import neso_api, neso_cache
+from frcast.data.br_price import BR_AUCTION_RESOURCE_ID, BR_AUCTION_SCHEMA, aggregate_br_price
+from frcast.data.fr_prices import FR_AUCTION_RESOURCE_ID, FR_AUCTION_SCHEMA, create_lag_shifted_df
+from frcast.data.preprocessing import (aggregate_sp_to_efa, create_temporal_features_df,
+                                       get_eac_auction_volume_or_price)
+from frcast.data.system_demand import DEMAND_FORECAST_RESOURCE_ID, DEMAND_FORECAST_SCHEMA, aggregate_demand
+from frcast.data.system_margins import MARGINS_RESOURCE_ID, MARGINS_SCHEMA, resample_margins
+from frcast.data.train_predict_data import PARAMETERS_LAGS, TRAIN_WINDOW_DAYS, get_train_features_target_df
+from frcast.model.train import run_xgb_optuna_tuning
+from neso_standin import make_datasets, start_server
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+FETCHES = [(FR_AUCTION_RESOURCE_ID, 'deliveryStart', "\"serviceType\" = 'Response'", FR_AUCTION_SCHEMA),
+           (BR_AUCTION_RESOURCE_ID, 'deliveryStart', "\"serviceType\" = 'Balancing Reserve'", BR_AUCTION_SCHEMA),
+           (DEMAND_FORECAST_RESOURCE_ID, 'TARGETDATE', None, DEMAND_FORECAST_SCHEMA),
+           (MARGINS_RESOURCE_ID, 'Date', None, MARGINS_SCHEMA)]
+
+
+def _snake_case(records):
+    return records.rename(columns=lambda column: ''.join('_' + c.lower() if c.isupper() else c for c in column))
+
+
+class Pipeline:
+    '''Inputs of every stage, computed once up front so each stage is timed on its own'''
+
+    def __init__(self, start_date, end_date):
+        self.start_date, self.end_date = start_date, end_date
+        self.query_start = start_date - pd.Timedelta(days=1)
+        self.query_end = end_date + pd.Timedelta(days=1)
+
+    def fetch(self):
+        return {resource_id: neso_api.fetch_date_range(resource_id, date_column, self.query_start, self.query_end,
+                                                       where, schema=schema)
+                for resource_id, date_column, where, schema in FETCHES}
+
+    def capture_bodies(self):
+        '''Raw response bodies of the same windowed requests the fetch stage makes'''
+        bodies = []
+        for resource_id, date_column, where, schema in FETCHES:
+            for window_start, window_end in neso_api.split_date_range(self.query_start, self.query_end):
+                query = (f'SELECT {neso_api.get_select_clause(schema)} FROM "{resource_id}" '
+                         f'WHERE "{date_column}" >= \'{window_start:%Y-%m-%d}\' '
+                         f'AND "{date_column}" < \'{window_end + pd.Timedelta(days=1):%Y-%m-%d}\' ')
+                if where:
+                    query += f'AND {where}'
+                response = neso_api.get_session().get(f'{neso_api.NESO_API_URL}/datastore_search_sql',
+                                                      params={'sql': query}, timeout=neso_api.TIMEOUT)
+                bodies.append((response.content, schema))
+        return bodies
+
+    def json_decode(self, bodies):
+        return [neso_api.decode_records(json.loads(body)['result']['records'], schema) for body, schema in bodies]
+
+    def auction_pivot(self, fr_records, br_records):
+        return (get_eac_auction_volume_or_price(fr_records, 'price'),
+                get_eac_auction_volume_or_price(br_records, 'price', freq='30min'))
+
+    def feature_blocks(self, clearing_price_fr):
+        return [resample_margins(self.start_date, self.end_date),
+                aggregate_demand(self.start_date, self.end_date),
+                aggregate_br_price(self.start_date, self.end_date),
+                create_lag_shifted_df(self.start_date, self.end_date, PARAMETERS_LAGS, clearing_price_fr),
+                create_temporal_features_df(self.start_date, self.end_date, ['month', 'working day'])]
+
+
+def measure(fn, repeat):
+    '''Best wall time over repeat runs, then the peak traced memory of one more run'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak/2**20, result
+
+
+def run_stages(end_date, repeat):
+    end_date = pd.Timestamp(end_date)
+    start_date = end_date - pd.Timedelta(days=TRAIN_WINDOW_DAYS)
+    datasets = make_datasets(start_date - pd.Timedelta(days=10), end_date + pd.Timedelta(days=3))
+    server, api_url, server_stats = start_server(datasets)
+    neso_api.NESO_API_URL = api_url
+    cache_dir = tempfile.mkdtemp(prefix='frcast-bench-')
+    neso_cache.CACHE_DIR = cache_dir
+    pipeline = Pipeline(start_date, end_date)
+    results = {}
+
+    def record(stage, fn, items, unit):
+        seconds, peak_mb, result = measure(fn, repeat)
+        results[stage] = {'seconds': seconds, 'peak_mb': peak_mb, 'items': items(result), 'unit': unit}
+        return result
+
+    try:
+        fetched = record('fetch', pipeline.fetch, lambda r: sum(len(df) for df in r.values()), 'records')
+        results['fetch']['requests'] = server_stats['requests']//(repeat + 1)
+        bodies = pipeline.capture_bodies()
+        results['fetch']['mb_transferred'] = sum(len(body) for body, _ in bodies)/2**20
+        record('json_decode', lambda: pipeline.json_decode(bodies), lambda r: sum(len(df) for df in r), 'records')
+
+        fr_records = _snake_case(fetched[FR_AUCTION_RESOURCE_ID])
+        br_records = _snake_case(fetched[BR_AUCTION_RESOURCE_ID])
+        clearing_price_fr, clearing_price_br = record('auction_pivot',
+                                                      lambda: pipeline.auction_pivot(fr_records, br_records),
+                                                      lambda r: len(fr_records) + len(br_records), 'records')
+        record('sp_to_efa', lambda: aggregate_sp_to_efa(clearing_price_br, ['min', 'max', 'mean']),
+               lambda r: len(clearing_price_br), 'settlement periods')
+        record('lag_features', lambda: create_lag_shifted_df(start_date, end_date, PARAMETERS_LAGS, clearing_price_fr),
+               len, 'EFA blocks')
+
+        blocks = pipeline.feature_blocks(clearing_price_fr)
+        record('feature_concat', lambda: pd.concat(blocks, axis=1), len, 'EFA blocks')
+        X, y = record('features_warm', lambda: get_train_features_target_df(end_date),
+                      lambda r: len(r[0]), 'EFA blocks')
+
+        record('optuna_trial', lambda: run_xgb_optuna_tuning(X, y, n_trials=1, pruner=None),
+               lambda r: 1, 'trials')
+
+        def fit_predict():
+            model = xgb.XGBRegressor(n_estimators=300, max_depth=6, learning_rate=0.05, random_state=42)
+            model.fit(X.iloc[:-6], y.iloc[:-6])
+            return model.predict(X.iloc[-6:])
+        record('fit_predict', fit_predict, lambda r: len(X), 'rows')
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, time_tolerance, memory_tolerance):
+    '''Print the stage table and return the list of regressions against the baseline'''
+    regressions = []
+    print(f'{"stage":<15} {"seconds":>9} {"throughput":>32} {"peak MB":>9} {"vs baseline":>12}')
+    for stage, result in results.items():
+        rate = result['items']/result['seconds']
+        throughput = f'{rate:,.0f} {result["unit"]}/s' if rate >= 100 else f'{rate:.2f} {result["unit"]}/s'
+        line = f'{stage:<15} {result["seconds"]:>9.3f} {throughput:>32} {result["peak_mb"]:>9.1f}'
+        base = baseline.get(stage)
+        if base:
+            time_ratio = result['seconds']/base['seconds']
+            line += f' {100*(time_ratio - 1):>+11.0f}%'
+            if time_ratio > 1 + time_tolerance:
+                regressions.append(f'{stage} is {100*(time_ratio - 1):.0f}% slower than the baseline')
+            if result['peak_mb'] > base['peak_mb']*(1 + memory_tolerance) + 1:
+                regressions.append(f'{stage} peak memory {result["peak_mb"]:.1f} MB > baseline {base["peak_mb"]:.1f} MB')
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--end-date', default='2025-06-30')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--time-tolerance', type=float, default=0.25)
+    parser.add_argument('--memory-tolerance', type=float, default=0.25)
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='exit with status 1 on a regression (use a baseline saved on this machine)')
+    args = parser.parse_args()
+
+    results = run_stages(args.end_date, args.repeat)
+    machine = {'python': sys.version.split()[0], 'pandas': pd.__version__, 'xgboost': xgb.__version__,
+               'cpus': os.cpu_count()}
+    baseline, baseline_machine = {}, machine
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        baseline = saved['stages']
+        baseline_machine = {key: saved.get(key) for key in machine}
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    fetch = results['fetch']
+    print(f'fetch: {fetch["requests"]} requests, {fetch["mb_transferred"]:.1f} MB per cold pull; '
+          f'max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024:.0f} MB')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'days': TRAIN_WINDOW_DAYS, 'end_date': args.end_date, **machine, 'stages': results},
+                      f, indent=1)
+            f.write('\n')
+        print(f'Baseline saved to {args.baseline}')
+    if baseline_machine != machine:
+        print(f'Note: the baseline was recorded with {baseline_machine}, this run with {machine}')
+    for regression in regressions:
+        print('REGRESSION:', regression)
+    if regressions and not args.fail_on_regression:
+        print('Report only: rerun with --fail-on-regression against a baseline saved on this machine to gate')
+    sys.exit(1 if regressions and args.fail_on_regression else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+'''
+Scaling benchmark of parallel Optuna tuning: trials per minute against worker count.
+
+Runs run_xgb_optuna_tuning on a synthetic EFA-sized feature matrix (one year,
+six EFA blocks a day, 18 features) with pruning disabled so every trial fits
+all folds, once per worker count.
+
+Usage:
+    python benchmarks/bench_tuning_scaling.py --n-trials 20 --workers 1 2 4 8 --fold-workers 1
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from frcast.model.train import get_thread_budget, run_xgb_optuna_tuning
+
+
+def make_feature_matrix(n_days=365, n_features=18, seed=0):
+    '''Random EFA-indexed feature matrix and a target that depends on a few of its columns'''
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2024-06-01 23:00', periods=6*n_days, freq='4h')
+    X = pd.DataFrame(rng.normal(size=(len(index), n_features)), index=index,
+                     columns=[f'feature_{i}' for i in range(n_features)])
+    y = pd.Series(3 + X.iloc[:, :4].sum(axis=1) + rng.normal(scale=0.5, size=len(index)),
+                  index=index, name='dcl_price')
+    return X, y
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-trials', type=int, default=20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--fold-workers', type=int, default=1)
+    args = parser.parse_args()
+
+    X, y = make_feature_matrix()
+    print(f'{"workers":>8} {"fold workers":>13} {"threads/model":>14} {"seconds":>9} {"trials/min":>11}')
+    for n_workers in args.workers:
+        start = time.perf_counter()
+        run_xgb_optuna_tuning(X, y, n_trials=args.n_trials, pruner=None,
+                              n_workers=n_workers, n_fold_workers=args.fold_workers)
+        elapsed = time.perf_counter() - start
+        n_jobs = get_thread_budget(n_workers, args.fold_workers)
+        print(f'{n_workers:>8} {args.fold_workers:>13} {n_jobs:>14} {elapsed:>9.1f} {60*args.n_trials/elapsed:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
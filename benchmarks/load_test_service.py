@@ -0,0 +1,164 @@
+'''
+Load test of the forecast service (frcast/service.py) against the synthetic NESO stand-in.
+
+Serves synthetic records from benchmarks/neso_standin.py, trains a small model
+on them and saves it to a temporary artifact store, then starts the service in
+a subprocess and sends "forecast date D" requests over --concurrency
+keep-alive connections:
+
+    cold    every connection asks for the same few uncached days at once, so
+            concurrent identical requests must share one feature build each
+    warm    --requests requests spread over the same days, served from memory
+
+Each phase reports p50/p99/max latency and requests per second, and the
+service's own counters (feature builds, coalesced and cached requests).
+
+Usage:
+    python benchmarks/load_test_service.py --requests 5000 --concurrency 32
+'''
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_DIR)
+from frcast.data import neso_api, neso_cache
+from frcast.data.train_predict_data import get_train_features_target_df
+from frcast.model.artifacts import save_model_artifact
+from neso_standin import make_datasets, start_server
+
+
+async def _request(reader, writer, path):
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode('latin-1'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    content_length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            content_length = int(value)
+    body = await reader.readexactly(content_length)
+    return status, body
+
+
+async def run_phase(port, paths, concurrency):
+    '''Send the paths over concurrency keep-alive connections; return latencies (s), wall time and failures'''
+    queue = asyncio.Queue()
+    for path in paths:
+        queue.put_nowait(path)
+    latencies, failures = [], []
+
+    async def connection():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            while not queue.empty():
+                path = queue.get_nowait()
+                start = time.perf_counter()
+                status, body = await _request(reader, writer, path)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    failures.append(f'{path}: {status} {body[:200]!r}')
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    return np.array(latencies), time.perf_counter() - start, failures
+
+
+async def get_json(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        return json.loads((await _request(reader, writer, path))[1])
+    finally:
+        writer.close()
+
+
+def report(phase, latencies, seconds):
+    print(f'{phase:<5} {len(latencies):>7} requests  p50 {1e3*np.percentile(latencies, 50):7.2f} ms  '
+          f'p99 {1e3*np.percentile(latencies, 99):7.2f} ms  max {1e3*latencies.max():8.2f} ms  '
+          f'{len(latencies)/seconds:9,.0f} req/s')
+
+
+def train_artifact(train_end_date, artifact_dir):
+    X, y = get_train_features_target_df(train_end_date)
+    model = xgb.XGBRegressor(n_estimators=200, max_depth=6, learning_rate=0.05, random_state=42)
+    model.fit(X, y)
+    save_model_artifact(model, X, y, model.get_params(), artifact_dir=artifact_dir)
+
+
+def wait_for_service(process, port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Forecast service exited with status {process.returncode}')
+        try:
+            return asyncio.run(get_json(port, '/health'))
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('Forecast service did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--train-end-date', default='2025-06-30')
+    parser.add_argument('--days', type=int, default=5, help='distinct trading days requested')
+    parser.add_argument('--requests', type=int, default=5000, help='requests of the warm phase')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--port', type=int, default=8731)
+    args = parser.parse_args()
+
+    train_end_date = pd.Timestamp(args.train_end_date)
+    days = pd.date_range(train_end_date + pd.Timedelta(days=1), periods=args.days)
+    datasets = make_datasets(train_end_date - pd.Timedelta(days=380), days[-1] + pd.Timedelta(days=3))
+    server, api_url, _ = start_server(datasets)
+    work_dir = tempfile.mkdtemp(prefix='frcast-load-')
+    cache_dir, artifact_dir = os.path.join(work_dir, 'cache'), os.path.join(work_dir, 'models')
+    neso_api.NESO_API_URL, neso_cache.CACHE_DIR = api_url, cache_dir
+    process = None
+    try:
+        train_artifact(train_end_date, artifact_dir)
+        env = {**os.environ, 'NESO_API_URL': api_url, 'FRCAST_CACHE_DIR': cache_dir}
+        process = subprocess.Popen([sys.executable, '-m', 'frcast.service', '--port', str(args.port),
+                                    '--artifact-dir', artifact_dir, '--prefetch-days', '0'],
+                                   cwd=REPO_DIR, env=env)
+        wait_for_service(process, args.port)
+
+        paths = [f'/forecast?date={day:%Y-%m-%d}' for day in days]
+        cold_paths = [paths[i % len(paths)] for i in range(args.concurrency*len(paths))]
+        latencies, seconds, failures = asyncio.run(run_phase(args.port, cold_paths, args.concurrency))
+        report('cold', latencies, seconds)
+        cold_stats = asyncio.run(get_json(args.port, '/health'))['stats']
+
+        warm_paths = list(np.random.default_rng(0).choice(paths, args.requests))
+        latencies, seconds, warm_failures = asyncio.run(run_phase(args.port, warm_paths, args.concurrency))
+        report('warm', latencies, seconds)
+        stats = asyncio.run(get_json(args.port, '/health'))['stats']
+        print(f'{len(days)} days, {args.concurrency} connections: {cold_stats["feature_builds"]} feature builds '
+              f'and {cold_stats["coalesced"]} coalesced requests in the cold phase; '
+              f'{stats["response_cache_hits"]} responses served from cache')
+        for failure in (failures + warm_failures)[:10]:
+            print('FAILED:', failure)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
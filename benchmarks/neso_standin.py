@@ -0,0 +1,234 @@
+'''
+Synthetic NESO datastore: record generators and a local HTTP stand-in server.
+
+The generators produce realistic records for the four datasets frcast reads
+(FR and BR auction results, demand forecasts, margins forecasts) with the
+API's column names, UTC delivery starts on the London-local EFA and
+settlement-period grids (including both clock changes), several published
+vintages of every margins day and repeated demand revisions.
+
+The server answers ``/datastore_search_sql?sql=...`` like the NESO CKAN
+endpoint: it honours the SELECT column list and the date range of the WHERE
+clause, and sets ``records_truncated`` above a row limit. It can also answer
+the first requests with error statuses, to exercise the client's retries.
+
+Usage:
+    python benchmarks/neso_standin.py --start 2024-03-01 --end 2025-12-31 --port 8765
+    NESO_API_URL=http://127.0.0.1:8765 python main.py
+'''
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from frcast.data.br_price import BR_AUCTION_RESOURCE_ID
+from frcast.data.fr_prices import FR_AUCTION_RESOURCE_ID
+from frcast.data.system_demand import DEMAND_FORECAST_RESOURCE_ID
+from frcast.data.system_margins import MARGINS_RESOURCE_ID
+
+FR_PRODUCTS = ['DCL', 'DCH', 'DML', 'DMH', 'DRL', 'DRH']
+BR_PRODUCTS = ['PBR', 'NBR']
+DEMAND_CARDINAL_POINTS = [0, 330, 730, 1100, 1400, 1730, 2000, 2300] # CP_ST_TIME as HHMM
+MARGINS_LEAD_DAYS = range(2, 8)
+DATE_COLUMNS = {FR_AUCTION_RESOURCE_ID: 'deliveryStart', BR_AUCTION_RESOURCE_ID: 'deliveryStart',
+                DEMAND_FORECAST_RESOURCE_ID: 'TARGETDATE', MARGINS_RESOURCE_ID: 'Date'}
+DEFAULT_ROW_LIMIT = 32000 # CKAN's default datastore_search_sql row limit
+
+
+def _local_grid_to_utc(start_date, end_date, freq):
+    '''UTC starts of the London-local delivery periods of the trading days (EFA 1 starts at 23:00 the day before)'''
+    local_starts = pd.date_range(pd.Timestamp(start_date) - pd.Timedelta(hours=1),
+                                 pd.Timestamp(end_date) + pd.Timedelta(hours=23), freq=freq, inclusive='left')
+    # The repeated autumn hour is published twice (GMT and BST), the missing spring hour not at all
+    first = local_starts.tz_localize('Europe/London', ambiguous=np.ones(len(local_starts), dtype=bool),
+                                     nonexistent='NaT')
+    second = local_starts.tz_localize('Europe/London', ambiguous=np.zeros(len(local_starts), dtype=bool),
+                                      nonexistent='NaT')
+    utc_starts = first.append(second).dropna().unique().sort_values()
+    return utc_starts.tz_convert('UTC').tz_localize(None)
+
+
+def _price_shape(starts, rng, level, scale):
+    '''Gamma-distributed prices with a daily shape and a slow seasonal drift'''
+    hours = starts.hour.to_numpy() + starts.minute.to_numpy()/60
+    daily = 1 + 0.3*np.sin(2*np.pi*(hours - 8)/24)
+    seasonal = 1 + 0.2*np.cos(2*np.pi*starts.dayofyear.to_numpy()/365)
+    return np.round(level*daily*seasonal*rng.gamma(scale, 1/scale, len(starts)), 2)
+
+
+def _format_utc(starts):
+    return np.asarray(starts.strftime('%Y-%m-%dT%H:%M:%S'))
+
+
+def make_auction_records(start_date, end_date, products, freq, service_type, rng, level=5.0):
+    '''EAC auction results, one record per product and delivery period'''
+    starts = _local_grid_to_utc(start_date, end_date, freq)
+    n_starts, n_products = len(starts), len(products)
+    prices = np.concatenate([_price_shape(starts, rng, level*(1 + 0.5*i), 4) for i in range(n_products)])
+    return pd.DataFrame({
+        '_id': np.arange(n_starts*n_products),
+        'serviceType': service_type,
+        'auctionID': 'EAC-' + np.tile(np.asarray(starts.strftime('%Y%m%d')), n_products),
+        'auctionProduct': np.repeat(products, n_starts),
+        'deliveryStart': np.tile(_format_utc(starts), n_products),
+        'deliveryEnd': np.tile(_format_utc(starts + pd.Timedelta(freq)), n_products),
+        'clearingPrice': prices,
+        'clearedVolume': np.round(rng.uniform(50, 800, n_starts*n_products), 1),
+        'orderType': 'Sell',
+    })
+
+
+def make_demand_records(start_date, end_date, rng, revisions=2):
+    '''Demand forecasts at the daily cardinal points, each published revisions times'''
+    days = pd.date_range(pd.Timestamp(start_date) - pd.Timedelta(days=1), end_date)
+    n_points = len(days)*len(DEMAND_CARDINAL_POINTS)
+    base = 30000 + 6000*np.sin(2*np.pi*np.tile(DEMAND_CARDINAL_POINTS, len(days))/2400 - 1.5)
+    records = []
+    for revision in range(revisions):
+        records.append(pd.DataFrame({
+            'TARGETDATE': np.repeat(np.asarray(days.strftime('%Y-%m-%d')), len(DEMAND_CARDINAL_POINTS)),
+            'CP_ST_TIME': np.tile(DEMAND_CARDINAL_POINTS, len(days)),
+            'CP_END_TIME': np.tile(DEMAND_CARDINAL_POINTS, len(days)) + 30,
+            'FORECASTDEMAND': np.round(base + rng.normal(0, 800, n_points)).astype(int),
+            'CARDINALPOINT': np.tile([f'{i}A' for i in range(len(DEMAND_CARDINAL_POINTS))], len(days)),
+            'F_Point': 'F',
+        }))
+    records = pd.concat(records, ignore_index=True)
+    # Revisions of a target date are published one after the other
+    records = records.iloc[np.argsort(records['TARGETDATE'].to_numpy(), kind='stable')].reset_index(drop=True)
+    records.insert(0, '_id', np.arange(len(records)))
+    return records
+
+
+def make_margins_records(start_date, end_date, rng):
+    '''Daily margins forecasts, one vintage per lead day in MARGINS_LEAD_DAYS'''
+    days = pd.date_range(pd.Timestamp(start_date) - pd.Timedelta(days=1), end_date)
+    leads = np.array(MARGINS_LEAD_DAYS)
+    dates = days.repeat(len(leads))
+    n = len(dates)
+    return pd.DataFrame({
+        '_id': np.arange(n),
+        'Date': np.asarray(dates.strftime('%Y-%m-%dT00:00:00')),
+        'Publish Date': np.asarray((dates - pd.to_timedelta(np.tile(leads, len(days)), unit='D'))
+                                   .strftime('%Y-%m-%dT00:00:00')),
+        'Negative Reserve': rng.integers(0, 1000, n).astype(float),
+        'High Freq Response Requirement': rng.integers(300, 1000, n).astype(float),
+        'Generation Availability Margin': rng.integers(0, 5000, n).astype(float),
+        'Generator Availability': rng.integers(30000, 50000, n).astype(float),
+        'OPMR Total': rng.integers(3000, 6000, n).astype(float),
+        'National Surplus': rng.integers(0, 9000, n).astype(float),
+        'Notes/Comments': '',
+    })
+
+
+def make_datasets(start_date='2024-03-01', end_date='2025-12-31', seed=0, demand_revisions=2):
+    '''All four synthetic datasets keyed by NESO resource id, sorted by their date column'''
+    rng = np.random.default_rng(seed)
+    datasets = {
+        FR_AUCTION_RESOURCE_ID: make_auction_records(start_date, end_date, FR_PRODUCTS, '4h', 'Response', rng),
+        BR_AUCTION_RESOURCE_ID: make_auction_records(start_date, end_date, BR_PRODUCTS, '30min',
+                                                     'Balancing Reserve', rng, level=8.0),
+        DEMAND_FORECAST_RESOURCE_ID: make_demand_records(start_date, end_date, rng, demand_revisions),
+        MARGINS_RESOURCE_ID: make_margins_records(start_date, end_date, rng),
+    }
+    for resource_id, records in datasets.items():
+        order = np.argsort(records[DATE_COLUMNS[resource_id]].to_numpy(), kind='stable')
+        datasets[resource_id] = records.iloc[order].reset_index(drop=True)
+    return datasets
+
+
+def _make_handler(datasets, row_limit, stats, fail_statuses):
+    date_values = {resource_id: records[DATE_COLUMNS[resource_id]].to_numpy().astype(str)
+                   for resource_id, records in datasets.items()}
+
+    class DatastoreHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            with stats['lock']:
+                stats['requests'] += 1
+                stats['bytes'] += len(body)
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            with stats['lock']:
+                fail_status = fail_statuses.pop(0) if fail_statuses else None
+            if fail_status is not None:
+                return self._send(fail_status, {'success': False, 'error': {'message': 'Injected failure'}})
+            url = urlparse(self.path)
+            if not url.path.endswith('/datastore_search_sql'):
+                return self._send(404, {'success': False, 'error': {'message': 'Not found'}})
+            sql = parse_qs(url.query).get('sql', [''])[0]
+            resource = re.search(r'FROM\s+"([^"]+)"', sql)
+            if resource is None or resource.group(1) not in datasets:
+                return self._send(409, {'success': False, 'error': {'message': 'Unknown resource'}})
+            resource_id = resource.group(1)
+            records = datasets[resource_id]
+            bounds = re.findall(r"'(\d{4}-\d\d-\d\d)'", sql)
+            if len(bounds) >= 2: # the values are ISO strings, so string order is date order
+                start, stop = np.searchsorted(date_values[resource_id], bounds[:2])
+                records = records.iloc[start:stop]
+            select = re.search(r'SELECT\s+(.*?)\s+FROM', sql, re.S).group(1).strip()
+            if select != '*':
+                records = records[re.findall(r'"([^"]+)"', select)]
+            result = {'records': records.iloc[:row_limit].to_dict('records')}
+            if row_limit is not None and len(records) > row_limit:
+                result['records_truncated'] = True
+            return self._send(200, {'success': True, 'result': result})
+
+    return DatastoreHandler
+
+
+def start_server(datasets=None, host='127.0.0.1', port=0, row_limit=DEFAULT_ROW_LIMIT, fail_statuses=()):
+    '''
+    Serve datasets on a background thread.
+
+    The first ``len(fail_statuses)`` requests are answered with those HTTP statuses
+    (e.g. ``[503, 429]``) instead of records.
+
+    Returns:
+        tuple: ``(server, api_url, stats)``; set ``NESO_API_URL`` to api_url to
+        point frcast at it, ``stats`` counts requests and response bytes.
+    '''
+    datasets = make_datasets() if datasets is None else datasets
+    stats = {'requests': 0, 'bytes': 0, 'lock': threading.Lock()}
+    server = ThreadingHTTPServer((host, port), _make_handler(datasets, row_limit, stats, list(fail_statuses)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_port}', stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--start', default='2024-03-01')
+    parser.add_argument('--end', default='2025-12-31')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--row-limit', type=int, default=DEFAULT_ROW_LIMIT)
+    args = parser.parse_args()
+
+    datasets = make_datasets(args.start, args.end, args.seed)
+    server, api_url, _ = start_server(datasets, port=args.port, row_limit=args.row_limit)
+    print(f'Serving {sum(len(records) for records in datasets.values())} records at {api_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,62 @@
-from frcast.data import (get_efa_index,
-                         get_historical_fr_price,
-                         get_prediction_features_df,
-                        get_train_features_target_df, 
-                        )
-from frcast.model import (evaluate_xgb_trial, generate_time_series_splits, 
-                          run_xgb_optuna_tuning, train_final_xgb_model_from_study,
-                          predict_from_best_model)
+import importlib
+
+# Public names are resolved lazily from the subpackages, so `import frcast` is
+# cheap and data-only scripts never load the model stack (mlflow, optuna, xgboost).
+_LAZY_ATTRS = {'get_efa_index': 'frcast.data',
+               'get_historical_fr_price': 'frcast.data',
+               'get_prediction_features_df': 'frcast.data',
+               'get_train_features_target_df': 'frcast.data',
+               'slice_efa_window': 'frcast.data',
+               'FR_SERVICE_TARGETS': 'frcast.data',
+               'resolve_features': 'frcast.data',
+               'DEFAULT_FEATURES': 'frcast.data',
+               'evaluate_xgb_trial': 'frcast.model',
+               'generate_time_series_splits': 'frcast.model',
+               'run_xgb_optuna_tuning': 'frcast.model',
+               'train_final_xgb_model_from_study': 'frcast.model',
+               'predict_from_best_model': 'frcast.model',
+               'predict_batch': 'frcast.model',
+               'run_backtest': 'frcast.model',
+               'run_sharded_backtest': 'frcast.model',
+               'load_backtest_results': 'frcast.model',
+               'evaluate_forecasts': 'frcast.model',
+               'evaluate_backtest_runs': 'frcast.model',
+               'get_best_params_history': 'frcast.model',
+               'get_study_storage': 'frcast.model',
+               'FeatureSchemaError': 'frcast.model',
+               'list_model_artifacts': 'frcast.model',
+               'load_model_artifact': 'frcast.model',
+               'save_model_artifact': 'frcast.model',
+               'update_xgb_model': 'frcast.model',
+               'train_multi_target_model': 'frcast.model',
+               'predict_multi_target': 'frcast.model',
+               'enable_tracing': 'frcast.tracing',
+               'span': 'frcast.tracing',
+               'write_trace': 'frcast.tracing',
+               }
 
 __all__ = ['get_efa_index','get_historical_fr_price',
          'get_prediction_features_df', 'get_train_features_target_df', 
+           'resolve_features', 'DEFAULT_FEATURES',
            'evaluate_xgb_trial', 'train_final_xgb_model_from_study',
-            'generate_time_series_splits', 'predict_from_best_model',
-            'run_xgb_optuna_tuning']
+            'generate_time_series_splits', 'predict_from_best_model', 'predict_batch',
+            'run_xgb_optuna_tuning', 'slice_efa_window', 'run_backtest',
+            'run_sharded_backtest', 'load_backtest_results',
+            'evaluate_forecasts', 'evaluate_backtest_runs',
+            'get_best_params_history', 'get_study_storage',
+            'FeatureSchemaError', 'list_model_artifacts', 'load_model_artifact',
+            'save_model_artifact', 'update_xgb_model',
+            'train_multi_target_model', 'predict_multi_target', 'FR_SERVICE_TARGETS',
+            'enable_tracing', 'span', 'write_trace']
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRS[name]), name)
+    globals()[name] = value
+    return value
+
 
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,6 +1,29 @@
-from frcast.data.train_predict_data import get_prediction_features_df, get_train_features_target_df
-from frcast.data.fr_prices import get_historical_fr_price
-from frcast.data.time_periods import get_efa_index
+import importlib
+
+# Public names are resolved on first access so that importing one data helper
+# does not load the NESO client, the cache and every feature builder.
+_LAZY_ATTRS = {'get_efa_index': 'frcast.data.time_periods',
+               'get_historical_fr_price': 'frcast.data.fr_prices',
+               'slice_efa_window': 'frcast.data.fr_prices',
+               'get_prediction_features_df': 'frcast.data.train_predict_data',
+               'get_train_features_target_df': 'frcast.data.train_predict_data',
+               'FR_SERVICE_TARGETS': 'frcast.data.train_predict_data',
+               'resolve_features': 'frcast.data.feature_graph',
+               'DEFAULT_FEATURES': 'frcast.data.feature_graph',
+               }
 
 __all__ = ['get_efa_index', 'get_historical_fr_price', 
-           'get_prediction_features_df', 'get_train_features_target_df']
+           'get_prediction_features_df', 'get_train_features_target_df',
+           'slice_efa_window', 'FR_SERVICE_TARGETS', 'resolve_features', 'DEFAULT_FEATURES']
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
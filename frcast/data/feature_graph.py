@@ -0,0 +1,258 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from frcast.data.br_price import BR_PRICE_FEATURES, aggregate_br_price, fetch_br_price_and_volume
+from frcast.data.feature_matrix import FeatureMatrix
+from frcast.data.fr_prices import create_lag_shifted_df, get_historical_fr_price, get_lag_fetch_periods
+from frcast.data.lag_features import ROLLING_STATS, get_lag_feature_names, get_lookback_blocks
+from frcast.data.preprocessing import TEMPORAL_FEATURES as TEMPORAL_FEATURE_VALUES, get_temporal_feature_values
+from frcast.data.system_demand import DEMAND_FEATURES, aggregate_demand, fetch_demand_forecast
+from frcast.data.system_margins import MARGINS_FEATURES, fetch_forecasted_margins, resample_margins
+from frcast.data.time_periods import get_efa_index
+from frcast.tracing import span
+
+import numpy as np
+import pandas as pd
+import re
+
+# Lags of FR prices (in EFA blocks) used as model features
+PARAMETERS_LAGS = {'dcl_price': [6, 12], 'drl_price': [6, 12]}
+# Calendar features of the EFA blocks (see preprocessing.TEMPORAL_FEATURES)
+TEMPORAL_FEATURES = ['month', 'working day']
+# Features of the models, in model input order
+DEFAULT_FEATURES = (MARGINS_FEATURES + DEMAND_FEATURES + BR_PRICE_FEATURES + get_lag_feature_names(PARAMETERS_LAGS)
+                    + TEMPORAL_FEATURES)
+# Names of the FR price lag features (see lag_features.get_lag_feature_names), any lag of any FR price
+LAG_FEATURE_PATTERN = re.compile(r'(?P<parameter>\w+_price)_(?:lag_(?P<lag>\d+)|week_lag_(?P<week>\d+)'
+                                 r'|roll_(?P<window>\d+)_(?P<stat>' + '|'.join(ROLLING_STATS) + '))')
+
+
+class FeatureNode:
+    '''
+    One step of the feature graph: a source dataset (fetch) or a transform into feature columns
+
+    compute is called as compute(request, columns, *input_values), where request
+    holds the build arguments (see resolve_features), input_values the outputs of
+    the input nodes, and columns the features requested from this node or, for a
+    source, from every node that depends on it, so that each step only fetches
+    and computes what is needed.
+
+    Parameters:
+    name (str): node name
+    compute (callable): function computing the node output
+    inputs (list): names of the nodes whose outputs compute takes
+    columns (list): feature columns the node produces (none for a source)
+    pattern (re.Pattern): alternatively, the pattern of the feature columns it produces
+    integer (bool): the features are integers (stored as int8 in the feature matrix)
+    '''
+
+    def __init__(self, name, compute, inputs=(), columns=(), pattern=None, integer=False):
+        self.name = name
+        self.compute = compute
+        self.inputs = list(inputs)
+        self.columns = list(columns)
+        self.pattern = pattern
+        self.integer = integer
+
+    def produces(self, column):
+        return column in self.columns or (self.pattern is not None and self.pattern.fullmatch(column) is not None)
+
+    def __repr__(self):
+        return f'FeatureNode({self.name!r}, inputs = {self.inputs})'
+
+
+def get_lag_parameters(columns, parameters_rolling=None):
+    '''
+    Returns the (parameters_lags, parameters_rolling, parameters_weekly) building the given lag feature columns
+
+    Rolling windows end 6 blocks back (see build_lag_features) unless parameters_rolling
+    gives another "lag" for the price. Rolling features of one price are built for
+    every requested (window, stat) combination, so a few unrequested columns may be computed.
+
+    Example
+    -------
+    >>> get_lag_parameters(['dcl_price_lag_6', 'dcl_price_roll_42_mean', 'drl_price_week_lag_1'])
+    ({'dcl_price': [6]}, {'dcl_price': {'windows': [42], 'stats': ['mean']}}, {'drl_price': [1]})
+    '''
+    parameters_lags, parameters_rolling_out, parameters_weekly = {}, {}, {}
+    for column in columns:
+        match = LAG_FEATURE_PATTERN.fullmatch(column)
+        parameter = match['parameter']
+        if(match['lag'] is not None):
+            parameters_lags.setdefault(parameter, []).append(int(match['lag']))
+        elif(match['week'] is not None):
+            parameters_weekly.setdefault(parameter, []).append(int(match['week']))
+        else:
+            rolling = parameters_rolling_out.setdefault(parameter, {'windows': [], 'stats': []})
+            if(int(match['window']) not in rolling['windows']):
+                rolling['windows'].append(int(match['window']))
+            if(match['stat'] not in rolling['stats']):
+                rolling['stats'].append(match['stat'])
+    for parameter, rolling in parameters_rolling_out.items():
+        if('lag' in (parameters_rolling or {}).get(parameter, {})):
+            rolling['lag'] = parameters_rolling[parameter]['lag']
+    return parameters_lags, parameters_rolling_out, parameters_weekly
+
+
+def get_feature_lookback_blocks(features, parameters_rolling=None):
+    '''
+    Returns the EFA blocks of FR price history the lag features among features need
+    before their first block (see lag_features.get_lookback_blocks)
+
+    Example
+    -------
+    >>> get_feature_lookback_blocks(['dcl_price_lag_6', 'drl_price_week_lag_1', 'month'])
+    42
+    '''
+    lag_features = [feature for feature in features if LAG_FEATURE_PATTERN.fullmatch(feature)]
+    return get_lookback_blocks(*get_lag_parameters(lag_features, parameters_rolling))
+
+
+def _fetch_fr_prices(request, columns):
+    if(request['clearing_price_fr'] is not None):
+        return request['clearing_price_fr']
+    lookback_blocks = get_feature_lookback_blocks(columns, request['parameters_rolling'])
+    return get_historical_fr_price(*get_lag_fetch_periods(request['start_date'], request['end_date'], lookback_blocks))
+
+
+def _build_fr_price_lags(request, columns, clearing_price_fr):
+    parameters = get_lag_parameters(columns, request['parameters_rolling'])
+    return create_lag_shifted_df(request['start_date'], request['end_date'], parameters[0], clearing_price_fr,
+                                 *parameters[1:], out = request['lag_out'](get_lag_feature_names(*parameters)))
+
+
+def _build_temporal_features(request, columns):
+    return {column: get_temporal_feature_values(request['efa_index'], column) for column in columns}
+
+
+# The feature graph: source datasets -> transforms -> feature columns
+FEATURE_NODES = [
+    FeatureNode('margins', lambda request, columns: fetch_forecasted_margins(
+        request['start_date'], request['end_date'], request['as_of'], columns)),
+    FeatureNode('demand_forecast', lambda request, columns: fetch_demand_forecast(
+        request['start_date'], request['end_date'], request['as_of'])),
+    FeatureNode('br_prices', lambda request, columns: fetch_br_price_and_volume(
+        request['start_date'], request['end_date'])),
+    FeatureNode('fr_prices', _fetch_fr_prices),
+    FeatureNode('margins_efa', lambda request, columns, margins: resample_margins(
+        request['start_date'], request['end_date'], margins = margins, columns = columns),
+                inputs = ['margins'], columns = MARGINS_FEATURES),
+    FeatureNode('demand_efa', lambda request, columns, demand_forecast: aggregate_demand(
+        request['start_date'], request['end_date'], demand_forecast = demand_forecast, columns = columns),
+                inputs = ['demand_forecast'], columns = DEMAND_FEATURES),
+    FeatureNode('br_price_efa', lambda request, columns, clearing_price_br: aggregate_br_price(
+        request['start_date'], request['end_date'], clearing_price_br = clearing_price_br, columns = columns),
+                inputs = ['br_prices'], columns = BR_PRICE_FEATURES),
+    FeatureNode('fr_price_lags', _build_fr_price_lags, inputs = ['fr_prices'], pattern = LAG_FEATURE_PATTERN),
+    FeatureNode('temporal', _build_temporal_features, columns = list(TEMPORAL_FEATURE_VALUES), integer = True),
+]
+
+
+def plan_features(features, nodes=None):
+    '''
+    Finds the nodes needed for a list of features
+
+    Parameters:
+    features (list): requested feature columns
+    nodes (list): the feature graph, defaults to FEATURE_NODES
+
+    Returns:
+    dict: node name -> requested columns of every needed node (for a source, the columns
+          requested from the nodes depending on it), in dependency order
+
+    Example
+    -------
+    >>> list(plan_features(['negative_reserve', 'month']))
+    ['margins', 'margins_efa', 'temporal']
+    '''
+    nodes = {node.name: node for node in (FEATURE_NODES if nodes is None else nodes)}
+    plan = {}
+    unknown = []
+    for feature in features:
+        producers = [node for node in nodes.values() if node.produces(feature)]
+        if(len(producers) == 0):
+            unknown.append(feature)
+            continue
+        pending = [(producers[0].name, feature)]
+        while pending:
+            name, column = pending.pop()
+            columns = plan.setdefault(name, [])
+            if(column not in columns):
+                columns.append(column)
+            pending += [(input_name, column) for input_name in nodes[name].inputs]
+    if(unknown):
+        raise ValueError(f'No feature node produces {unknown}')
+    return {name: plan[name] for name in nodes if name in plan}
+
+
+def resolve_features(features, start_date, end_date, clearing_price_fr=None, as_of=None, parameters_rolling=None,
+                     nodes=None, max_workers=None):
+    '''
+    Builds the requested features only, running the fetches and transforms they need
+
+    The needed nodes of the feature graph (see plan_features) run in a thread
+    pool as soon as their inputs are ready, so independent sources are fetched
+    concurrently. Each transform writes its columns into one preallocated
+    FeatureMatrix (the FR price lags directly into a view of it).
+
+    Parameters:
+    features (list): feature columns, e.g. the feature_names of a saved model's metadata
+    start_date, end_date (pd.Timestamp): first and last trading day (inclusive)
+    clearing_price_fr (dataframe): FR clearing prices covering the lag lookback, fetched when not given
+    as_of (str or pd.Timestamp): latest decision time of the forecast-vintage features (see build_features_df)
+    parameters_rolling (dict): rolling window "lag" per FR price when not the default (see build_lag_features)
+    nodes (list): the feature graph, defaults to FEATURE_NODES
+    max_workers (int): nodes run concurrently, defaults to the number of needed nodes
+
+    Returns:
+    dataframe: the features in the requested order (no columns when features is empty),
+               indexed by EFA block start time
+    '''
+    nodes = {node.name: node for node in (FEATURE_NODES if nodes is None else nodes)}
+    features = list(dict.fromkeys(features))
+    plan = plan_features(features, list(nodes.values()))
+    efa_index = get_efa_index(start_date, end_date)
+    if(not plan): # no features requested: nothing to fetch
+        return pd.DataFrame(index = efa_index)
+    int_features = [feature for feature in features
+                    if any(nodes[name].integer and nodes[name].produces(feature) for name in plan)]
+    float_features = [feature for feature in features if feature not in int_features]
+    matrix = FeatureMatrix(efa_index, float_features, int_features)
+
+    def lag_out(columns):
+        # Lag features are written straight into the matrix when they are consecutive in the requested order
+        positions = matrix.float_columns.get_indexer(columns)
+        if((positions >= 0).all() and (np.diff(positions) == 1).all()):
+            return matrix.view(columns)
+        return None
+
+    request = {'start_date': start_date, 'end_date': end_date, 'as_of': as_of, 'efa_index': efa_index,
+               'clearing_price_fr': clearing_price_fr, 'parameters_rolling': parameters_rolling, 'lag_out': lag_out}
+
+    def store(name, value):
+        if(not nodes[name].columns and nodes[name].pattern is None): # a source
+            return
+        columns = plan[name]
+        if(isinstance(value, dict)):
+            for column in columns:
+                matrix.write_int(column, value[column])
+        elif(not np.may_share_memory(value.to_numpy(), matrix.float_values)): # not written into a view
+            matrix.write(value.reindex(columns = columns))
+
+    outputs, running = {}, {}
+    with ThreadPoolExecutor(max_workers = max_workers or len(plan)) as executor:
+        while len(outputs) < len(plan):
+            for name in plan:
+                if(name not in outputs and name not in running
+                   and all(input_name in outputs for input_name in nodes[name].inputs)):
+                    input_values = [outputs[input_name] for input_name in nodes[name].inputs]
+                    running[name] = executor.submit(nodes[name].compute, request, plan[name], *input_values)
+            done, _ = wait(running.values(), return_when = FIRST_COMPLETED)
+            for name in [name for name, future in running.items() if future in done]:
+                outputs[name] = running.pop(name).result()
+                store(name, outputs[name])
+
+    with span('features.matrix') as attributes:
+        attributes.update(matrix.memory_footprint())
+        X = matrix.to_frame()
+    if(list(X.columns) != features): # integer features were requested before float ones
+        X = X[features]
+    return X
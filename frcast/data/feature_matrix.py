@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+FLOAT_DTYPE = np.float32 # XGBoost trains on float32, so nothing is lost
+INT_DTYPE = np.int8
+
+
+class FeatureMatrix:
+    '''
+    Preallocated feature matrix on a canonical EFA grid
+
+    Holds one float32 block (NaN until written) and one int8 block with a row per
+    EFA block of efa_index. Feature producers write their columns into it in
+    place: either directly into a view of the float block (see view), or by
+    writing an EFA-indexed frame whose rows are matched to the grid by position
+    (see write), so no index union, upcast or concatenated copy is needed.
+
+    Parameters:
+    efa_index (pd.DatetimeIndex): canonical 4-hourly grid (see get_efa_index)
+    float_columns (list): names of the float32 columns, in output order
+    int_columns (list): names of the int8 columns, placed after the float columns
+
+    Example
+    -------
+    >>> efa_index = pd.date_range('2025-06-11 23:00', periods = 3, freq = '4h')
+    >>> matrix = FeatureMatrix(efa_index, ['a', 'b'], ['month'])
+    >>> matrix.write(pd.DataFrame({'b': [1.5, 2.5]}, index = efa_index[1:]))
+    >>> matrix.write_int('month', efa_index.month)
+    >>> matrix.to_frame()
+                          a    b  month
+    2025-06-11 23:00:00 NaN  NaN      6
+    2025-06-12 03:00:00 NaN  1.5      6
+    2025-06-12 07:00:00 NaN  2.5      6
+    '''
+
+    def __init__(self, efa_index, float_columns, int_columns=()):
+        self.index = efa_index
+        self.float_columns = pd.Index(float_columns)
+        self.int_columns = pd.Index(int_columns)
+        self.float_values = np.full((len(efa_index), len(self.float_columns)), np.nan, dtype = FLOAT_DTYPE)
+        self.int_values = np.zeros((len(efa_index), len(self.int_columns)), dtype = INT_DTYPE)
+
+    def view(self, columns):
+        '''Writable view of consecutive float columns, for producers that fill an output array'''
+        positions = self.float_columns.get_indexer(columns)
+        if(len(positions) and (positions[0] < 0 or (np.diff(positions) != 1).any())):
+            raise ValueError(f'{list(columns)} are not consecutive columns of the feature matrix')
+        first = positions[0] if len(positions) else 0
+        return self.float_values[:, first: first + len(positions)]
+
+    def write(self, frame):
+        '''Writes the float columns of an EFA-indexed frame; rows not on the grid are ignored'''
+        if(frame.empty):
+            return
+        columns = self.float_columns.get_indexer(frame.columns)
+        if((columns < 0).any()):
+            raise KeyError(f'{list(frame.columns[columns < 0])} are not columns of the feature matrix')
+        rows = self.index.get_indexer(frame.index)
+        on_grid = rows >= 0
+        if(on_grid.all() and (np.diff(rows) == 1).all()):
+            rows, on_grid = slice(rows[0], rows[-1] + 1), slice(None) # one run of the grid: no fancy-indexing copies
+        else:
+            rows = rows[on_grid]
+        for j, column in enumerate(columns):
+            # column by column, cast while assigning, so no float32 copy of the whole frame is made
+            self.float_values[rows, column] = frame.iloc[:, j].to_numpy(dtype = np.float64, na_value = np.nan)[on_grid]
+
+    def write_int(self, column, values):
+        '''Writes one int8 column'''
+        self.int_values[:, self.int_columns.get_loc(column)] = values
+
+    def memory_footprint(self):
+        '''
+        Returns the matrix size: rows, columns, bytes held, and the bytes the same
+        features take as float64/int64 columns
+        '''
+        n_rows, n_columns = len(self.index), len(self.float_columns) + len(self.int_columns)
+        return {'rows': n_rows, 'columns': n_columns,
+                'bytes': self.float_values.nbytes + self.int_values.nbytes,
+                'bytes_64bit': 8*n_rows*n_columns}
+
+    def to_frame(self):
+        '''Returns the features as a dataframe sharing the matrix memory (float columns first)'''
+        float_df = pd.DataFrame(self.float_values, index = self.index, columns = self.float_columns, copy = False)
+        if(len(self.int_columns) == 0):
+            return float_df
+        int_df = pd.DataFrame(self.int_values, index = self.index, columns = self.int_columns, copy = False)
+        return pd.concat([float_df, int_df], axis = 1)
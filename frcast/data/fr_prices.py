@@ -1,12 +1,20 @@
+from frcast.data.lag_features import build_lag_features, get_lookback_blocks
+from frcast.data.neso_cache import fetch_cached_records
 from frcast.data.preprocessing import get_eac_auction_volume_or_price
 from frcast.data.time_periods import get_query_periods, get_settlement_periods, get_efa_index
-from urllib.parse import quote
+from frcast.tracing import traced
 
+import numpy as np
 import pandas as pd
 import re
-import requests
 
+FR_AUCTION_RESOURCE_ID = '596f29ac-0387-4ba4-a6d3-95c243140707'
+# Only the columns used downstream are fetched and cached, already typed
+FR_AUCTION_SCHEMA = {'deliveryStart': 'datetime64', 'deliveryEnd': 'datetime64',
+                     'auctionProduct': 'str', 'clearingPrice': 'float64'}
 
+
+@traced('fetch.fr_prices')
 def get_historical_fr_price(fr_from: str, fr_to: str):
     '''
     Collects frequency response data from NESO API and transforms into timeseries dataframe of price and volume
@@ -18,6 +26,9 @@ def get_historical_fr_price(fr_from: str, fr_to: str):
     Returns:
     clearing_price_fr (dataframe): A time series dataframe of FR clearing pricing at four-hour frequency (EFA block wise) 
     cleared_volume_fr (dataframe):  A time series dataframe of FR cleared volume at four-hour frequency (EFA block wise)
+
+    Raises:
+    NesoApiError: the records could not be fetched from the NESO API
     '''
     # query_start_date = pd.to_datetime(start_date) - pd.Timedelta(days = 1) # to collect data of EFA 1 of the start date
     # efa_start_time = pd.to_datetime(start_date)-pd.Timedelta(hours = 1) # EFA 1 starts at 23:00 of the previous day
@@ -27,69 +38,70 @@ def get_historical_fr_price(fr_from: str, fr_to: str):
     fr_start_date = pd.to_datetime(fr_from) - pd.Timedelta(days = 1)
     fr_end_date = pd.to_datetime(fr_to) + pd.Timedelta(days = 1)
 
-    fr_efa_start_time = pd.to_datetime(fr_from) - pd.Timedelta(hours = 1)
-    fr_efa_end_time = pd.to_datetime(fr_to) + pd.Timedelta(hours = 19)
-    query = f'''SELECT * FROM "596f29ac-0387-4ba4-a6d3-95c243140707"
-            WHERE "serviceType" = 'Response' 
-            AND  "deliveryStart" >= '{fr_start_date}'
-            AND "deliveryStart" <= '{fr_end_date}'
-            '''
-            
-    # URL encode query
-    url = f"https://api.neso.energy/api/3/action/datastore_search_sql?sql={quote(query)}"
-    # Data collection from NESO API
-    try: # Fetch data
-        response = requests.get(url)
-        data = response.json()
-        fr_auctions = pd.DataFrame(data['result']['records'])
+    # Data collection from NESO API (only the days missing from the local cache)
+    fr_auctions = fetch_cached_records(FR_AUCTION_RESOURCE_ID, 'deliveryStart', fr_start_date, fr_end_date,
+                                       where = "\"serviceType\" = 'Response'", schema = FR_AUCTION_SCHEMA)
+    if(not fr_auctions.empty):
         # Standardize column names
         fr_auctions.columns = [re.sub(r'(?<!^)(?=[A-Z])', '_', col).lower() for col in fr_auctions.columns]
-        fr_auctions.clearing_price = fr_auctions.clearing_price.astype('float64')
-        # fr_auctions.cleared_volume = fr_auctions.cleared_volume.astype('float64')  
-    except: 
-        print('Historical FR clearing price and volume data is not fetched from API')
-        fr_auctions = pd.DataFrame()
     # Data transformation 
-    if(fr_auctions.empty): #Data not fetched
-        clearing_price_fr = pd.DataFrame()
+    if(fr_auctions.empty): # No auctions in the period: EFA-indexed, so lags are NaN
+        clearing_price_fr = pd.DataFrame(index = pd.DatetimeIndex([]))
     else: 
         # Transform raw data to timeseries clearing prices
         clearing_price_fr = get_eac_auction_volume_or_price(fr_auctions, extracting_value='price')                                                                                                                
         # cleared_volume_fr = get_eac_auction_volume_or_price(fr_auctions, extracting_value='volume')  
-        clearing_price_fr = clearing_price_fr[(clearing_price_fr.index >= fr_efa_start_time)
-                                            &(clearing_price_fr.index <= fr_efa_end_time)] 
+        clearing_price_fr = slice_efa_window(clearing_price_fr, fr_from, fr_to)
         # cleared_volume_fr = cleared_volume_fr[(cleared_volume_fr.index >= fr_efa_start_time)
         #                                     &(cleared_volume_fr.index <= fr_efa_end_time)]                           
         # print('Frequency response is available from:', clearing_price_fr.index.min(), 'to', clearing_price_fr.index.max())
     return clearing_price_fr
 
-def create_lag_shifted_df(start_date, end_date, parameters_lags):
+def slice_efa_window(clearing_price_fr, start_date, end_date):
     '''
-    Concats series of an input series by defined lags
+    Slices an EFA-indexed frame to the EFA blocks of the trading days from start_date to end_date (inclusive),
+    i.e. from 23:00 of the day before start_date to 19:00 (EFA 6) of end_date
 
-    Returns:
-    A dataframe of same index of df with shifted lags of parameters
+    Lets callers fetch FR prices once over the union of the windows they need and
+    slice targets, lags, actuals and naive forecasts from the same frame.
     '''
-    efa_index = get_efa_index(start_date, end_date)
-    # print(efa_index)
-    # query_start_date, query_end_date = get_query_periods(start_date, end_date)
-    lag_shifted_df = pd.DataFrame(index = efa_index)
-    previous_days_date = pd.to_datetime(start_date) - pd.Timedelta(days = 2)
-    end_date = pd.to_datetime(end_date) + pd.Timedelta(days = 1)
-    previous_days_date = previous_days_date.strftime('%Y-%m-%d')
-    clearing_price_fr = get_historical_fr_price(previous_days_date, end_date)
-    series_index = clearing_price_fr.index
-    # print(clearing_price_fr.index[0], clearing_price_fr.index[-1])
-    for parameter, lags in parameters_lags.items():
-        parameter_series = clearing_price_fr[parameter].copy()
+    efa_start_time = pd.to_datetime(start_date) - pd.Timedelta(hours = 1)
+    efa_end_time = pd.to_datetime(end_date) + pd.Timedelta(hours = 19)
+    return clearing_price_fr[(clearing_price_fr.index >= efa_start_time)
+                             &(clearing_price_fr.index <= efa_end_time)]
 
-        for lag in lags:
-            shifted_index = series_index + pd.Timedelta(hours=4*lag) 
-            shifted_series = pd.Series(data = parameter_series.values,
-                                       index = shifted_index)
-            lag_shifted_df.loc[:, parameter+'_lag_' +str(lag)] = shifted_series[efa_index]
-    return lag_shifted_df
+def get_lag_fetch_periods(start_date, end_date, lookback_blocks=12):
+    '''
+    Returns the (start, end) trading days of FR prices needed to build lags for start_date to end_date
 
+    lookback_blocks is the largest lag (in EFA blocks) of the features, see lag_features.get_lookback_blocks
+    '''
+    lookback_days = max(int(np.ceil(lookback_blocks/6)), 2)
+    previous_days_date = pd.to_datetime(start_date) - pd.Timedelta(days = lookback_days)
+    end_date = pd.to_datetime(end_date) + pd.Timedelta(days = 1)
+    return previous_days_date.strftime('%Y-%m-%d'), end_date
 
-    
+@traced('features.lags')
+def create_lag_shifted_df(start_date, end_date, parameters_lags, clearing_price_fr=None,
+                          parameters_rolling=None, parameters_weekly=None, out=None):
+    '''
+    Builds lagged, rolling-window and same-block-previous-week features of FR prices (see build_lag_features)
+
+    Parameters:
+    parameters_lags (dict): lags in EFA blocks per price, e.g. {'dcl_price': [6, 12]}
+    clearing_price_fr (dataframe): FR clearing prices covering get_lag_fetch_periods(start_date, end_date),
+                                   fetched here when not given
+    parameters_rolling (dict): rolling windows per price, e.g. {'dcl_price': {'windows': [42], 'stats': ['mean']}}
+    parameters_weekly (dict): weeks back per price, e.g. {'dcl_price': [1]}
+    out (np.ndarray): optional array the features are written into, see build_lag_features
 
+    Returns:
+    A dataframe indexed by the EFA blocks of start_date to end_date with the lag features
+    '''
+    efa_index = get_efa_index(start_date, end_date)
+    if(clearing_price_fr is None):
+        lookback_blocks = get_lookback_blocks(parameters_lags, parameters_rolling, parameters_weekly)
+        clearing_price_fr = get_historical_fr_price(*get_lag_fetch_periods(start_date, end_date, lookback_blocks))
+    lag_shifted_df = build_lag_features(clearing_price_fr, efa_index, parameters_lags,
+                                        parameters_rolling, parameters_weekly, out = out)
+    return lag_shifted_df
@@ -0,0 +1,139 @@
+from numpy.lib.stride_tricks import sliding_window_view
+from frcast.tracing import traced
+
+import numpy as np
+import pandas as pd
+import warnings
+
+EFA_BLOCK = pd.Timedelta(hours = 4)
+BLOCKS_PER_WEEK = 42
+ROLLING_STATS = {'min': np.nanmin, 'max': np.nanmax, 'mean': np.nanmean,
+                 'std': lambda windows, axis: np.nanstd(windows, axis = axis, ddof = 1), # sample std as in pandas
+                 'median': np.nanmedian,
+                 'sum': lambda windows, axis: np.where(np.isnan(windows).all(axis = axis), np.nan, # not 0
+                                                       np.nansum(windows, axis = axis))}
+
+
+def get_lookback_blocks(parameters_lags=None, parameters_rolling=None, parameters_weekly=None):
+    '''
+    Number of EFA blocks of history needed before the first output block
+
+    Parameters:
+    parameters_lags (dict): {parameter: [lag, ...]} in EFA blocks
+    parameters_rolling (dict): {parameter: {'windows': [...], 'stats': [...], 'lag': lag}}
+    parameters_weekly (dict): {parameter: [weeks, ...]}
+
+    Returns:
+    int: the largest offset (in EFA blocks) any feature looks back
+    '''
+    lookback = [0]
+    for lags in (parameters_lags or {}).values():
+        lookback += list(lags)
+    for rolling in (parameters_rolling or {}).values():
+        lookback += [rolling.get('lag', 6) + window - 1 for window in rolling['windows']]
+    for weeks in (parameters_weekly or {}).values():
+        lookback += [BLOCKS_PER_WEEK*week for week in weeks]
+    return max(lookback)
+
+
+def align_to_efa_grid(series_df, grid_start_time, n_blocks):
+    '''
+    Scatters the columns of an EFA-indexed frame into a contiguous (n_blocks x n_columns) array
+
+    Row i holds the values at grid_start_time + i*4h; blocks missing from
+    series_df (or off the 4-hour grid) are NaN.
+
+    Parameters:
+    series_df (dataframe): EFA-indexed values (e.g. FR clearing prices)
+    grid_start_time (pd.Timestamp): timestamp of the first row
+    n_blocks (int): number of rows
+
+    Returns:
+    np.ndarray: float64 array of shape (n_blocks, len(series_df.columns))
+    '''
+    aligned = np.full((n_blocks, series_df.shape[1]), np.nan)
+    offsets = (series_df.index - grid_start_time).to_numpy()
+    positions = offsets // EFA_BLOCK.to_timedelta64()
+    on_grid = ((offsets % EFA_BLOCK.to_timedelta64()) == np.timedelta64(0)) & (positions >= 0) & (positions < n_blocks)
+    aligned[positions[on_grid]] = series_df.to_numpy(dtype = 'float64')[on_grid]
+    return aligned
+
+
+def get_lag_feature_names(parameters_lags=None, parameters_rolling=None, parameters_weekly=None):
+    '''Returns the column names build_lag_features produces, in its column order'''
+    columns = []
+    for parameter, lags in (parameters_lags or {}).items():
+        columns += [parameter + '_lag_' + str(lag) for lag in lags]
+    for parameter, rolling in (parameters_rolling or {}).items():
+        columns += [f'{parameter}_roll_{window}_{stat}' for window in rolling['windows'] for stat in rolling['stats']]
+    for parameter, weeks in (parameters_weekly or {}).items():
+        columns += [parameter + '_week_lag_' + str(week) for week in weeks]
+    return columns
+
+
+@traced('transform.lag_features')
+def build_lag_features(series_df, efa_index, parameters_lags=None, parameters_rolling=None, parameters_weekly=None,
+                       out=None):
+    '''
+    Builds lag, rolling-window and same-block-previous-week features on an EFA grid
+
+    Each source column is aligned once to a contiguous EFA-block array; every
+    lag is then a slice of that array and every rolling statistic a reduction
+    over a strided window view, so the cost barely grows with the number of
+    features. Rolling windows end ``lag`` blocks before the output block
+    (default 6, i.e. values known a day ahead).
+
+    Parameters:
+    series_df (dataframe): EFA-indexed source values covering the lookback of efa_index
+    efa_index (pd.DatetimeIndex): contiguous 4-hourly output index (see get_efa_index)
+    parameters_lags (dict): e.g. {'dcl_price': [6, 12]} -> dcl_price_lag_6, dcl_price_lag_12
+    parameters_rolling (dict): e.g. {'dcl_price': {'windows': [6, 42], 'stats': ['min', 'mean'], 'lag': 6}}
+                               -> dcl_price_roll_6_min, dcl_price_roll_6_mean, dcl_price_roll_42_min, ...
+    parameters_weekly (dict): e.g. {'dcl_price': [1, 2]} -> dcl_price_week_lag_1, dcl_price_week_lag_2
+                              (same EFA block one and two weeks before)
+    out (np.ndarray): optional (len(efa_index) x n_features) array the features are written into,
+                      e.g. a view of a preallocated feature matrix (see feature_matrix.FeatureMatrix)
+
+    Returns:
+    dataframe: features indexed by efa_index (wrapping out when given)
+    '''
+    parameters_lags = parameters_lags or {}
+    parameters_rolling = parameters_rolling or {}
+    parameters_weekly = parameters_weekly or {}
+    parameters = list(dict.fromkeys([*parameters_lags, *parameters_rolling, *parameters_weekly]))
+    history = get_lookback_blocks(parameters_lags, parameters_rolling, parameters_weekly)
+    n_out = len(efa_index)
+    columns = get_lag_feature_names(parameters_lags, parameters_rolling, parameters_weekly)
+    if(out is None):
+        out = np.empty((n_out, len(columns)))
+    aligned = align_to_efa_grid(series_df.reindex(columns = parameters), efa_index[0] - history*EFA_BLOCK, history + n_out)
+    column_position = {parameter: j for j, parameter in enumerate(parameters)}
+
+    k = 0 # output column, in get_lag_feature_names order
+    for parameter, lags in parameters_lags.items():
+        j = column_position[parameter]
+        for lag in lags:
+            out[:, k] = aligned[history - lag: history - lag + n_out, j]
+            k += 1
+
+    for parameter, rolling in parameters_rolling.items():
+        j = column_position[parameter]
+        lag = rolling.get('lag', 6)
+        for window in rolling['windows']:
+            # windows[k] covers aligned rows k .. k+window-1; output row i needs the window ending at history+i-lag
+            first = history - lag - window + 1
+            windows = sliding_window_view(aligned[:, j], window)[first: first + n_out]
+            with warnings.catch_warnings(), np.errstate(invalid = 'ignore'):
+                warnings.simplefilter('ignore', category = RuntimeWarning) # all-NaN windows -> NaN
+                for stat in rolling['stats']:
+                    out[:, k] = ROLLING_STATS[stat](windows, axis = 1)
+                    k += 1
+
+    for parameter, weeks in parameters_weekly.items():
+        j = column_position[parameter]
+        for week in weeks:
+            lag = BLOCKS_PER_WEEK*week
+            out[:, k] = aligned[history - lag: history - lag + n_out, j]
+            k += 1
+
+    return pd.DataFrame(out, index = efa_index, columns = columns, copy = False)
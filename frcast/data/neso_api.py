@@ -0,0 +1,204 @@
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from frcast.tracing import count
+from urllib3.util.retry import Retry
+
+import numpy as np
+import os
+import pandas as pd
+import requests
+import threading
+
+NESO_API_URL = os.environ.get('NESO_API_URL', 'https://api.neso.energy/api/3/action')
+TIMEOUT = 60 # seconds, per request
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5 # sleeps 0.5 s, 1 s, 2 s between retries
+WINDOW_DAYS = 31 # long date ranges are split into windows of this many days
+MAX_WORKERS = int(os.environ.get('FRCAST_NESO_MAX_WORKERS', 4))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class NesoApiError(RuntimeError):
+    '''Raised when a NESO datastore request fails after all retries or returns an error'''
+
+
+def get_session():
+    '''
+    Returns the process-wide requests session used for every NESO API call.
+
+    The session keeps connections alive and pools up to MAX_WORKERS of them,
+    and retries connection errors and 429/5xx responses with exponential backoff.
+    '''
+    global _session
+    with _session_lock:
+        if(_session is None):
+            retry = Retry(total = MAX_RETRIES, backoff_factor = BACKOFF_FACTOR,
+                          status_forcelist = (429, 500, 502, 503, 504),
+                          allowed_methods = ('GET',))
+            adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = max(MAX_WORKERS, 1), max_retries = retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+    return _session
+
+
+def datastore_search_sql(sql, timeout=None):
+    '''
+    Runs one SQL query against the NESO datastore
+
+    Parameters:
+    sql (str): SQL query (not URL encoded)
+    timeout (float): seconds before the request is abandoned, defaults to TIMEOUT
+
+    Returns:
+    dict: the "result" member of the API response ("records", and "records_truncated"
+          when the server row limit was hit)
+    '''
+    timeout = TIMEOUT if timeout is None else timeout
+    try:
+        response = get_session().get(f'{NESO_API_URL}/datastore_search_sql',
+                                     params = {'sql': sql}, timeout = timeout)
+        response.raise_for_status()
+        count('requests')
+        count('bytes_downloaded', len(response.content))
+        data = response.json()
+    except (requests.RequestException, ValueError) as error:
+        raise NesoApiError(f'NESO datastore request failed: {error}') from error
+    if(not data.get('success', False)):
+        raise NesoApiError(f'NESO datastore returned an error: {data.get("error")}')
+    return data['result']
+
+
+def split_date_range(start_date, end_date, window_days=None):
+    '''
+    Splits the days from start_date to end_date (inclusive) into consecutive windows
+
+    Example
+    -------
+    >>> split_date_range(pd.Timestamp('2025-01-01'), pd.Timestamp('2025-01-05'), window_days=2)
+    [(Timestamp('2025-01-01 00:00:00'), Timestamp('2025-01-02 00:00:00')), (Timestamp('2025-01-03 00:00:00'), Timestamp('2025-01-04 00:00:00')), (Timestamp('2025-01-05 00:00:00'), Timestamp('2025-01-05 00:00:00'))]
+    '''
+    window_days = WINDOW_DAYS if window_days is None else window_days
+    window_starts = pd.date_range(start_date, end_date, freq = f'{window_days}D')
+    return [(window_start, min(window_start + pd.Timedelta(days = window_days - 1), end_date))
+            for window_start in window_starts]
+
+
+def get_select_clause(schema=None):
+    '''Returns the SELECT list of a query: the quoted schema columns, or * without a schema'''
+    if(not schema):
+        return '*'
+    return ', '.join(f'"{column}"' for column in schema)
+
+
+def decode_records(records, schema):
+    '''
+    Decodes JSON records into a dataframe of typed numpy columns, one per schema column
+
+    Parameters:
+    records (list): records (dicts) of a datastore response
+    schema (dict): API column name -> dtype, where dtype is a numpy dtype
+                   (e.g. "float64", "int64"), "datetime64" for ISO 8601 strings
+                   (at pandas' parsing resolution, or e.g. "datetime64[ns]"), or "str" for text
+
+    Returns:
+    dataframe: one column per schema entry, in schema order; missing (None) values
+               are missing in the text, datetime and float columns, and an integer
+               column with missing values takes pandas' nullable integer dtype (e.g. "Int64")
+
+    Example
+    -------
+    >>> decode_records([{'clearingPrice': '4.5', 'deliveryStart': '2025-01-01T22:00:00'}],
+    ...                {'deliveryStart': 'datetime64[ns]', 'clearingPrice': 'float64'}).dtypes.tolist()
+    [dtype('<M8[ns]'), dtype('float64')]
+    '''
+    columns = {}
+    for column, dtype in schema.items():
+        values = [record.get(column) for record in records]
+        if(dtype == 'str'):
+            columns[column] = np.array(values, dtype = object)
+        elif(dtype.startswith('datetime64')):
+            columns[column] = pd.to_datetime(values, format = 'ISO8601').to_numpy()
+            if(dtype != 'datetime64'):
+                columns[column] = columns[column].astype(dtype)
+        elif(np.dtype(dtype).kind in 'iu' and None in values):
+            nullable_dtype = ('UInt' if np.dtype(dtype).kind == 'u' else 'Int') + str(8*np.dtype(dtype).itemsize)
+            columns[column] = pd.array(values, dtype = nullable_dtype)
+        else: # None decodes to NaN in float columns
+            columns[column] = np.array(values, dtype = dtype)
+    return pd.DataFrame(columns)
+
+
+def _fetch_window(resource_id, date_column, start_date, end_date, where, schema=None):
+    query_end_date = end_date + pd.Timedelta(days = 1)
+    query = f'''SELECT {get_select_clause(schema)} FROM "{resource_id}"
+            WHERE "{date_column}" >= '{start_date.strftime('%Y-%m-%d')}'
+            AND "{date_column}" < '{query_end_date.strftime('%Y-%m-%d')}'
+            '''
+    if(where):
+        query += f'AND {where}'
+    result = datastore_search_sql(query)
+    if(result.get('records_truncated', False)):
+        # Server row limit hit: split the window in two rather than silently losing rows
+        if(start_date == end_date):
+            raise NesoApiError(f'More records than the server row limit for {resource_id} on {start_date.date()}')
+        middle_date = start_date + (end_date - start_date) // 2
+        middle_date = middle_date.normalize()
+        return (_fetch_window(resource_id, date_column, start_date, middle_date, where, schema)
+                + _fetch_window(resource_id, date_column, middle_date + pd.Timedelta(days = 1), end_date, where, schema))
+    return result['records']
+
+
+def _fetch_window_df(resource_id, date_column, start_date, end_date, where, schema):
+    records = _fetch_window(resource_id, date_column, start_date, end_date, where, schema)
+    if(schema):
+        # Decoded in the worker thread so the record dicts of a window are freed as soon as it is done
+        return decode_records(records, schema)
+    return pd.DataFrame(records)
+
+
+def fetch_date_range(resource_id, date_column, start_date, end_date, where=None,
+                     window_days=None, max_workers=None, schema=None):
+    '''
+    Downloads the records of a resource for the days from start_date to end_date (inclusive).
+
+    The range is split into windows of window_days which are fetched concurrently
+    over the pooled session and stitched back together in date order. A window
+    that hits the server row limit is split further until it fits.
+
+    With a schema only its columns are requested (the SQL projects them) and
+    each window is decoded straight into typed columns (see decode_records).
+
+    Parameters:
+    resource_id (str): NESO datastore resource id
+    date_column (str): column the date range applies to (e.g. "deliveryStart")
+    start_date (pd.Timestamp): first day (inclusive)
+    end_date (pd.Timestamp): last day (inclusive)
+    where (str): optional extra SQL filter
+    window_days (int): days per request, defaults to WINDOW_DAYS
+    max_workers (int): concurrent requests, defaults to MAX_WORKERS
+    schema (dict): optional API column name -> dtype of the columns to fetch
+
+    Returns:
+    dataframe: records with the API's original column names (typed when a schema is given)
+    '''
+    start_date = pd.Timestamp(start_date).normalize()
+    end_date = pd.Timestamp(end_date).normalize()
+    max_workers = MAX_WORKERS if max_workers is None else max_workers
+    windows = split_date_range(start_date, end_date, window_days)
+    if(len(windows) == 1 or max_workers <= 1):
+        window_dfs = [_fetch_window_df(resource_id, date_column, window_start, window_end, where, schema)
+                      for window_start, window_end in windows]
+    else:
+        with ThreadPoolExecutor(max_workers = min(max_workers, len(windows))) as executor:
+            # map keeps the window order whatever order the responses arrive in
+            window_dfs = list(executor.map(lambda window: _fetch_window_df(resource_id, date_column,
+                                                                           window[0], window[1], where, schema),
+                                           windows))
+    window_dfs = [window_df for window_df in window_dfs if not window_df.empty]
+    if(len(window_dfs) == 0):
+        return decode_records([], schema) if schema else pd.DataFrame()
+    return pd.concat(window_dfs, ignore_index = True)
@@ -0,0 +1,166 @@
+from frcast.data.neso_api import decode_records, fetch_date_range
+from frcast.tracing import traced
+
+import hashlib
+import json
+import os
+import pandas as pd
+import threading
+
+CACHE_DIR = os.environ.get('FRCAST_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'frcast', 'neso'))
+MANIFEST_FILE = '_manifest.json'
+
+
+def get_dataset_cache_dir(resource_id, where=None, cache_dir=None, schema=None):
+    '''
+    Directory holding the cached partitions of one NESO datastore resource.
+
+    The same resource queried with a different filter (e.g. "serviceType") or
+    column schema holds different records, so both are hashed into the directory name.
+
+    Parameters:
+    resource_id (str): NESO datastore resource id
+    where (str): optional SQL filter applied on top of the date range
+    cache_dir (str): root of the cache, defaults to CACHE_DIR
+    schema (dict): optional API column name -> dtype of the cached columns
+
+    Returns:
+    str: path of the dataset directory
+    '''
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    dataset_key = resource_id
+    if(where):
+        dataset_key += '-' + hashlib.sha1(where.encode('utf-8')).hexdigest()[:8]
+    if(schema):
+        dataset_key += '-' + hashlib.sha1(json.dumps(schema).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(cache_dir, dataset_key)
+
+
+def _partition_path(dataset_dir, day):
+    return os.path.join(dataset_dir, f'delivery_date={day.strftime("%Y-%m-%d")}.parquet')
+
+
+def _tmp_path(path):
+    '''Temporary file next to path, unique per process and thread so concurrent writers never share one'''
+    return f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+
+
+def read_manifest(dataset_dir):
+    '''Returns the list of [start, end] date ranges (inclusive) already held in the cache'''
+    manifest_path = os.path.join(dataset_dir, MANIFEST_FILE)
+    if(not os.path.exists(manifest_path)):
+        return []
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return [[pd.Timestamp(start), pd.Timestamp(end)] for start, end in manifest['date_ranges']]
+
+
+def merge_date_ranges(date_ranges):
+    '''Merges overlapping or adjacent [start, end] day ranges into the smallest sorted list'''
+    merged = []
+    for start, end in sorted(date_ranges):
+        if(merged and start <= merged[-1][1] + pd.Timedelta(days = 1)):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def write_manifest(dataset_dir, date_ranges):
+    # Ranges another writer added since this one read the manifest are kept
+    date_ranges = read_manifest(dataset_dir) + list(date_ranges)
+    manifest = {'date_ranges': [[start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')]
+                                for start, end in merge_date_ranges(date_ranges)]}
+    tmp_path = _tmp_path(os.path.join(dataset_dir, MANIFEST_FILE))
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent = 1)
+    os.replace(tmp_path, os.path.join(dataset_dir, MANIFEST_FILE))
+
+
+def get_missing_date_ranges(date_ranges, start_date, end_date):
+    '''
+    Finds the contiguous runs of days in [start_date, end_date] not covered by the cache
+
+    Example
+    -------
+    >>> get_missing_date_ranges([[pd.Timestamp('2025-01-03'), pd.Timestamp('2025-01-05')]],
+    ...                         pd.Timestamp('2025-01-01'), pd.Timestamp('2025-01-07'))
+    [(Timestamp('2025-01-01 00:00:00'), Timestamp('2025-01-02 00:00:00')), (Timestamp('2025-01-06 00:00:00'), Timestamp('2025-01-07 00:00:00'))]
+    '''
+    missing = []
+    cursor = start_date
+    for cached_start, cached_end in merge_date_ranges(date_ranges):
+        if(cached_end < cursor or cached_start > end_date):
+            continue
+        if(cached_start > cursor):
+            missing.append((cursor, cached_start - pd.Timedelta(days = 1)))
+        cursor = max(cursor, cached_end + pd.Timedelta(days = 1))
+    if(cursor <= end_date):
+        missing.append((cursor, end_date))
+    return missing
+
+
+@traced('neso.fetch_cached_records')
+def fetch_cached_records(resource_id, date_column, start_date, end_date, where=None, cache_dir=None,
+                         schema=None):
+    '''
+    Returns raw NESO records for the days from start_date to end_date (inclusive),
+    downloading only the days that are not already in the local cache.
+
+    Records are stored as one Parquet file per delivery day under
+    ``<cache_dir>/<resource_id>/delivery_date=YYYY-MM-DD.parquet``. A manifest
+    keeps the date ranges already downloaded; only days before today are added
+    to it, so today's and future days (whose auction results or forecasts may
+    still be published) are fetched again on the next run. A fetched day without
+    records has its previous partition removed, so withdrawn records are not served.
+
+    With a schema only its columns are downloaded and they are cached with their
+    decoded dtypes (see neso_api.decode_records), so reads need no parsing.
+
+    Parameters:
+    resource_id (str): NESO datastore resource id
+    date_column (str): column used to partition the records by day (e.g. "deliveryStart")
+    start_date (str or pd.Timestamp): first day (inclusive)
+    end_date (str or pd.Timestamp): last day (inclusive)
+    where (str): optional SQL filter, e.g. "\\"serviceType\\" = 'Response'"
+    cache_dir (str): root of the cache, defaults to CACHE_DIR
+    schema (dict): optional API column name -> dtype of the columns to fetch
+
+    Returns:
+    dataframe: records with the API's original column names (typed when a schema is given)
+    '''
+    start_date = pd.Timestamp(start_date).normalize()
+    end_date = pd.Timestamp(end_date).normalize()
+    dataset_dir = get_dataset_cache_dir(resource_id, where, cache_dir, schema)
+    os.makedirs(dataset_dir, exist_ok = True)
+
+    date_ranges = read_manifest(dataset_dir)
+    last_final_day = pd.Timestamp.now().normalize() - pd.Timedelta(days = 1)
+    for missing_start, missing_end in get_missing_date_ranges(date_ranges, start_date, end_date):
+        records = fetch_date_range(resource_id, date_column, missing_start, missing_end, where, schema = schema)
+        fetched_days = []
+        if(not records.empty):
+            if(pd.api.types.is_datetime64_any_dtype(records[date_column])):
+                delivery_days = records[date_column].dt.normalize()
+            else:
+                delivery_days = pd.to_datetime(records[date_column].astype(str).str[:10])
+            for day, day_records in records.groupby(delivery_days, sort = False):
+                tmp_path = _tmp_path(_partition_path(dataset_dir, day))
+                day_records.reset_index(drop = True).to_parquet(tmp_path, index = False)
+                os.replace(tmp_path, _partition_path(dataset_dir, day))
+                fetched_days.append(day)
+        for day in pd.date_range(missing_start, missing_end, freq = '1D').difference(fetched_days):
+            try: # e.g. today's partition of an earlier run whose records are no longer published
+                os.remove(_partition_path(dataset_dir, day))
+            except FileNotFoundError:
+                pass
+        if(missing_start <= last_final_day):
+            date_ranges.append([missing_start, min(missing_end, last_final_day)])
+            write_manifest(dataset_dir, date_ranges)
+
+    partitions = [_partition_path(dataset_dir, day) for day in pd.date_range(start_date, end_date, freq = '1D')]
+    partitions = [pd.read_parquet(path) for path in partitions if os.path.exists(path)]
+    if(len(partitions) == 0):
+        return decode_records([], schema) if schema else pd.DataFrame()
+    return pd.concat(partitions, ignore_index = True)
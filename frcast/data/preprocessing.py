@@ -1,73 +1,244 @@
 from frcast.data.time_periods import get_efa_index
+from frcast.tracing import traced
+import numpy as np
 import pandas as pd
+import warnings
 
+SETTLEMENT_PERIOD = pd.Timedelta('30min')
+
+def _first_valid(blocks, reverse=False):
+    '''First (or last) non-NaN value along the settlement periods of every block'''
+    valid = ~np.isnan(blocks)
+    if(reverse):
+        positions = blocks.shape[1] - 1 - valid[:, ::-1].argmax(axis = 1)
+    else:
+        positions = valid.argmax(axis = 1)
+    values = np.take_along_axis(blocks, positions[:, np.newaxis], axis = 1)[:, 0]
+    return np.where(valid.any(axis = 1), values, np.nan)
+
+def _block_statistic(blocks, statistic):
+    '''
+    Computes one statistic over the settlement periods (axis 1) of a (blocks x SPs x series) array,
+    skipping missing periods like pandas does
+
+    statistic is one of min, max, mean, median, sum, std, var (ddof = 1), count,
+    first, last, ramp (last - first) or a quantile "q<percent>", e.g. "q90"
+    '''
+    if(statistic == 'min'):
+        return np.nanmin(blocks, axis = 1)
+    if(statistic == 'max'):
+        return np.nanmax(blocks, axis = 1)
+    if(statistic == 'mean'):
+        return np.nanmean(blocks, axis = 1)
+    if(statistic == 'median'):
+        return np.nanmedian(blocks, axis = 1)
+    if(statistic == 'sum'):
+        return np.nansum(blocks, axis = 1)
+    if(statistic == 'std'):
+        return np.nanstd(blocks, axis = 1, ddof = 1)
+    if(statistic == 'var'):
+        return np.nanvar(blocks, axis = 1, ddof = 1)
+    if(statistic == 'count'):
+        return (~np.isnan(blocks)).sum(axis = 1).astype('float64')
+    if(statistic == 'first'):
+        return _first_valid(blocks)
+    if(statistic == 'last'):
+        return _first_valid(blocks, reverse = True)
+    if(statistic == 'ramp'):
+        return _first_valid(blocks, reverse = True) - _first_valid(blocks)
+    if(statistic.startswith('q') and statistic[1:].isdigit()):
+        return np.nanquantile(blocks, int(statistic[1:])/100, axis = 1)
+    raise ValueError(f'Unknown aggregation statistic: {statistic}')
+
+@traced('transform.sp_to_efa')
 def aggregate_sp_to_efa(df: pd.DataFrame,
-                            aggregation_parameters: list, 
-                            freq = '4h'):
-        '''
-        aggregates half-hourly data  to four-hourly for parameters in the list
-
-        Parameters:
-        df (dataframe): A dataframe with timeseries index
-        aggregation_parameters (list): A list containing all required parameters to be aggregated, (e.g.: ['min', 'max'])
-        freq (str): Frequency for which data to be aggregated 
-                    default: 4h for EFA block duration
-
-        Returns:
-        dataframe: A timeseries dataframe of all aggregated_parameters at freq
-        '''
-        agg_df = df.copy()
-        agg_df = agg_df.resample(freq, origin = 'start').agg(aggregation_parameters)
-        if(isinstance(agg_df.columns, pd.MultiIndex)): # multiindex if df has one more than one columns
-            agg_df.columns = ['_'.join(col).lower() for col in agg_df.columns]
-        else:
-            parameter = df.columns.tolist()[0]
-            agg_df.columns = [parameter+ '_'+ col for col in agg_df.column]
-        # print('The aggregated data for is from', agg_df.index.min(), 'to', agg_df.index.max())
-        return agg_df
-
-def get_eac_auction_volume_or_price(eac_auction_df: pd.DataFrame, extracting_value: str):                                   
+                        aggregation_parameters: list,
+                        freq = '4h',
+                        columns = None):
+    '''
+    aggregates half-hourly data  to four-hourly for parameters in the list
+
+    The settlement periods are placed on a fixed half-hourly grid starting at the
+    first row (the start of EFA 1) and reshaped into a (blocks x 8 SPs x series)
+    array; every statistic is then computed for all series in one vectorized
+    pass. Settlement periods missing from the grid count as missing values, so
+    the short (46-SP) clock-change day has two empty periods in its EFA 1 block.
+    Repeated times, such as the two 01:00 and 01:30 periods of the long (50-SP)
+    day in local time, are all aggregated as pandas does: their EFA 1 block gets
+    ten periods. Data off the half-hourly grid falls back to pandas resampling.
+
+    Parameters:
+    df (dataframe): A dataframe with timeseries index
+    aggregation_parameters (list): A list containing all required parameters to be aggregated, (e.g.: ['min', 'max']),
+                                   any of min, max, mean, median, sum, std, var, count, first, last,
+                                   ramp (last - first) and quantiles as "q<percent>" (e.g. 'q90')
+    freq (str): Frequency for which data to be aggregated 
+                default: 4h for EFA block duration
+    columns (list): Output columns to compute (e.g. ['pbr_price_min']), all when None
+
+    Returns:
+    dataframe: A timeseries dataframe of all aggregated_parameters at freq,
+               with "<series>_<parameter>" columns
+    '''
+    if(df.empty):
+        return pd.DataFrame()
+    wanted = [(series, statistic, (str(series) + '_' + statistic).lower())
+              for series in df.columns for statistic in aggregation_parameters]
+    if(columns is not None): # Only the requested (series, statistic) pairs are computed
+        wanted = [(series, statistic, name) for series, statistic, name in wanted if name in columns]
+    origin = df.index[0]
+    block = pd.Timedelta(freq)
+    offsets = df.index - origin
+    if((offsets % SETTLEMENT_PERIOD != pd.Timedelta(0)).any() or block % SETTLEMENT_PERIOD != pd.Timedelta(0)):
+        agg_df = df.resample(freq, origin = 'start').agg(aggregation_parameters)
+        agg_df.columns = ['_'.join(map(str, col)).lower() for col in agg_df.columns]
+        return agg_df[[name for _, _, name in wanted]]
+
+    periods_per_block = block//SETTLEMENT_PERIOD
+    positions = np.asarray(offsets//SETTLEMENT_PERIOD, dtype = 'int64')
+    block_positions, periods = np.divmod(positions, periods_per_block)
+    if(df.index.has_duplicates): # repeated times: the rows of each block are stacked in order
+        periods = pd.Series(block_positions).groupby(block_positions).cumcount().to_numpy()
+        periods_per_block = max(periods_per_block, periods.max() + 1)
+    n_blocks = block_positions.max() + 1
+    blocks = np.full((n_blocks, periods_per_block, df.shape[1]), np.nan)
+    blocks[block_positions, periods] = df.to_numpy(dtype = 'float64')
+
+    series_positions = {series: position for position, series in enumerate(df.columns)}
+    statistics = {}
+    with warnings.catch_warnings(): # all-NaN blocks give NaN, as in pandas
+        warnings.simplefilter('ignore', category = RuntimeWarning)
+        for statistic in dict.fromkeys(statistic for _, statistic, _ in wanted):
+            series_wanted = [series_positions[series] for series, wanted_statistic, _ in wanted
+                             if wanted_statistic == statistic]
+            values = _block_statistic(blocks[:, :, series_wanted], statistic)
+            statistics.update({(df.columns[position], statistic): values[:, i]
+                               for i, position in enumerate(series_wanted)})
+    index = origin.to_datetime64() + np.arange(n_blocks)*block.to_timedelta64()
+    index = pd.DatetimeIndex(index.astype(df.index.dtype), name = df.index.name)
+    agg_df = pd.DataFrame({name: statistics[(series, statistic)] for series, statistic, name in wanted},
+                          index = index)
+    return agg_df
+
+AUCTION_VALUE_COLUMNS = {'price': 'clearing_price', 'volume': 'cleared_volume'}
+
+def _to_london_local(delivery_start):
+    '''
+    Converts UTC delivery starts (datetime64 or strings) to naive Europe/London wall-clock times
+
+    Returns the integer code of every row and the local time of each distinct
+    delivery start, so the time zone conversion runs once per delivery start
+    rather than once per auction row.
+    '''
+    codes, uniques = pd.factorize(delivery_start)
+    local_starts = pd.to_datetime(uniques, utc = True).tz_convert('Europe/London').tz_localize(None)
+    return codes, local_starts
+
+def _get_slot_positions(local_starts, freq):
+    '''
+    Maps local delivery starts to positions on a fixed-frequency grid of London wall-clock slots
+
+    The grid is anchored at 23:00 (the start of EFA 1), so both EFA blocks ("4h")
+    and settlement periods ("30min") fall on it. On the clock-change days the
+    grid keeps its local slots: the missing spring hour has no records, and the
+    repeated autumn hour maps both UTC instants to the same slot (deduplicated
+    by the caller). Starts off the grid fall back to a grid of the distinct starts.
+
+    Returns:
+    positions (ndarray): slot of every local start
+    grid (DatetimeIndex): local start time of every slot
+    '''
+    origin = local_starts.min().normalize() - pd.Timedelta(hours = 1)
+    step = pd.Timedelta(freq)
+    offsets = local_starts - origin
+    if((offsets % step == pd.Timedelta(0)).all()):
+        positions = np.asarray(offsets//step, dtype = 'int64')
+        grid = origin.to_datetime64() + np.arange(positions.max() + 1)*step.to_timedelta64()
+        grid = pd.DatetimeIndex(grid.astype(local_starts.dtype))
+    else:
+        grid, positions = np.unique(local_starts, return_inverse = True)
+        grid = pd.DatetimeIndex(grid)
+    return positions, grid
+
+@traced('transform.auction_pivot')
+def pivot_auction_results(eac_auction_df: pd.DataFrame, extracting_values=('price', 'volume'), freq='4h'):
+    '''
+    Pivots raw auction results to one time series per auction product for each of the extracting values
+
+    Delivery starts are mapped to slots on a London-local grid of freq and
+    auction products to categorical codes; the values are scattered into a
+    preallocated (slot x product) array. For a repeated (delivery start, product)
+    the first record wins. All extracting values come out of the same pass.
+
+    Parameters:
+    eac_auction_df (dataframe): raw auction results with delivery_start (UTC), auction_product
+                                and the clearing_price and/or cleared_volume columns
+    extracting_values (tuple): any of 'price' and 'volume'; values whose column is missing are skipped
+    freq (str): grid frequency, "4h" for EFA blocks and "30min" for settlement periods
+
+    Returns:
+    dict: extracting value -> dataframe indexed by local delivery start ("delivery_start")
+          with one "<product>_<value>" column per auction product (sorted); records
+          without a delivery start or auction product are left out
+    '''
+    extracting_values = [value for value in extracting_values
+                         if AUCTION_VALUE_COLUMNS[value] in eac_auction_df.columns]
+    # factorize codes a missing start or product as -1, which would fall into another cell
+    placed = eac_auction_df['delivery_start'].notna() & eac_auction_df['auction_product'].notna()
+    if(not placed.all()):
+        eac_auction_df = eac_auction_df[placed]
+    start_codes, local_starts = _to_london_local(eac_auction_df['delivery_start'].to_numpy())
+    product_codes, products = pd.factorize(eac_auction_df['auction_product'].to_numpy(), sort = True)
+    if(len(local_starts) == 0):
+        return {value: pd.DataFrame() for value in extracting_values}
+
+    start_positions, grid = _get_slot_positions(local_starts, freq)
+    slots = start_positions[start_codes]
+    cells = slots*len(products) + product_codes
+    # np.unique returns the first occurrence of every (slot, product) cell: first record wins
+    cells, first_rows = np.unique(cells, return_index = True)
+    filled_slots = np.zeros(len(grid), dtype = bool)
+    filled_slots[slots] = True
+
+    index = pd.DatetimeIndex(grid[filled_slots], freq = None, name = 'delivery_start')
+    pivoted = {}
+    for value in extracting_values:
+        values = np.full(len(grid)*len(products), np.nan)
+        values[cells] = eac_auction_df[AUCTION_VALUE_COLUMNS[value]].to_numpy(dtype = 'float64')[first_rows]
+        values = values.reshape(len(grid), len(products))[filled_slots]
+        pivoted[value] = pd.DataFrame(values, index = index,
+                                      columns = [(str(product) + '_' + value).lower() for product in products])
+    return pivoted
+
+def get_eac_auction_volume_or_price(eac_auction_df: pd.DataFrame, extracting_value: str, freq='4h'):                                   
     '''
     Transforms raw auction dataframe to clearing price time series
 
     Parameters:
     eac_auction_df (dataframe): A dataframe of auctioned results
     extracting_value (str): It must be ['volume', 'price'] for cleared volume and clearing price, respectively.
+    freq (str): grid frequency of the delivery periods, "4h" (EFA blocks) or "30min" (settlement periods)
     
     Output:
     Dataframe: Timeseries for extracting value of the service type
     '''
-    service_stacked_df = eac_auction_df.copy()
-    # Converting from string -> utc -> 'London' -> Naive timezone 
-    # 2025-04-09T22:00:00 -> 2025-04-09 22:00:00 -> 2025-04-09 22:00:00+01:00 -> 2025-04-09 23:00:00
-    service_stacked_df.delivery_start = pd.to_datetime(service_stacked_df.delivery_start, utc = True).dt.tz_convert('Europe/London').dt.tz_localize(None, nonexistent='shift_forward')
-    service_stacked_df.delivery_end = pd.to_datetime(service_stacked_df.delivery_end, utc = True).dt.tz_convert('Europe/London').dt.tz_localize(None, nonexistent='shift_forward')
-
-    service_stacked_df.index = service_stacked_df.delivery_start
-    # response_df.head()
-    start_time, end_time = service_stacked_df.index.min(), service_stacked_df.index.max()
-    # print(service_type, 'service data is for the period from', start_time, 'to', end_time)  
-    index_columns = ['delivery_start', 'auction_product']
-    if(extracting_value == 'volume'):
-        extracting_column = ['cleared_volume']
-    elif(extracting_value == 'price'):
-        extracting_column = ['clearing_price']
-    else:
-        extracting_column = []
+    if(extracting_value not in AUCTION_VALUE_COLUMNS):
         print('Input of extracting value is different than volume/price')
-    if(len(extracting_column)==0):
-        unstacked_df = pd.DataFrame()
-    else:
-        df_indexed =  service_stacked_df[index_columns + extracting_column].set_index(index_columns)
-        # df_indexed.drop_duplicates(inplace=True, keep='first') # Duplicate indexes can occur sometime
-        df_indexed = df_indexed[~df_indexed.index.duplicated(keep='first')]
-        unstacked_df = df_indexed.unstack() # Mutliindex dataframe with level 1 -> clearing_price and level 2 -> services (DCL, DCH)
-        unstacked_df.columns = unstacked_df.columns.get_level_values(1)
-        unstacked_df = unstacked_df.rename_axis('delivery_start')
-        unstacked_df.sort_index(inplace = True)
-        unstacked_df.columns = [(col+'_'+extracting_value).lower() for col in unstacked_df.columns]
-    return unstacked_df
+        return pd.DataFrame()
+    return pivot_auction_results(eac_auction_df, [extracting_value], freq)[extracting_value]
 
+# Temporal features of an EFA block start time; 'working day' is 0 on weekdays and 1 on weekends
+TEMPORAL_FEATURES = {'hour': lambda efa_index: efa_index.hour,
+                     'day': lambda efa_index: efa_index.day,
+                     'month': lambda efa_index: efa_index.month,
+                     'weekday': lambda efa_index: efa_index.weekday, # Monday ->0, Sunday -> 6
+                     'working day': lambda efa_index: efa_index.weekday >= 5}
+
+def get_temporal_feature_values(efa_index, temporal_feature):
+    '''Returns the values of one temporal feature (see TEMPORAL_FEATURES) as an integer array'''
+    return np.asarray(TEMPORAL_FEATURES[temporal_feature](efa_index), dtype = 'int64')
+
+@traced('features.temporal')
 def create_temporal_features_df(start_date, end_date, temporal_features):
     '''Builds a dataframe of temporal features 
 
@@ -79,26 +250,8 @@ def create_temporal_features_df(start_date, end_date, temporal_features):
     # efa_start_time = pd.to_datetime(start_date) - pd.Timedelta(hours = 1) # EFA 1 starts at 23:00 of the previous day
     # efa_end_time = pd.to_datetime(end_date) + pd.Timedelta(hours = 19) # EFA ends at 19:00 of the day
     efa_index = get_efa_index(start_date, end_date)
-    temporal_features_df = pd.DataFrame(index = efa_index, 
-                                        columns = temporal_features,
-                                        )
-    if('hour' in temporal_features):
-        temporal_features_df.loc[:, 'hour'] = efa_index.hour
-    
-    if('day' in temporal_features):
-        temporal_features_df.loc[:, 'day'] = efa_index.day
-
-    if('month' in temporal_features):
-        temporal_features_df.loc[:, 'month'] = efa_index.month    
-    
-    if('weekday' in temporal_features):
-        temporal_features_df.loc[:, 'weekday'] = efa_index.weekday # Monday ->0, Sunday -> 6
-        # based on weekday (0, 1, 2, 3, 4) working day -> 0 , weekend (5, 6) ->1 
-    if('working day' in temporal_features):
-        temporal_features_df.loc[:, 'weekday'] = efa_index.weekday # Monday ->0, Sunday -> 6
-        temporal_features_df .loc[:, 'working day'] = temporal_features_df.weekday.apply(lambda x:0 if x<5 else 1)
-        if('weekday' not in temporal_features):
-            temporal_features_df.drop('weekday', axis = 1, inplace = True)
-    temporal_features_df = temporal_features_df.astype('int64')
+    temporal_features_df = pd.DataFrame({temporal_feature: get_temporal_feature_values(efa_index, temporal_feature)
+                                         for temporal_feature in temporal_features},
+                                        index = efa_index, columns = temporal_features)
     return temporal_features_df
 
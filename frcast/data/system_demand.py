@@ -1,51 +1,82 @@
+from frcast.data.neso_cache import fetch_cached_records
 from frcast.data.preprocessing import aggregate_sp_to_efa
 from frcast.data.time_periods import get_query_periods, get_settlement_periods
-from urllib.parse import quote
+from frcast.data.vintages import build_vintage_table, get_decision_times, lookup_as_of
+from frcast.tracing import traced
 
 import pandas as pd
-import requests
 
+DEMAND_FORECAST_RESOURCE_ID = '9847e7bb-986e-49be-8138-717b25933fbb'
+# Only the columns used downstream are fetched and cached, already typed
+DEMAND_FORECAST_SCHEMA = {'TARGETDATE': 'datetime64', 'CP_ST_TIME': 'int64', 'FORECASTDEMAND': 'float64'}
+DEMAND_AGGREGATIONS = ['min', 'max', 'mean']
+# Demand forecast columns used as model features (aggregate_sp_to_efa names them <column>_<statistic>)
+DEMAND_FEATURES = ['forecastdemand_' + aggregation for aggregation in DEMAND_AGGREGATIONS]
+# The dataset has no publish time: a forecast is taken as published this long before the start of its target date
+DEMAND_PUBLISH_LEAD = pd.Timedelta(days = 1)
 
-def fetch_demand_forecast(start_date, end_date):
-    '''Return half-hourly demand data inclusive start and end date'''
+
+@traced('fetch.demand_forecast')
+def fetch_demand_forecast(start_date, end_date, as_of=None):
+    '''
+    Return half-hourly demand data inclusive start and end date
+
+    Forecasts go through a vintage table keyed by (start time, proxy publish time),
+    where the proxy publish time is the target date minus DEMAND_PUBLISH_LEAD and
+    later rows of the same start time are later revisions. Each start time gets
+    the latest revision known at its decision time (see vintages.get_decision_times),
+    capped at as_of when given.
+
+    This is not leak-free: every revision of a start time has the same proxy
+    publish time, before the decision time, so the lookup keeps the last row
+    (as drop_duplicates(keep = 'last') would), including revisions published
+    after the decision time.
+
+    Raises:
+    NesoApiError: the records could not be fetched from the NESO API
+    '''
     query_start_date, query_end_date = get_query_periods(start_date, end_date)
     sp_start_time, sp_end_time = get_settlement_periods(start_date, end_date)
-    query = f'''SELECT * FROM "9847e7bb-986e-49be-8138-717b25933fbb"
-    WHERE "TARGETDATE" >= '{query_start_date}' AND "TARGETDATE" <= '{query_end_date}'
-    '''
-    # URL encode query
-    url = f"https://api.neso.energy/api/3/action/datastore_search_sql?sql={quote(query)}"
-
-    # Fetch data
-    try:
-        response = requests.get(url)
-        data = response.json()
-        demand_forecast = pd.DataFrame(data['result']['records'])
+    # Fetch data (only the days missing from the local cache)
+    demand_forecast = fetch_cached_records(DEMAND_FORECAST_RESOURCE_ID, 'TARGETDATE', query_start_date, query_end_date,
+                                           schema = DEMAND_FORECAST_SCHEMA)
+    if(not demand_forecast.empty):
         demand_forecast.columns = [col.lower().lstrip('_') for col in demand_forecast.columns]
 
         # Determines the coordinal start time in datetime format
-        demand_forecast.cp_st_time = demand_forecast.cp_st_time.astype('int64')
         demand_forecast['hour'] = demand_forecast['cp_st_time']//100
         demand_forecast['minutes'] = demand_forecast['cp_st_time']%100
-        demand_forecast['start_time'] = (pd.to_datetime(demand_forecast['targetdate']) 
+        demand_forecast['start_time'] = (demand_forecast['targetdate'] 
                                         + pd.to_timedelta(demand_forecast['hour'], unit = 'h') 
                                         + pd.to_timedelta(demand_forecast['minutes'], unit = 'm'))
-        # Set start time as index and keep only last forecast for duplicated index
-        demand_forecast.set_index('start_time', inplace = True)
-        demand_forecast = demand_forecast[~demand_forecast.index.duplicated(keep='last')]
+        # Records without a target date or cardinal point time cannot be placed
+        demand_forecast = demand_forecast[demand_forecast['start_time'].notna()]
+        # Keep the latest forecast of each start time known at its decision time
+        vintages = build_vintage_table(demand_forecast['start_time'],
+                                       demand_forecast['targetdate'] - DEMAND_PUBLISH_LEAD,
+                                       demand_forecast[['forecastdemand']])
+        target_times = pd.DatetimeIndex(vintages['target_time'].unique())
+        demand_forecast = lookup_as_of(vintages, target_times, get_decision_times(target_times, as_of))
+        demand_forecast = demand_forecast['forecastdemand'].dropna().rename_axis('start_time')
         # Interploate data at 30 minutes freq
-        demand_forecast = demand_forecast['forecastdemand'].resample('30min').interpolate(method='quadratic')
+        demand_forecast = demand_forecast.resample('30min').interpolate(method='quadratic')
         demand_forecast = demand_forecast[(demand_forecast.index >= sp_start_time)
                                         &(demand_forecast.index <= sp_end_time)]
         demand_forecast = pd.DataFrame(demand_forecast)
-    except:
-        demand_forecasat = pd.DataFrame()
-        print('Demand forecast data is not fetched')
 
     return demand_forecast
 
-def aggregate_demand(start_date, end_date):
-    demand_forecast = fetch_demand_forecast(start_date, end_date)
-    demand_features_df = aggregate_sp_to_efa(demand_forecast, ['min', 'max', 'mean'])
+@traced('features.demand')
+def aggregate_demand(start_date, end_date, as_of=None, demand_forecast=None, columns=None):
+    '''
+    Returns the EFA-block aggregates of the demand forecast (see DEMAND_FEATURES)
+
+    Parameters:
+    demand_forecast (dataframe): half-hourly forecast from fetch_demand_forecast, fetched here when not given
+    columns (list): features to compute, all of DEMAND_FEATURES when None
+    '''
+    if(demand_forecast is None):
+        demand_forecast = fetch_demand_forecast(start_date, end_date, as_of)
+    demand_features_df = aggregate_sp_to_efa(demand_forecast, DEMAND_AGGREGATIONS, columns = columns)
     return demand_features_df
 
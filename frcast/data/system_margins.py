@@ -1,60 +1,81 @@
+from frcast.data.neso_cache import fetch_cached_records
 from frcast.data.time_periods import get_query_periods, get_settlement_periods
-from urllib.parse import quote
+from frcast.data.vintages import build_vintage_table, get_decision_times, lookup_as_of
+from frcast.tracing import traced
 
 import pandas as pd
-import requests
 
+MARGINS_RESOURCE_ID = '0eede912-8820-4c66-a58a-f7436d36b95f'
+# Only the columns of the declared margins features are fetched and cached, already typed
+MARGINS_SCHEMA = {'Date': 'datetime64', 'Publish Date': 'datetime64',
+                  'Negative Reserve': 'float64', 'High Freq Response Requirement': 'float64',
+                  'Generator Availability': 'float64'}
+# Margins published on a date are used from the next day on
+MARGINS_PUBLISH_LAG = pd.Timedelta(days = 1)
+# Margins columns used as model features
+MARGINS_FEATURES = ['high_freq_response_requirement', 'negative_reserve', 'generator_availability']
 
-def fetch_forecasted_margins(start_date, end_date):
+
+@traced('fetch.margins')
+def fetch_forecasted_margins(start_date, end_date, as_of=None, columns=None):
     '''
     Resamples forecasted negative reserve, high frequency requirements, and generation availability margins at EFA block
 
+    Every published vintage is kept in a vintage table; each day gets the latest
+    forecast usable at its decision time (see vintages.get_decision_times), i.e.
+    published at least MARGINS_PUBLISH_LAG before it. With the default decision
+    time this is the forecast published two days ahead, falling back to older
+    vintages when it is missing.
+
     Parameteters:
     start_date (str): start date (pd.Timestamp)
     end_date (str): end date string (pd.Timestamp)
+    as_of (str or pd.Timestamp): optional latest decision time, for features as known at that time
+    columns (list): margins columns to look up (see MARGINS_FEATURES), all of them when None
 
     Retruns
     dataframe: A timeseries dataframe at EFA frequency
+
+    Raises:
+    NesoApiError: the records could not be fetched from the NESO API
     '''
     query_start_date, query_end_date = get_query_periods(start_date, end_date)
     
-    query = f'''SELECT * FROM "0eede912-8820-4c66-a58a-f7436d36b95f"
-                WHERE 
-                "Date" >= '{query_start_date}'
-                AND "Date" <= '{query_end_date}'
-                '''
-    # URL encode query 
-    url = f"https://api.neso.energy/api/3/action/datastore_search_sql?sql={quote(query)}"
-    # Fetching data from URL
-    try:
-        response = requests.get(url)
-        data = response.json()
-        df = pd.DataFrame(data['result']['records'])
+    # Fetching data (only the days missing from the local cache)
+    df = fetch_cached_records(MARGINS_RESOURCE_ID, 'Date', query_start_date, query_end_date,
+                              schema = MARGINS_SCHEMA)
+    if(not df.empty):
         # Standardizing column names and selecting relevant columns
         df.columns = [col.lower().replace(' ', '_').lstrip('_').replace('/', '') for col in df.columns]
-        df = df[[ 'negative_reserve', 'high_freq_response_requirement', 
-                'generation_availability_margin', 'generator_availability', 'opmr_total', 'national_surplus',
-                'date', 'publish_date']]
-        # selecting the latest available forecasting data
-        df.publish_date = pd.to_datetime(df.publish_date)
-        df.date = pd.to_datetime(df.date)
-        df = df[(df['date']-df['publish_date'])=='2 days']
-        df.set_index('date', inplace = True) 
+        margin_columns = MARGINS_FEATURES if columns is None else list(columns)
+        # selecting the latest forecast available at the decision time of each day
+        vintages = build_vintage_table(df['date'], df['publish_date'], df[margin_columns])
+        target_dates = pd.DatetimeIndex(vintages['target_time'].unique())
+        decision_times = get_decision_times(target_dates - pd.Timedelta(hours = 1), as_of) - MARGINS_PUBLISH_LAG
+        df = lookup_as_of(vintages, target_dates, decision_times).rename(columns = {'publish_time': 'publish_date'})
+        df = df.loc[df.publish_date.notna(), margin_columns + ['publish_date']].rename_axis('date')
         # Shifting index by -1 hour for EFA block starting from 23:00
         df.index = df.index-pd.Timedelta(hours = 1)
-        # Resampling data by 
-
-    except:
-        df = pd.DataFrame()                      
 
     return df
 
-def resample_margins(start_date, end_date):
-    margins = fetch_forecasted_margins(start_date, end_date)
-    margins_resampled = margins.resample('4h', origin = 'start').ffill()
+@traced('features.margins')
+def resample_margins(start_date, end_date, as_of=None, margins=None, columns=None):
+    '''
+    Returns the forecasted margins features at EFA blocks (see fetch_forecasted_margins)
+
+    Parameters:
+    margins (dataframe): margins already fetched with fetch_forecasted_margins, fetched here when not given
+    columns (list): features to return (see MARGINS_FEATURES), all of them when None
+    '''
+    columns = MARGINS_FEATURES if columns is None else list(columns)
+    if(margins is None):
+        margins = fetch_forecasted_margins(start_date, end_date, as_of, columns)
+    if(margins.empty):
+        return pd.DataFrame(columns = columns, dtype = 'float64')
+    margins_resampled = margins[columns].resample('4h', origin = 'start').ffill()
     sp_start_time, sp_end_time = get_settlement_periods(start_date, end_date)
     margins_resampled = margins_resampled[(margins_resampled.index >= sp_start_time)&(margins_resampled.index <= sp_end_time)]
     margins_resampled.ffill(inplace = True)
-    margins_resampled = margins_resampled[['high_freq_response_requirement',  'negative_reserve', 'generator_availability']]
     return margins_resampled
 
@@ -1,11 +1,76 @@
-from frcast.data.system_margins import resample_margins
-from frcast.data.system_demand import aggregate_demand
-from frcast.data.br_price import aggregate_br_price
-from frcast.data.fr_prices import create_lag_shifted_df, get_historical_fr_price
-from frcast.data.preprocessing import create_temporal_features_df
+from frcast.data.feature_graph import (DEFAULT_FEATURES, PARAMETERS_LAGS, TEMPORAL_FEATURES, get_feature_lookback_blocks,
+                                       resolve_features)
+from frcast.data.fr_prices import get_historical_fr_price, get_lag_fetch_periods, slice_efa_window
+from frcast.data.lag_features import get_lag_feature_names
+from frcast.tracing import traced
 import pandas as pd
 
-def get_train_features_target_df(train_end_date=None):
+# FR-EAC data is only available at given API from 2024-03-13
+FR_EAC_START_DATE = pd.Timestamp('2024-03-13')
+# Days of the training window ending at the training end date
+TRAIN_WINDOW_DAYS = 365
+# Clearing prices of every FR service we bid in, the targets of the multi-service models
+FR_SERVICE_TARGETS = ['dcl_price', 'dch_price', 'dml_price', 'dmh_price', 'drl_price', 'drh_price']
+
+@traced('features.build')
+def build_features_df(start_date, end_date, clearing_price_fr=None, parameters_rolling=None, parameters_weekly=None,
+                      as_of=None, features=None):
+    """
+    Build the model input features for every EFA block of the trading days
+    from start_date to end_date (inclusive).
+
+    The features are resolved on the feature graph (see ``resolve_features``):
+    only the sources and transforms the requested columns need are run, the
+    independent ones concurrently, and their columns are written in place into
+    one preallocated matrix on the ``get_efa_index`` grid (see ``FeatureMatrix``):
+    float32 columns for the margins, demand, BR price and FR price lag features,
+    int8 columns for the calendar features. Blocks a source has no value for are
+    NaN. With tracing enabled the matrix size is recorded on the ``features.matrix`` span.
+
+    Parameters
+    ----------
+    start_date, end_date : str or pd.Timestamp
+        First and last trading day (inclusive).
+    clearing_price_fr : pd.DataFrame, optional
+        FR clearing prices covering ``get_lag_fetch_periods(start_date, end_date)``;
+        fetched when not provided.
+    parameters_rolling, parameters_weekly : dict, optional
+        Extra rolling-window and previous-week FR price features, see
+        ``build_lag_features``. The FR prices passed in must cover their lookback.
+    as_of : str or pd.Timestamp, optional
+        Latest decision time of the forecast-vintage features (margins, demand).
+        By default each trading day uses the forecasts known at its own decision
+        time (09:00 the day before), see ``vintages.get_decision_times``.
+        Only the margins are leak-free: the demand dataset has no publish time,
+        so all revisions of a start time share a proxy publish time (its target
+        date minus ``system_demand.DEMAND_PUBLISH_LEAD``). The demand features
+        then hold the latest revision in the dataset, which may be published
+        after the decision time, and ``as_of`` only leaves out the target dates
+        more than that lead after it.
+    features : list of str, optional
+        Feature columns to build, in this order, e.g. the ``feature_names`` of a
+        saved model's metadata; defaults to ``DEFAULT_FEATURES``. Any FR price lag,
+        rolling-window or previous-week feature name can be requested (see
+        ``feature_graph.LAG_FEATURE_PATTERN``). The features of ``parameters_rolling``
+        and ``parameters_weekly`` are added to them.
+
+    Returns
+    -------
+    pd.DataFrame
+        Model input features indexed by EFA block start time.
+    """
+    start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    extra_features = get_lag_feature_names(None, parameters_rolling, parameters_weekly)
+    if(features is None):
+        # Extra lag features go next to the default ones, before the calendar features
+        features = DEFAULT_FEATURES[:-len(TEMPORAL_FEATURES)] + extra_features + TEMPORAL_FEATURES
+    else:
+        features = list(features) + [feature for feature in extra_features if feature not in features]
+    return resolve_features(features, start_date, end_date, clearing_price_fr, as_of, parameters_rolling)
+
+@traced('features.train')
+def get_train_features_target_df(train_end_date=None, return_fr_prices=False, as_of=None, targets='dcl_price',
+                                 features=None):
     """
     Retrieve the model train features as a DataFrame for one year
 
@@ -17,49 +82,69 @@ def get_train_features_target_df(train_end_date=None):
     ----------
     start_date : str or pd.Timestamp, optional
         Start date for the feature extraction period. Default is None.
+    return_fr_prices : bool, optional
+        Also return the FR clearing prices fetched for the lags and target, so
+        callers can slice actuals or naive forecasts without fetching again.
+    as_of : str or pd.Timestamp, optional
+        Build the forecast-vintage features as known at this time, see ``build_features_df``.
+    targets : str or list of str, optional
+        FR clearing price column of the target (default ``dcl_price``), or a list
+        of them (e.g. ``FR_SERVICE_TARGETS``) for one target column per service;
+        the features are the same for every target.
+    features : list of str, optional
+        Feature columns to build, see ``build_features_df``; the FR prices are
+        fetched far enough back for their longest lag or rolling window.
 
     Returns
     -------
     pd.DataFrame
         A DataFrame containing all model input features for one year.
+    pd.Series or pd.DataFrame
+        The target prices, one column per target when ``targets`` is a list.
     """
     if(train_end_date is None):
         train_end_date = pd.Timestamp.now().normalize()
     else:
         train_end_date = pd.Timestamp(train_end_date)
     
-    train_start_date = train_end_date - pd.Timedelta(days = 365)
+    train_start_date = train_end_date - pd.Timedelta(days = TRAIN_WINDOW_DAYS)
     # FR-EAC data is only available at given API from 2024-03-13
-    if(train_start_date <= pd.Timestamp('2024-03-13')):
-        train_start_date = pd.Timestamp('2024-03-13')
-    
-    margins_resampled = resample_margins(train_start_date, train_end_date)
-    demand_agg = aggregate_demand(train_start_date, train_end_date)
-    br_agg = aggregate_br_price(train_start_date, train_end_date)
-
-    parameters_lags = {'dcl_price': [6, 12], 'drl_price': [6, 12]}
-    lag_shifted_df = create_lag_shifted_df(train_start_date, train_end_date, parameters_lags)
-
-    temporal_features = [ 'month', 'working day']
-    temporal_features_df = create_temporal_features_df(train_start_date, train_end_date, temporal_features)
-
-    X_train = pd.concat([margins_resampled, demand_agg, br_agg, lag_shifted_df, temporal_features_df], axis = 1)
-    y = get_historical_fr_price(train_start_date, train_end_date)
-    y_train = y['dcl_price']
+    if(train_start_date <= FR_EAC_START_DATE):
+        train_start_date = FR_EAC_START_DATE
+
+    # One FR fetch covers both the lag window of the requested features and the target window
+    lookback_blocks = get_feature_lookback_blocks(DEFAULT_FEATURES if features is None else features)
+    clearing_price_fr = get_historical_fr_price(*get_lag_fetch_periods(train_start_date, train_end_date,
+                                                                       lookback_blocks))
+    X_train = build_features_df(train_start_date, train_end_date, clearing_price_fr, as_of = as_of,
+                                features = features)
+    y = slice_efa_window(clearing_price_fr, train_start_date, train_end_date)
+    y_train = y[targets] if isinstance(targets, str) else y.reindex(columns = list(targets))
+    if(return_fr_prices):
+        return X_train, y_train, clearing_price_fr
     return X_train, y_train
 
-def get_prediction_features_df(prediction_date=None):
+@traced('features.predict')
+def get_prediction_features_df(prediction_date=None, as_of=None, end_date=None, features=None):
     """
     Retrieve the model test features as a DataFrame for the specified date range.
 
-    This function is intended for generating test-time input features (e.g., for prediction) for one-day only (test_date).
+    This function is intended for generating test-time input features (e.g., for prediction) for one day only (prediction_date).
+    With ``end_date``, the features of every trading day from prediction_date to
+    end_date are built at once: each source is fetched once for the whole range
+    (plus the FR lag lookback) and the rows equal those of one call per day.
 
     Parameters
     ----------
-    start_date : str or pd.Timestamp, optional
-        Start date for the feature extraction period. Defaults to today's date if not provided.
+    prediction_date : str or pd.Timestamp, optional
+        Trading day to build the features of. Defaults to tomorrow if not provided.
+    as_of : str or pd.Timestamp, optional
+        Build the forecast-vintage features as known at this time, see ``build_features_df``.
     end_date : str or pd.Timestamp, optional
-        End date for the feature extraction period. Defaults to today's date if not provided.
+        Last trading day (inclusive) of a batch of prediction days, defaults to prediction_date.
+    features : list of str, optional
+        Feature columns to build, e.g. the ``feature_names`` of the model that
+        will predict, so that only the data it needs is fetched; see ``build_features_df``.
 
     Returns
     -------
@@ -71,22 +156,8 @@ def get_prediction_features_df(prediction_date=None):
     else:
         prediction_date = pd.Timestamp(prediction_date)
 
-    # test_date = test_date - pd.Timedelta(days = 1)
-    
-    margins_resampled = resample_margins(prediction_date, prediction_date)
-    demand_agg = aggregate_demand(prediction_date, prediction_date)
-    br_agg = aggregate_br_price(prediction_date, prediction_date)
-
-    parameters_lags = {'dcl_price': [6, 12], 'drl_price': [6, 12]}
-    lag_shifted_df = create_lag_shifted_df(prediction_date, prediction_date, parameters_lags)
+    end_date = prediction_date if end_date is None else pd.Timestamp(end_date)
 
-    temporal_features = [ 'month', 'working day']
-    temporal_features_df = create_temporal_features_df(prediction_date, prediction_date, temporal_features)
-
-    X_pred = pd.concat([margins_resampled, demand_agg, br_agg, lag_shifted_df, temporal_features_df], axis = 1)
+    # test_date = test_date - pd.Timedelta(days = 1)
+    X_pred = build_features_df(prediction_date, end_date, as_of = as_of, features = features)
     return X_pred
-
-
-
-    
-
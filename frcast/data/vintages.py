@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# Forecasts for a trading day are made at 09:00 of the day before it, ahead of the day-ahead EAC auction
+DECISION_TIME = pd.Timedelta(hours = 9)
+
+
+def get_decision_times(target_times, as_of=None):
+    '''
+    Returns the time the forecast of each target time is made at
+
+    A target time belongs to the trading day whose EFA blocks contain it (EFA 1
+    starts at 23:00 of the previous day); its forecast is made at DECISION_TIME
+    on the day before that trading day. With as_of, no decision time is later
+    than as_of (features as they were known at as_of).
+
+    Parameters:
+    target_times (array-like): target times (tz-naive, local)
+    as_of (str or pd.Timestamp): optional latest decision time
+
+    Returns:
+    DatetimeIndex: decision time of every target time
+
+    Example
+    -------
+    >>> decision_times = get_decision_times(pd.DatetimeIndex(['2025-06-11 23:00', '2025-06-12 19:00',
+    ...                                                       '2025-06-12 23:00']))
+    >>> decision_times.strftime('%Y-%m-%d %H:%M').tolist()
+    ['2025-06-11 09:00', '2025-06-11 09:00', '2025-06-12 09:00']
+    '''
+    target_times = pd.DatetimeIndex(target_times)
+    trading_days = (target_times + pd.Timedelta(hours = 1)).normalize()
+    decision_times = trading_days - pd.Timedelta(days = 1) + DECISION_TIME
+    if(as_of is not None):
+        as_of = pd.Timestamp(as_of)
+        decision_times = decision_times.where(decision_times <= as_of, as_of)
+    return decision_times
+
+
+def build_vintage_table(target_times, publish_times, values):
+    '''
+    Indexes every forecast vintage by (target time, publish time)
+
+    Rows are stable-sorted by target time then publish time, so the revisions
+    of one (target, publish) pair keep their published order and the last one
+    is the latest.
+
+    Parameters:
+    target_times (array-like): time each forecast value is for
+    publish_times (array-like): time each forecast value became known
+    values (dataframe): forecast values, one row per vintage
+
+    Returns:
+    dataframe: target_time, publish_time and the value columns, sorted
+    '''
+    vintage_table = values.reset_index(drop = True)
+    vintage_table.insert(0, 'target_time', np.asarray(target_times))
+    vintage_table.insert(1, 'publish_time', np.asarray(publish_times))
+    order = np.lexsort((vintage_table['publish_time'].to_numpy(), vintage_table['target_time'].to_numpy()))
+    return vintage_table.iloc[order].reset_index(drop = True)
+
+
+def lookup_as_of(vintage_table, target_times, decision_times):
+    '''
+    Returns, for each target time, the latest forecast published at or before its decision time
+
+    The lookups run on sorted arrays for all targets at once: (target, publish)
+    pairs are encoded as one sorted integer key and each query is a single
+    searchsorted into it.
+
+    Parameters:
+    vintage_table (dataframe): see build_vintage_table
+    target_times (array-like): target times to look up
+    decision_times (array-like): decision time of each target time (see get_decision_times)
+
+    Returns:
+    dataframe: indexed by target_times, with the value columns and the publish_time of
+               the vintage used; NaN (NaT) where nothing was published by the decision time
+    '''
+    if(vintage_table.empty):
+        as_of_values = vintage_table.drop(columns = 'target_time').reindex(range(len(target_times)))
+        as_of_values.index = pd.DatetimeIndex(target_times, name = 'target_time')
+        return as_of_values
+    store_targets = vintage_table['target_time'].to_numpy()
+    store_publish = vintage_table['publish_time'].to_numpy()
+    unique_targets, target_codes = np.unique(store_targets, return_inverse = True)
+    unique_publish, publish_codes = np.unique(store_publish, return_inverse = True)
+    keys = target_codes.astype('int64')*len(unique_publish) + publish_codes
+
+    query_targets = np.asarray(target_times).astype(store_targets.dtype)
+    query_decisions = np.asarray(decision_times).astype(store_publish.dtype)
+    query_target_codes = np.searchsorted(unique_targets, query_targets)
+    known_targets = ((query_target_codes < len(unique_targets))
+                     & (unique_targets[np.minimum(query_target_codes, len(unique_targets) - 1)] == query_targets))
+    query_publish_codes = np.searchsorted(unique_publish, query_decisions, side = 'right') - 1
+    query_keys = query_target_codes.astype('int64')*len(unique_publish) + query_publish_codes
+    # Last row at or before the query key: latest vintage (and revision) published by the decision time
+    rows = np.searchsorted(keys, query_keys, side = 'right') - 1
+    found = (known_targets & (query_publish_codes >= 0) & (rows >= 0)
+             & (target_codes[np.maximum(rows, 0)] == query_target_codes))
+
+    as_of_values = vintage_table.iloc[np.where(found, rows, 0)].drop(columns = 'target_time')
+    as_of_values.index = pd.DatetimeIndex(query_targets, name = 'target_time')
+    return as_of_values.where(np.repeat(found[:, np.newaxis], as_of_values.shape[1], axis = 1))
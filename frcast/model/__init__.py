@@ -1,9 +1,48 @@
-# from frcast.data.train_predict_data import get_train_featuers_target_df, get_prediction_features_df
-from frcast.model.train import (evaluate_xgb_trial, generate_time_series_splits, 
-                                run_xgb_optuna_tuning, train_final_xgb_model_from_study)
-from frcast.model.predict import predict_from_best_model
+import importlib
+
+# Public names are resolved on first access: mlflow, optuna, xgboost and sklearn
+# are only imported once a model function is actually used.
+_LAZY_ATTRS = {'evaluate_xgb_trial': 'frcast.model.train',
+               'generate_time_series_splits': 'frcast.model.train',
+               'run_xgb_optuna_tuning': 'frcast.model.train',
+               'train_final_xgb_model_from_study': 'frcast.model.train',
+               'predict_from_best_model': 'frcast.model.predict',
+               'predict_batch': 'frcast.model.predict',
+               'run_backtest': 'frcast.model.backtest',
+               'run_sharded_backtest': 'frcast.model.backtest',
+               'load_backtest_results': 'frcast.model.backtest_store',
+               'evaluate_forecasts': 'frcast.model.evaluation',
+               'evaluate_backtest_runs': 'frcast.model.evaluation',
+               'FeatureSchemaError': 'frcast.model.artifacts',
+               'list_model_artifacts': 'frcast.model.artifacts',
+               'load_model_artifact': 'frcast.model.artifacts',
+               'save_model_artifact': 'frcast.model.artifacts',
+               'get_best_params_history': 'frcast.model.studies',
+               'get_study_storage': 'frcast.model.studies',
+               'update_xgb_model': 'frcast.model.incremental',
+               'train_multi_target_model': 'frcast.model.multi_target',
+               'predict_multi_target': 'frcast.model.multi_target',
+               }
 
 __all__ = ['evaluate_xgb_trial', 'generate_time_series_splits', 
-           'predict_from_best_model',
+           'predict_from_best_model', 'predict_batch', 'run_backtest',
+           'run_sharded_backtest', 'load_backtest_results',
+           'evaluate_forecasts', 'evaluate_backtest_runs',
+            'get_best_params_history', 'get_study_storage',
+            'FeatureSchemaError', 'list_model_artifacts', 'load_model_artifact',
+            'save_model_artifact',
             'run_xgb_optuna_tuning', 'train_final_xgb_model_from_study',
-            ]
\ No newline at end of file
+            'update_xgb_model', 'train_multi_target_model', 'predict_multi_target',
+            ]
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import pandas as pd
+import xgboost as xgb
+
+ARTIFACT_DIR = os.environ.get('FRCAST_MODEL_DIR',
+                              os.path.join(os.path.expanduser('~'), '.cache', 'frcast', 'models'))
+MODEL_FILE = 'model.ubj'
+METADATA_FILE = 'metadata.json'
+
+
+class FeatureSchemaError(ValueError):
+    """Raised when prediction features do not match the feature schema a model was trained on."""
+
+
+def get_data_fingerprint(X, y=None):
+    """
+    Return a SHA-256 fingerprint of the training data (values, index and column names).
+
+    Parameters:
+        X (pd.DataFrame): Feature matrix.
+        y (pd.Series, optional): Target variable.
+
+    Returns:
+        str: Hex digest; equal data gives an equal fingerprint.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(column) for column in X.columns]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(X, index=True).values.tobytes())
+    if y is not None:
+        digest.update(pd.util.hash_pandas_object(y, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def save_model_artifact(model, X, y, params, cv_mae=None, train_end_date=None, artifact_dir=None,
+                        extra_metadata=None):
+    """
+    Save a trained model with everything needed to reuse it for prediction.
+
+    The model goes to ``<artifact_dir>/<train_end_date>/model.ubj`` in XGBoost's
+    native binary format, next to ``metadata.json`` holding the ordered feature
+    schema, target names, training window, hyperparameters, CV MAE and a data
+    fingerprint.
+
+    Parameters:
+        model (xgboost.XGBRegressor): Fitted model.
+        X (pd.DataFrame): Training features (EFA-indexed).
+        y (pd.Series or pd.DataFrame): Training target, or one column per target.
+        params (dict): Hyperparameters the model was fitted with.
+        cv_mae (float, optional): Cross-validated MAE of the parameters.
+        train_end_date (str or pd.Timestamp, optional): Last training day, defaults
+            to the trading day of the last row of X.
+        artifact_dir (str, optional): Root directory, defaults to ARTIFACT_DIR.
+        extra_metadata (dict, optional): Additional JSON-serializable metadata.
+
+    Returns:
+        str: Path of the artifact directory.
+    """
+    artifact_dir = ARTIFACT_DIR if artifact_dir is None else artifact_dir
+    if train_end_date is None:
+        train_end_date = X.index.max().normalize()
+    train_end_date = pd.Timestamp(train_end_date).strftime('%Y-%m-%d')
+    path = os.path.join(artifact_dir, train_end_date)
+    os.makedirs(path, exist_ok=True)
+
+    model.save_model(os.path.join(path, MODEL_FILE))
+    metadata = {
+        'train_end_date': train_end_date,
+        'train_start': str(X.index.min()),
+        'train_end': str(X.index.max()),
+        'n_rows': len(X),
+        'feature_names': [str(column) for column in X.columns],
+        'targets': [str(column) for column in y.columns] if isinstance(y, pd.DataFrame) else [str(y.name)],
+        'params': params,
+        'cv_mae': None if cv_mae is None else float(cv_mae),
+        'data_fingerprint': get_data_fingerprint(X, y),
+        'xgboost_version': xgb.__version__,
+        'created_at': pd.Timestamp.now().isoformat(),
+        **(extra_metadata or {}),
+    }
+    with open(os.path.join(path, METADATA_FILE), 'w') as f:
+        json.dump(metadata, f, indent=1)
+    return path
+
+
+def list_model_artifacts(artifact_dir=None):
+    """Return the training end dates of the saved artifacts, oldest first."""
+    artifact_dir = ARTIFACT_DIR if artifact_dir is None else artifact_dir
+    if not os.path.isdir(artifact_dir):
+        return []
+    return sorted(name for name in os.listdir(artifact_dir)
+                  if os.path.exists(os.path.join(artifact_dir, name, METADATA_FILE)))
+
+
+def load_model_artifact(train_end_date=None, artifact_dir=None):
+    """
+    Load the latest saved model trained up to ``train_end_date`` (inclusive).
+
+    Parameters:
+        train_end_date (str or pd.Timestamp, optional): Latest acceptable training
+            end date; the newest artifact is loaded when None.
+        artifact_dir (str, optional): Root directory, defaults to ARTIFACT_DIR.
+
+    Returns:
+        tuple: ``(xgboost.XGBRegressor, dict)`` model and its metadata.
+
+    Raises:
+        FileNotFoundError: If no artifact is old enough.
+    """
+    artifact_dir = ARTIFACT_DIR if artifact_dir is None else artifact_dir
+    dates = list_model_artifacts(artifact_dir)
+    if train_end_date is not None:
+        train_end_date = pd.Timestamp(train_end_date).strftime('%Y-%m-%d')
+        dates = [date for date in dates if date <= train_end_date]
+    if not dates:
+        raise FileNotFoundError(f'No model artifact in {artifact_dir} trained up to {train_end_date}')
+
+    path = os.path.join(artifact_dir, dates[-1])
+    with open(os.path.join(path, METADATA_FILE)) as f:
+        metadata = json.load(f)
+    model = xgb.XGBRegressor()
+    model.load_model(os.path.join(path, MODEL_FILE))
+    return model, metadata
+
+
+def check_feature_schema(X, metadata):
+    """
+    Check prediction features against the schema of a saved model and put them in its order.
+
+    Parameters:
+        X (pd.DataFrame): Prediction features.
+        metadata (dict): Artifact metadata with the ordered ``feature_names``.
+
+    Returns:
+        pd.DataFrame: X with columns in the training order.
+
+    Raises:
+        FeatureSchemaError: If features are missing or unexpected.
+    """
+    feature_names = metadata['feature_names']
+    columns = [str(column) for column in X.columns]
+    missing = [name for name in feature_names if name not in columns]
+    unexpected = [name for name in columns if name not in feature_names]
+    if missing or unexpected:
+        raise FeatureSchemaError(f'Features do not match the model trained up to {metadata["train_end_date"]}: '
+                                 f'missing {missing}, unexpected {unexpected}')
+    return X[feature_names]
@@ -0,0 +1,301 @@
+from concurrent.futures import ProcessPoolExecutor
+from frcast.data.fr_prices import get_historical_fr_price, get_lag_fetch_periods
+from frcast.data.time_periods import get_efa_index
+from frcast.data.train_predict_data import FR_EAC_START_DATE, build_features_df
+from frcast.model.backtest_store import (claim_shard, complete_shard, enqueue_shards, get_run_dir, init_run,
+                                         list_completed_days, load_backtest_results, read_day_results,
+                                         read_run_config, release_stale_claims, write_day_results)
+from frcast.model.train import get_best_params, get_thread_budget, run_xgb_optuna_tuning
+
+import argparse
+import json
+import os
+import pandas as pd
+import time
+import xgboost as xgb
+
+
+def get_training_window_positions(efa_index, prediction_date, lookback_days=365):
+    """
+    Return the [start, stop) row positions of the training window for a prediction date.
+
+    The window covers the EFA blocks of the ``lookback_days`` trading days before
+    ``prediction_date``; the prediction date itself is excluded, since its
+    auction prices are not known when the forecast is made.
+
+    Parameters:
+        efa_index (pd.DatetimeIndex): Sorted EFA index of the full feature matrix.
+        prediction_date (pd.Timestamp): Trading day to forecast.
+        lookback_days (int): Number of trading days in the training window.
+
+    Returns:
+        tuple[int, int]: Start and stop positions for ``iloc`` slicing.
+    """
+    window_start = prediction_date - pd.Timedelta(days = lookback_days) - pd.Timedelta(hours = 1)
+    window_stop = prediction_date - pd.Timedelta(hours = 1) # EFA 1 of the prediction date
+    start, stop = efa_index.searchsorted([window_start, window_stop])
+    return start, stop
+
+
+def get_backtest_data(start_date, end_date, lookback_days=365):
+    """
+    Build the features and DCL prices of a backtest span once, with one fetch.
+
+    Parameters:
+        start_date, end_date (pd.Timestamp): First and last prediction date.
+        lookback_days (int): Trading days in each training window.
+
+    Returns:
+        tuple: ``(X_all, y_all, clearing_price_fr)`` EFA-indexed features from the start
+        of the first training window to ``end_date``, their DCL prices, and the FR prices.
+    """
+    feature_start_date = max(start_date - pd.Timedelta(days = lookback_days), FR_EAC_START_DATE)
+    clearing_price_fr = get_historical_fr_price(*get_lag_fetch_periods(feature_start_date, end_date))
+    X_all = build_features_df(feature_start_date, end_date, clearing_price_fr)
+    y_all = clearing_price_fr['dcl_price'].reindex(X_all.index)
+    return X_all, y_all, clearing_price_fr
+
+
+def get_training_window(X_all, y_all, prediction_date, lookback_days=365):
+    """Return the training rows with a known target for a prediction date (see get_training_window_positions)."""
+    start, stop = get_training_window_positions(X_all.index, prediction_date, lookback_days)
+    X_train, y_train = X_all.iloc[start:stop], y_all.iloc[start:stop]
+    has_target = y_train.notna().values
+    return X_train[has_target], y_train[has_target]
+
+
+def get_prediction_rows(X_all, prediction_date):
+    """Return the feature rows of the six EFA blocks of a prediction date."""
+    start, stop = X_all.index.searchsorted([prediction_date - pd.Timedelta(hours = 1),
+                                            prediction_date + pd.Timedelta(hours = 23)])
+    return X_all.iloc[start:stop]
+
+
+def _tune_training_window(X_train, y_train, n_trials, n_jobs=None):
+    study = run_xgb_optuna_tuning(X_train, y_train, n_trials=n_trials, n_jobs=n_jobs)
+    return get_best_params(study)
+
+
+def _fit_and_predict(X_train, y_train, X_pred, params, n_jobs=None):
+    model = xgb.XGBRegressor(**params, n_jobs = n_jobs)
+    model.fit(X_train, y_train)
+    return model.predict(X_pred)
+
+
+def _run_jobs(fn, jobs_args, n_workers):
+    """Runs fn over a list of argument tuples, in a process pool unless n_workers is 1, keeping the order"""
+    if(n_workers == 1):
+        return [fn(*args) for args in jobs_args]
+    with ProcessPoolExecutor(max_workers = n_workers) as executor:
+        futures = [executor.submit(fn, *args) for args in jobs_args]
+        return [future.result() for future in futures]
+
+
+def run_backtest(start_date, end_date, n_trials=50, retune_every=7, lookback_days=365, n_workers=None):
+    """
+    Walk-forward backtest of the daily DCL forecast between two dates (inclusive).
+
+    The feature and target matrix is built once for the whole evaluation span
+    plus the lookback, and each day's rolling training window is sliced from it
+    by position. Hyperparameters are tuned with Optuna on the first day of
+    every ``retune_every``-day block and reused for the days in between. Tuning
+    and the daily fit/predict steps run in parallel across a process pool, the
+    cores being split between the workers (see ``get_thread_budget``).
+
+    Parameters:
+        start_date (str or pd.Timestamp): First prediction date.
+        end_date (str or pd.Timestamp): Last prediction date.
+        n_trials (int): Optuna trials per tuning.
+        retune_every (int): Days between hyperparameter tunings.
+        lookback_days (int): Trading days in each training window.
+        n_workers (int): Worker processes; ``None`` uses all cores, 1 runs in-process.
+
+    Returns:
+        pd.DataFrame: EFA-indexed frame with columns ``pred``, ``naive`` (previous
+        day's price, seasonal-naive forecast) and ``actual``.
+    """
+    start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    n_workers = n_workers or get_thread_budget() # all cores
+    n_jobs = get_thread_budget(n_workers) # XGBoost threads of each worker
+    # One fetch and one feature build for the whole span
+    X_all, y_all, clearing_price_fr = get_backtest_data(start_date, end_date, lookback_days)
+
+    prediction_dates = pd.date_range(start_date, end_date, freq = '1D')
+    tuning_dates = prediction_dates[::retune_every]
+    training_window = lambda date: get_training_window(X_all, y_all, date, lookback_days)
+    prediction_rows = lambda date: get_prediction_rows(X_all, date)
+
+    tuned_params = _run_jobs(_tune_training_window,
+                             [(*training_window(date), n_trials, n_jobs) for date in tuning_dates], n_workers)
+    # Each prediction date reuses the params of the latest tuning date
+    params_position = tuning_dates.searchsorted(prediction_dates, side = 'right') - 1
+    daily_args = [(*training_window(date), prediction_rows(date), tuned_params[position], n_jobs)
+                  for date, position in zip(prediction_dates, params_position)]
+    daily_preds = _run_jobs(_fit_and_predict, daily_args, n_workers)
+
+    efa_index = get_efa_index(start_date, end_date)
+    target_df = pd.DataFrame(index = efa_index, columns = ['pred', 'naive', 'actual'], dtype = 'float64')
+    for (_, _, X_pred, _, _), y_pred in zip(daily_args, daily_preds):
+        target_df.loc[X_pred.index, 'pred'] = y_pred
+    target_df['naive'] = clearing_price_fr['dcl_price'].reindex(efa_index - pd.Timedelta(days = 1)).values
+    target_df['actual'] = clearing_price_fr['dcl_price'].reindex(efa_index).values
+    return target_df
+
+
+def get_backtest_shards(start_date, end_date, retune_every=7, shard_days=28):
+    """
+    Split a backtest into shards of consecutive prediction dates.
+
+    Shards hold whole tuning blocks (``shard_days`` is rounded up to a multiple of
+    ``retune_every``), so each shard tunes on the first day of its blocks exactly
+    as ``run_backtest`` does and shards can run in any order.
+
+    Returns:
+        list of tuple: ``(first day, last day)`` of each shard.
+    """
+    shard_days = -(-shard_days // retune_every)*retune_every
+    prediction_dates = pd.date_range(start_date, end_date, freq = '1D')
+    return [(dates[0], dates[-1]) for dates in (prediction_dates[i:i + shard_days]
+                                                for i in range(0, len(prediction_dates), shard_days))]
+
+
+def _run_shard(run_dir, config, data, first_day, last_day, n_jobs=None):
+    """Backtest the unfinished days of one shard, checkpointing every day; return the number of days run."""
+    X_all, y_all, clearing_price_fr = data
+    start_date, lookback_days = pd.Timestamp(config['start_date']), config['lookback_days']
+    completed = list_completed_days(run_dir)
+    days_run = 0
+    for block in get_backtest_shards(first_day, last_day, config['retune_every'], config['retune_every']):
+        block_days = pd.date_range(*block, freq = '1D')
+        todo = block_days.difference(completed)
+        if len(todo) == 0:
+            continue
+        done = block_days.intersection(completed)
+        tune_seconds = 0.0
+        if len(done): # resumed block: reuse the params tuned on its first day
+            params = json.loads(read_day_results(run_dir, done[0])['params'].iloc[0])
+        else:
+            tune_start = time.perf_counter()
+            params = _tune_training_window(*get_training_window(X_all, y_all, block_days[0], lookback_days),
+                                           config['n_trials'], n_jobs)
+            tune_seconds = time.perf_counter() - tune_start
+        for day in todo:
+            X_train, y_train = get_training_window(X_all, y_all, day, lookback_days)
+            X_pred = get_prediction_rows(X_all, day)
+            fit_start = time.perf_counter()
+            model = xgb.XGBRegressor(**params, n_jobs = n_jobs)
+            model.fit(X_train, y_train)
+            predict_start = time.perf_counter()
+            y_pred = model.predict(X_pred)
+            predict_seconds = time.perf_counter() - predict_start
+
+            day_df = pd.DataFrame({'trading_day': day, 'efa_block': range(1, len(X_pred) + 1), 'pred': y_pred,
+                                   'actual': clearing_price_fr['dcl_price'].reindex(X_pred.index).values,
+                                   'naive': clearing_price_fr['dcl_price'].reindex(
+                                       X_pred.index - pd.Timedelta(days = 1)).values,
+                                   'params': json.dumps(params, sort_keys = True),
+                                   'tuned': day == block_days[0], # params tuned on this day's window
+                                   'tune_seconds': tune_seconds if day == block_days[0] else 0.0,
+                                   'fit_seconds': predict_start - fit_start, 'predict_seconds': predict_seconds,
+                                   'n_train': len(X_train), 'worker': os.getpid()}, index = X_pred.index)
+            write_day_results(run_dir, day_df)
+            days_run += 1
+    return days_run
+
+
+def run_backtest_worker(run_dir, n_jobs=None):
+    """
+    Claim shards of a run from its work queue and backtest them until the queue is empty.
+
+    Several workers, in one or several processes started at any time, can work on
+    the same run directory. Each worker builds the run's features once, on its
+    first claimed shard.
+
+    Parameters:
+        run_dir (str): Run directory created by ``run_sharded_backtest``.
+        n_jobs (int or None): Threads of the worker's tunings and fits; None uses all cores.
+
+    Returns:
+        int: Number of days this worker backtested.
+    """
+    config = read_run_config(run_dir)
+    data, days_run = None, 0
+    while True:
+        claim = claim_shard(run_dir)
+        if claim is None:
+            return days_run
+        claim_path, first_day, last_day = claim
+        if len(pd.date_range(first_day, last_day, freq = '1D').difference(list_completed_days(run_dir))) == 0:
+            complete_shard(claim_path)
+            continue
+        if data is None:
+            data = get_backtest_data(pd.Timestamp(config['start_date']), pd.Timestamp(config['end_date']),
+                                     config['lookback_days'])
+        days_run += _run_shard(run_dir, config, data, first_day, last_day, n_jobs)
+        complete_shard(claim_path)
+
+
+def run_sharded_backtest(start_date, end_date, run_dir=None, n_trials=50, retune_every=7, lookback_days=365,
+                         shard_days=28, n_workers=None):
+    """
+    Resumable walk-forward backtest of the daily DCL forecast between two dates (inclusive).
+
+    Same forecasts as ``run_backtest``, but the date range is split into shards
+    (see ``get_backtest_shards``) placed in a file-based work queue, and every
+    completed day's predictions, actuals, naive baseline, hyperparameters and
+    timings are checkpointed to a Parquet store (see ``backtest_store``). Running
+    it again with the same arguments skips the completed days, reuses the
+    hyperparameters of partly completed tuning blocks, and picks up the shards of
+    workers that died. Starting it from another terminal (or
+    ``python -m frcast.model.backtest``) adds workers to a running backtest.
+
+    Parameters:
+        start_date (str or pd.Timestamp): First prediction date.
+        end_date (str or pd.Timestamp): Last prediction date.
+        run_dir (str, optional): Run directory, defaults to
+            ``<BACKTEST_DIR>/dcl_<start>_<end>``; it must not hold a run with other arguments.
+        n_trials (int): Optuna trials per tuning.
+        retune_every (int): Days between hyperparameter tunings.
+        lookback_days (int): Trading days in each training window.
+        shard_days (int): Days per shard, rounded up to a multiple of ``retune_every``.
+        n_workers (int): Worker processes; ``None`` uses all cores, 1 runs in-process.
+
+    Returns:
+        pd.DataFrame: The run's stored results (see ``load_backtest_results``).
+    """
+    start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    if run_dir is None:
+        run_dir = get_run_dir(f'dcl_{start_date:%Y-%m-%d}_{end_date:%Y-%m-%d}')
+    init_run(run_dir, {'target': 'dcl_price', 'start_date': f'{start_date:%Y-%m-%d}',
+                       'end_date': f'{end_date:%Y-%m-%d}', 'n_trials': n_trials, 'retune_every': retune_every,
+                       'lookback_days': lookback_days, 'shard_days': shard_days})
+    release_stale_claims(run_dir)
+    completed = list_completed_days(run_dir)
+    shards = [shard for shard in get_backtest_shards(start_date, end_date, retune_every, shard_days)
+              if len(pd.date_range(*shard, freq = '1D').difference(completed))]
+    enqueue_shards(run_dir, shards)
+
+    n_workers = min(n_workers or get_thread_budget(), max(len(shards), 1))
+    # Each worker process gets its share of the cores, so the pool does not run n_cpus^2 XGBoost threads
+    _run_jobs(run_backtest_worker, [(run_dir, get_thread_budget(n_workers))]*n_workers, n_workers)
+    return load_backtest_results(run_dir, start_date, end_date)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Resumable, sharded walk-forward backtest of the DCL forecast')
+    parser.add_argument('start_date')
+    parser.add_argument('end_date')
+    parser.add_argument('--run-dir', help = 'run directory, defaults to FRCAST_BACKTEST_DIR/dcl_<start>_<end>')
+    parser.add_argument('--n-trials', type = int, default = 50)
+    parser.add_argument('--retune-every', type = int, default = 7)
+    parser.add_argument('--lookback-days', type = int, default = 365)
+    parser.add_argument('--shard-days', type = int, default = 28)
+    parser.add_argument('--workers', type = int, help = 'worker processes, defaults to all cores')
+    args = parser.parse_args()
+    results = run_sharded_backtest(args.start_date, args.end_date, args.run_dir, args.n_trials, args.retune_every,
+                                   args.lookback_days, args.shard_days, args.workers)
+    print(f'{results["trading_day"].nunique()} days in the results store')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+On-disk state of resumable backtest runs.
+
+A run directory holds the run configuration, a partitioned Parquet results store
+and a file-based work queue::
+
+    <run_dir>/run.json                                  run configuration
+    <run_dir>/results/trading_day=YYYY-MM-DD.parquet    one file per completed day
+    <run_dir>/queue/<first day>_<last day>.todo         shard waiting for a worker
+    <run_dir>/queue/<first day>_<last day>.<host>-<pid>.claimed
+
+Every file is written to a temporary name and renamed into place, so a day's
+file exists only once its results are complete, and a shard is claimed by the
+single worker whose rename succeeds.
+"""
+import json
+import os
+import socket
+import threading
+
+import pandas as pd
+
+BACKTEST_DIR = os.environ.get('FRCAST_BACKTEST_DIR',
+                              os.path.join(os.path.expanduser('~'), '.cache', 'frcast', 'backtests'))
+RUN_FILE = 'run.json'
+RESULTS_DIR = 'results'
+QUEUE_DIR = 'queue'
+RESULT_COLUMNS = ['trading_day', 'efa_block', 'pred', 'actual', 'naive', 'params', 'tuned',
+                  'tune_seconds', 'fit_seconds', 'predict_seconds', 'n_train', 'worker']
+
+
+class BacktestConfigError(ValueError):
+    """Raised when a run directory already holds a run with a different configuration."""
+
+
+def get_run_dir(run_name, backtest_dir=None):
+    """Return the directory of a named run under ``backtest_dir`` (defaults to ``BACKTEST_DIR``)."""
+    return os.path.join(BACKTEST_DIR if backtest_dir is None else backtest_dir, run_name)
+
+
+def _tmp_path(path):
+    return f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+
+
+def _host():
+    return socket.gethostname().replace('.', '-') # dots separate the parts of queue file names
+
+
+def _worker_id():
+    return f'{_host()}-{os.getpid()}'
+
+
+def init_run(run_dir, config):
+    """
+    Create a run directory, or check that an existing one was started with the same configuration.
+
+    Parameters:
+        run_dir (str): Run directory.
+        config (dict): JSON-serializable run configuration.
+
+    Returns:
+        dict: The stored configuration.
+
+    Raises:
+        BacktestConfigError: If the directory holds a run with a different configuration,
+            whose completed days would not be comparable.
+    """
+    os.makedirs(os.path.join(run_dir, RESULTS_DIR), exist_ok=True)
+    os.makedirs(os.path.join(run_dir, QUEUE_DIR), exist_ok=True)
+    run_path = os.path.join(run_dir, RUN_FILE)
+    if not os.path.exists(run_path):
+        tmp_path = _tmp_path(run_path)
+        with open(tmp_path, 'w') as f:
+            json.dump(config, f, indent=1)
+        os.replace(tmp_path, run_path)
+    stored = read_run_config(run_dir)
+    if stored != json.loads(json.dumps(config)):
+        raise BacktestConfigError(f'{run_dir} holds a run with configuration {stored}, not {config}')
+    return stored
+
+
+def read_run_config(run_dir):
+    with open(os.path.join(run_dir, RUN_FILE)) as f:
+        return json.load(f)
+
+
+def _day_path(run_dir, day):
+    return os.path.join(run_dir, RESULTS_DIR, f'trading_day={day:%Y-%m-%d}.parquet')
+
+
+def write_day_results(run_dir, day_df):
+    """
+    Checkpoint the results of one trading day.
+
+    Parameters:
+        run_dir (str): Run directory.
+        day_df (pd.DataFrame): EFA-indexed rows of a single trading day with ``RESULT_COLUMNS``.
+    """
+    path = _day_path(run_dir, day_df['trading_day'].iloc[0])
+    tmp_path = _tmp_path(path)
+    day_df.rename_axis('efa_start').reset_index().to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def list_completed_days(run_dir):
+    """Return the sorted trading days whose results are in the store."""
+    results_dir = os.path.join(run_dir, RESULTS_DIR)
+    if not os.path.isdir(results_dir):
+        return pd.DatetimeIndex([])
+    days = [name[len('trading_day='):-len('.parquet')] for name in os.listdir(results_dir)
+            if name.startswith('trading_day=') and name.endswith('.parquet')]
+    return pd.DatetimeIndex(sorted(pd.to_datetime(days)))
+
+
+def read_day_results(run_dir, day):
+    """Return the stored results of one trading day."""
+    return pd.read_parquet(_day_path(run_dir, day)).set_index('efa_start')
+
+
+def read_days_results(run_dir, days, columns=None):
+    """
+    Read the stored results of several trading days in one call.
+
+    Parameters:
+        run_dir (str): Run directory.
+        days (iterable of pd.Timestamp): Completed trading days.
+        columns (list of str, optional): Columns to read, defaults to all of them.
+
+    Returns:
+        pd.DataFrame: Rows of the days indexed by EFA block start time.
+    """
+    columns = None if columns is None else ['efa_start', *columns]
+    return pd.read_parquet([_day_path(run_dir, day) for day in days], columns=columns).set_index('efa_start')
+
+
+def load_backtest_results(run_dir, start_date=None, end_date=None):
+    """
+    Load the stored results of a run.
+
+    Parameters:
+        run_dir (str): Run directory.
+        start_date, end_date (str or pd.Timestamp, optional): Trading days to load (inclusive).
+
+    Returns:
+        pd.DataFrame: Rows of the completed days indexed by EFA block start time, with
+        ``pred``, ``naive`` and ``actual`` and the bookkeeping columns of ``RESULT_COLUMNS``
+        (``params`` holds the JSON-encoded hyperparameters of the day's fit).
+    """
+    days = list_completed_days(run_dir)
+    if start_date is not None:
+        days = days[days >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        days = days[days <= pd.Timestamp(end_date)]
+    if len(days) == 0:
+        return pd.DataFrame(columns=RESULT_COLUMNS, index=pd.DatetimeIndex([], name='efa_start'))
+    return read_days_results(run_dir, days)
+
+
+def _shard_name(first_day, last_day):
+    return f'{first_day:%Y-%m-%d}_{last_day:%Y-%m-%d}'
+
+
+def parse_shard_name(name):
+    """Return the first and last trading day of a queue file name."""
+    first_day, last_day = name.split('.')[0].split('_')
+    return pd.Timestamp(first_day), pd.Timestamp(last_day)
+
+
+def enqueue_shards(run_dir, shards):
+    """
+    Add ``(first day, last day)`` shards to the work queue, unless already queued or claimed.
+
+    Returns:
+        int: Number of shards added.
+    """
+    queue_dir = os.path.join(run_dir, QUEUE_DIR)
+    queued = {name.split('.')[0] for name in os.listdir(queue_dir) if not name.endswith('.tmp')}
+    added = 0
+    for first_day, last_day in shards:
+        name = _shard_name(first_day, last_day)
+        if name not in queued:
+            open(os.path.join(queue_dir, name + '.todo'), 'w').close()
+            added += 1
+    return added
+
+
+def claim_shard(run_dir):
+    """
+    Claim the earliest waiting shard.
+
+    Returns:
+        tuple or None: ``(claim path, first day, last day)``, or None when no shard is waiting.
+    """
+    queue_dir = os.path.join(run_dir, QUEUE_DIR)
+    for name in sorted(name for name in os.listdir(queue_dir) if name.endswith('.todo')):
+        claim_path = os.path.join(queue_dir, f'{name[:-len(".todo")]}.{_worker_id()}.claimed')
+        try:
+            os.rename(os.path.join(queue_dir, name), claim_path)
+        except FileNotFoundError: # another worker claimed it first
+            continue
+        return (claim_path, *parse_shard_name(name))
+    return None
+
+
+def complete_shard(claim_path):
+    os.remove(claim_path)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def release_stale_claims(run_dir):
+    """
+    Put back the shards claimed by workers of this host that are no longer running
+    (e.g. after a crash), so they are picked up again. Their completed days stay
+    in the results store and are skipped.
+
+    Returns:
+        int: Number of shards released.
+    """
+    queue_dir = os.path.join(run_dir, QUEUE_DIR)
+    host = _host()
+    released = 0
+    for name in os.listdir(queue_dir):
+        if not name.endswith('.claimed'):
+            continue
+        worker_host, _, pid = name.split('.')[1].rpartition('-')
+        if worker_host == host and not _is_alive(int(pid)):
+            try:
+                os.rename(os.path.join(queue_dir, name), os.path.join(queue_dir, name.split('.')[0] + '.todo'))
+                released += 1
+            except FileNotFoundError:
+                continue
+    return released
@@ -0,0 +1,228 @@
+"""
+Forecast evaluation and error breakdowns.
+
+Errors of any number of forecast columns are reduced to additive sums (count,
+absolute, squared and signed errors, and the baseline's absolute error on the
+same rows) in one grouped pass per chunk of results. Sums of chunks add up, so
+large result sets are evaluated chunk by chunk without being loaded at once,
+and MAE, RMSE, bias and skill are only computed from the totals.
+"""
+from frcast.model.backtest_store import list_completed_days, read_days_results
+
+import numpy as np
+import os
+import pandas as pd
+
+GROUP_KEYS = ['year', 'month', 'trading_day', 'efa_block', 'weekday', 'price_quantile']
+ERROR_SUMS = ['n', 'abs_error', 'squared_error', 'error', 'baseline_abs_error']
+
+
+def get_price_quantile_edges(actual, price_quantiles=4):
+    """
+    Return the inner edges of the actual-price quantile bins.
+
+    Parameters:
+        actual (array-like): Actual prices (NaNs are ignored).
+        price_quantiles (int): Number of equally populated bins.
+
+    Returns:
+        np.ndarray: ``price_quantiles - 1`` increasing edges.
+    """
+    return np.nanquantile(np.asarray(actual, dtype=float), np.arange(1, price_quantiles)/price_quantiles)
+
+
+def get_group_keys(results, by, actual='actual', price_edges=None):
+    """
+    Return the group key columns of EFA-indexed results.
+
+    Calendar keys refer to the trading day (EFA 1 starts at 23:00 the day before):
+    ``year``, ``month`` (monthly period), ``trading_day``, ``efa_block`` (1-6) and
+    ``weekday`` (0 is Monday). ``price_quantile`` is the actual-price bin (1 is the
+    cheapest) given by ``price_edges`` (see ``get_price_quantile_edges``).
+
+    Returns:
+        dict: key name -> array with one value per row.
+    """
+    trading_day = (results.index + pd.Timedelta(hours=1)).normalize()
+    key_functions = {'year': lambda: trading_day.year,
+                     'month': lambda: trading_day.to_period('M'),
+                     'trading_day': lambda: trading_day,
+                     'efa_block': lambda: (results.index.hour + 1) % 24 // 4 + 1,
+                     'weekday': lambda: trading_day.weekday,
+                     'price_quantile': lambda: np.searchsorted(price_edges, results[actual].to_numpy(), side='right') + 1}
+    unknown = [key for key in by if key not in key_functions]
+    if unknown:
+        raise ValueError(f'Unknown group keys {unknown}, expected some of {GROUP_KEYS}')
+    if 'price_quantile' in by and price_edges is None:
+        raise ValueError('Grouping by price_quantile needs price_edges')
+    return {key: key_functions[key]() for key in by}
+
+
+def get_error_sums(results, models, by=(), actual='actual', baseline='naive', price_edges=None):
+    """
+    Return the additive error sums of the forecast columns for each group, in one grouped pass.
+
+    A row counts for a model when the model's forecast, the actual price and the
+    baseline forecast are all known, so each model and its skill are measured on
+    the same rows as its baseline.
+
+    Parameters:
+        results (pd.DataFrame): EFA-indexed results with the actual, baseline and model columns.
+        models (list of str): Forecast columns to evaluate.
+        by (list of str): Group keys, see ``get_group_keys``.
+        actual (str): Column of actual prices.
+        baseline (str): Column of the baseline forecast.
+        price_edges (np.ndarray, optional): Price quantile edges, needed to group by ``price_quantile``.
+
+    Returns:
+        pd.DataFrame: One row per group, columns ``(model, sum)`` for every sum in ``ERROR_SUMS``.
+    """
+    by = list(by)
+    actual_values = results[actual].to_numpy(dtype=float)
+    errors = results[list(models)].to_numpy(dtype=float) - actual_values[:, None]
+    baseline_errors = results[baseline].to_numpy(dtype=float) - actual_values
+    valid = ~np.isnan(errors) & ~np.isnan(baseline_errors)[:, None]
+    errors = np.where(valid, errors, 0.0)
+    baseline_abs_errors = np.where(valid, np.abs(baseline_errors)[:, None], 0.0)
+    sums = np.stack([valid, np.abs(errors), errors**2, errors, baseline_abs_errors], axis=2)
+    sums_df = pd.DataFrame(sums.reshape(len(results), -1), index=results.index,
+                           columns=pd.MultiIndex.from_product([list(models), ERROR_SUMS], names=['model', 'sum']))
+    if not by:
+        return sums_df.sum().to_frame('all').T
+    keys = get_group_keys(results, by, actual, price_edges)
+    return sums_df.groupby([keys[key] for key in by], sort=False).sum().rename_axis(by)
+
+
+def _add_sums(total, sums):
+    return sums if total is None else total.add(sums, fill_value=0)
+
+
+def get_error_metrics(sums, baseline='naive'):
+    """
+    Return MAE, RMSE, bias (mean of forecast - actual) and skill from error sums.
+
+    Skill is ``1 - MAE / baseline MAE`` on the same rows: positive when the model
+    beats the baseline, 0 for the baseline itself.
+
+    Parameters:
+        sums (pd.DataFrame): Error sums, see ``get_error_sums``.
+        baseline (str): Name of the baseline, reported in the ``baseline`` column.
+
+    Returns:
+        pd.DataFrame: Indexed by model and the group keys, columns ``n``, ``mae``,
+        ``rmse``, ``bias``, ``skill``, ``baseline_mae`` and ``baseline``.
+    """
+    long = sums.stack('model', future_stack=True)
+    long = long.reorder_levels([-1] + list(range(long.index.nlevels - 1))).sort_index()
+    n = long['n'].where(long['n'] > 0)
+    metrics = pd.DataFrame({'n': long['n'].astype('int64'),
+                            'mae': long['abs_error']/n,
+                            'rmse': np.sqrt(long['squared_error']/n),
+                            'bias': long['error']/n,
+                            'baseline_mae': long['baseline_abs_error']/n})
+    metrics['skill'] = 1 - metrics['mae']/metrics['baseline_mae']
+    metrics['baseline'] = baseline
+    return metrics[['n', 'mae', 'rmse', 'bias', 'skill', 'baseline_mae', 'baseline']]
+
+
+def evaluate_forecasts(results, models=None, by=None, actual='actual', baseline='naive', price_quantiles=4,
+                       price_edges=None):
+    """
+    Evaluate forecasts against actual prices and the seasonal-naive baseline.
+
+    Parameters:
+        results (pd.DataFrame or iterable of pd.DataFrame): EFA-indexed results (e.g. from
+            ``run_backtest`` or ``load_backtest_results``), or chunks of them evaluated one at
+            a time (a group split across chunks gives the same metrics, as its sums add up).
+        models (list of str, optional): Forecast columns, defaults to ``['pred']``; the
+            baseline is always evaluated too.
+        by (str or list of str, optional): Any combination of ``GROUP_KEYS``, e.g.
+            ``['month', 'efa_block']``; None evaluates all rows together.
+        actual (str): Column of actual prices.
+        baseline (str): Column of the baseline forecast (previous day's price).
+        price_quantiles (int): Number of actual-price bins of ``price_quantile``.
+        price_edges (array-like, optional): Inner price bin edges; computed from the actual
+            prices of a single frame, and needed when chunks are grouped by ``price_quantile``.
+
+    Returns:
+        pd.DataFrame: Metrics per model and group, see ``get_error_metrics``; with price
+        quantiles, ``attrs['price_edges']`` holds the bin edges.
+    """
+    by = [] if by is None else [by] if isinstance(by, str) else list(by)
+    chunks = [results] if isinstance(results, pd.DataFrame) else results
+    if 'price_quantile' in by and price_edges is None:
+        if not isinstance(results, pd.DataFrame):
+            raise ValueError('Pass price_edges to group chunks by price_quantile')
+        price_edges = get_price_quantile_edges(results[actual], price_quantiles)
+
+    models = list(dict.fromkeys([baseline, *(['pred'] if models is None else models)]))
+    total = None
+    for chunk in chunks:
+        total = _add_sums(total, get_error_sums(chunk, models, by, actual, baseline, price_edges))
+    if total is None:
+        raise ValueError('No results to evaluate')
+    metrics = get_error_metrics(total, baseline)
+    if price_edges is not None:
+        metrics.attrs['price_edges'] = list(price_edges)
+    return metrics
+
+
+def _read_runs_chunk(run_dirs, days, columns):
+    """Read some days of every run side by side, one forecast column per run, or None if no run has them."""
+    chunk = {}
+    for name, run_dir in run_dirs.items():
+        run_days = days.intersection(list_completed_days(run_dir))
+        if len(run_days) == 0:
+            continue
+        run_df = read_days_results(run_dir, run_days, columns)
+        for column in run_df.columns:
+            # Actual and naive prices are the same data in every run: keep the first known value
+            key = name if column == 'pred' else column
+            chunk[key] = run_df[column] if key not in chunk else chunk[key].combine_first(run_df[column])
+    if not chunk:
+        return None
+    chunk = pd.DataFrame(chunk)
+    for name in run_dirs: # runs without any of these days
+        if name not in chunk and 'pred' in columns:
+            chunk[name] = np.nan
+    return chunk
+
+
+def evaluate_backtest_runs(run_dirs, by=None, start_date=None, end_date=None, chunk_days=92, price_quantiles=4):
+    """
+    Compare the forecasts of several backtest runs, streaming over their results stores.
+
+    Results are read ``chunk_days`` trading days at a time, and only the
+    prediction, actual and naive columns, so years of results of dozens of model
+    variants never have to fit in memory at once.
+
+    Parameters:
+        run_dirs (dict or list): Model name -> run directory of ``run_sharded_backtest``;
+            a list names each run after its directory.
+        by (str or list of str, optional): Group keys, see ``evaluate_forecasts``.
+        start_date, end_date (str or pd.Timestamp, optional): Trading days to evaluate (inclusive).
+        chunk_days (int): Trading days read at a time.
+        price_quantiles (int): Number of actual-price bins of ``price_quantile``.
+
+    Returns:
+        pd.DataFrame: Metrics per model (run name and ``naive``) and group, see ``get_error_metrics``.
+    """
+    if not isinstance(run_dirs, dict):
+        run_dirs = {os.path.basename(os.path.normpath(run_dir)): run_dir for run_dir in run_dirs}
+    by = [] if by is None else [by] if isinstance(by, str) else list(by)
+    days = list_completed_days(next(iter(run_dirs.values())))
+    for run_dir in list(run_dirs.values())[1:]:
+        days = days.union(list_completed_days(run_dir))
+    if start_date is not None:
+        days = days[days >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        days = days[days <= pd.Timestamp(end_date)]
+    day_chunks = [days[i:i + chunk_days] for i in range(0, len(days), chunk_days)]
+
+    price_edges = None
+    if 'price_quantile' in by: # cheap first pass over the actual prices only
+        actual = pd.concat([_read_runs_chunk(run_dirs, chunk, ['actual'])['actual'] for chunk in day_chunks])
+        price_edges = get_price_quantile_edges(actual, price_quantiles)
+    chunks = (_read_runs_chunk(run_dirs, chunk, ['pred', 'actual', 'naive']) for chunk in day_chunks)
+    return evaluate_forecasts((chunk for chunk in chunks if chunk is not None), models=list(run_dirs), by=by,
+                              price_quantiles=price_quantiles, price_edges=price_edges)
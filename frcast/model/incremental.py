@@ -0,0 +1,103 @@
+from frcast.model.artifacts import check_feature_schema, load_model_artifact, save_model_artifact
+from frcast.model.train import align_training_rows, run_xgb_optuna_tuning, train_final_xgb_model_from_study
+from frcast.tracing import traced
+from sklearn.metrics import mean_absolute_error
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+
+def _needs_full_rebuild(metadata, X, y, previous_model, train_end_date, rebuild_every,
+                        drift_threshold, drift_window):
+    """Return the reason a full rebuild is due (or None) and the updated daily MAE history."""
+    last_full_rebuild = pd.Timestamp(metadata.get('last_full_rebuild', metadata['train_end_date']))
+    daily_mae = list(metadata.get('daily_mae', []))
+
+    # Out-of-sample error of the previous model on the rows it has not been trained on
+    # (labels aligned to the feature rows; blocks without a cleared price are not scored)
+    y_new = y.reindex(X.index)[X.index > pd.Timestamp(metadata['train_end'])].dropna()
+    if len(y_new):
+        X_new = check_feature_schema(X.loc[y_new.index], metadata)
+        daily_mae.append(float(mean_absolute_error(y_new, previous_model.predict(X_new))))
+
+    if (train_end_date - last_full_rebuild).days >= rebuild_every:
+        return 'schedule', daily_mae
+    cv_mae = metadata.get('cv_mae')
+    recent_mae = daily_mae[-drift_window:]
+    if cv_mae and len(recent_mae) == drift_window and np.mean(recent_mae) > cv_mae*(1 + drift_threshold):
+        return 'drift', daily_mae
+    return None, daily_mae
+
+
+@traced('train.update')
+def update_xgb_model(X, y, mode='continue', n_new_rounds=25, rebuild_every=7, drift_threshold=0.25,
+                     drift_window=7, force_rebuild=False, artifact_dir=None, **tuning_kwargs):
+    """
+    Update yesterday's saved model on today's sliding training window instead of refitting it.
+
+    The previous day's artifact is loaded and either boosted further
+    (``mode='continue'``: ``n_new_rounds`` extra trees fitted on the window with
+    XGBoost's ``xgb_model`` continuation) or has its leaf values refreshed on the
+    window (``mode='refresh'``: the ``refresh`` updater, same trees). A full
+    rebuild (Optuna tuning + fit) runs instead when there is no previous model,
+    every ``rebuild_every`` days, when forced, or when the previous model's mean
+    out-of-sample MAE over the last ``drift_window`` days exceeds its CV MAE by
+    more than ``drift_threshold`` (relative).
+
+    Parameters:
+        X (pd.DataFrame): Training features of the sliding window (EFA-indexed).
+        y (pd.Series): Target variable; blocks of X without a label are left out.
+        mode (str): 'continue' or 'refresh'.
+        n_new_rounds (int): Trees added per day in 'continue' mode.
+        rebuild_every (int): Days between scheduled full rebuilds.
+        drift_threshold (float): Relative MAE drift that triggers a full rebuild.
+        drift_window (int): Daily out-of-sample MAEs averaged for the drift check.
+        force_rebuild (bool): Always run a full rebuild.
+        artifact_dir (str, optional): Artifact root directory, defaults to ``ARTIFACT_DIR``.
+        **tuning_kwargs: Passed to ``run_xgb_optuna_tuning`` on full rebuilds.
+
+    Returns:
+        tuple: ``(xgboost.XGBRegressor, str)`` the model saved for today and how it
+        was produced ('continue', 'refresh', or 'rebuild: <reason>').
+    """
+    if mode not in ('continue', 'refresh'):
+        raise ValueError(f"Unknown update mode '{mode}', expected 'continue' or 'refresh'")
+    train_end_date = X.index.max().normalize()
+
+    rebuild_reason = 'forced' if force_rebuild else None
+    if rebuild_reason is None:
+        try:
+            previous_model, metadata = load_model_artifact(train_end_date - pd.Timedelta(days=1), artifact_dir)
+        except FileNotFoundError:
+            rebuild_reason = 'no previous model'
+    if rebuild_reason is None:
+        rebuild_reason, daily_mae = _needs_full_rebuild(metadata, X, y, previous_model, train_end_date,
+                                                        rebuild_every, drift_threshold, drift_window)
+    if rebuild_reason is not None:
+        study = run_xgb_optuna_tuning(X, y, **tuning_kwargs)
+        model = train_final_xgb_model_from_study(X, y, study, artifact_dir=artifact_dir)
+        return model, 'rebuild: ' + rebuild_reason
+
+    X, y = align_training_rows(X, y)
+    X = check_feature_schema(X, metadata)
+    params = dict(metadata['params'])
+    booster = previous_model.get_booster()
+    if mode == 'continue':
+        model = xgb.XGBRegressor(**{**params, 'n_estimators': n_new_rounds})
+        model.fit(X, y, xgb_model=booster)
+    else:
+        # The refresh updater needs a plain DMatrix, which the sklearn wrapper does not build for hist trees
+        refresh_params = {key: value for key, value in params.items() if key != 'n_estimators'}
+        booster = xgb.train({**refresh_params, 'process_type': 'update', 'updater': 'refresh', 'refresh_leaf': True},
+                            xgb.DMatrix(X, label=y), num_boost_round=booster.num_boosted_rounds(),
+                            xgb_model=booster)
+        model = xgb.XGBRegressor(**params)
+        model.load_model(bytearray(booster.save_raw(raw_format='ubj')))
+
+    save_model_artifact(model, X, y, params, metadata.get('cv_mae'), train_end_date, artifact_dir=artifact_dir,
+                        extra_metadata={'last_full_rebuild': metadata.get('last_full_rebuild',
+                                                                          metadata['train_end_date']),
+                                        'update_mode': mode,
+                                        'daily_mae': daily_mae})
+    return model, mode
@@ -0,0 +1,77 @@
+from frcast.data.train_predict_data import FR_SERVICE_TARGETS
+from frcast.model.artifacts import ARTIFACT_DIR
+from frcast.model.predict import load_prediction_model
+from frcast.model.train import run_xgb_optuna_tuning, train_final_xgb_model_from_study
+from frcast.tracing import traced
+
+import os
+import pandas as pd
+
+# Multi-service models and studies are kept apart from the DCL ones
+MULTI_TARGET_ARTIFACT_DIR = os.path.join(ARTIFACT_DIR, 'fr_services')
+MULTI_TARGET_STUDY_PREFIX = 'xgb_fr_services'
+
+
+@traced('train.multi_target')
+def train_multi_target_model(X, Y, multi_strategy='one_output_per_tree', save_artifact=True, artifact_dir=None,
+                             **tuning_kwargs):
+    """
+    Tune and fit one multi-output XGBoost model forecasting every target column of ``Y``.
+
+    All services share the feature matrix, the cross-validation fold matrices and
+    a single Optuna study whose objective is the MAE averaged over the services,
+    so forecasting every service needs one feature build and one tuning pass.
+    With ``multi_strategy='one_output_per_tree'`` each boosting round fits one
+    tree per service (equivalent to per-service models sharing hyperparameters);
+    ``'multi_output_tree'`` fits a single tree with one leaf value per service.
+
+    XGBoost rejects missing labels, so EFA blocks where any service has no
+    cleared price (e.g. a missing auction) are dropped before tuning and fitting
+    (see ``align_training_rows``).
+
+    Parameters:
+        X (pd.DataFrame): Training features (EFA-indexed).
+        Y (pd.DataFrame): One target column per service, e.g. from
+            ``get_train_features_target_df(targets=FR_SERVICE_TARGETS)``.
+        multi_strategy (str): XGBoost ``multi_strategy``, 'one_output_per_tree' or 'multi_output_tree'.
+        save_artifact (bool): Save the model and its metadata to the artifact store.
+        artifact_dir (str, optional): Artifact root directory, defaults to ``MULTI_TARGET_ARTIFACT_DIR``.
+        **tuning_kwargs: Passed to ``run_xgb_optuna_tuning`` (e.g. ``n_trials``, ``storage``);
+            stored studies are named with ``MULTI_TARGET_STUDY_PREFIX`` unless ``study_prefix`` is given.
+
+    Returns:
+        tuple: ``(xgboost.XGBRegressor, optuna.study.Study)`` the fitted model and its study.
+    """
+    artifact_dir = MULTI_TARGET_ARTIFACT_DIR if artifact_dir is None else artifact_dir
+    tuning_kwargs.setdefault('study_prefix', MULTI_TARGET_STUDY_PREFIX)
+    study = run_xgb_optuna_tuning(X, Y, multi_strategy=multi_strategy, **tuning_kwargs)
+    model = train_final_xgb_model_from_study(X, Y, study, save_artifact=save_artifact, artifact_dir=artifact_dir)
+    return model, study
+
+
+@traced('predict.multi_target')
+def predict_multi_target(X_pred, targets=None, best_model=None, artifact_dir=None):
+    """
+    Predict every service with a multi-output model, or with the latest saved one.
+
+    Without ``best_model``, the latest artifact trained before the first prediction
+    day is loaded from the multi-service artifact store (see ``predict_from_best_model``).
+
+    Parameters:
+        X_pred (pd.DataFrame): EFA-indexed prediction features.
+        targets (list of str, optional): Target columns ``best_model`` was trained on, in
+            training order, defaults to ``FR_SERVICE_TARGETS``; a saved model's own
+            targets are read from its metadata.
+        best_model (xgboost.XGBRegressor, optional): Fitted model to use instead of an artifact.
+        artifact_dir (str, optional): Artifact root directory, defaults to ``MULTI_TARGET_ARTIFACT_DIR``.
+
+    Returns:
+        pd.DataFrame: Predicted prices indexed like X_pred, one column per target.
+    """
+    if best_model is None:
+        best_model, X_pred, metadata = load_prediction_model(
+            X_pred, MULTI_TARGET_ARTIFACT_DIR if artifact_dir is None else artifact_dir)
+        targets = metadata['targets']
+    targets = FR_SERVICE_TARGETS if targets is None else list(targets)
+    y_pred = best_model.predict(X_pred)
+    return pd.DataFrame(y_pred.reshape(len(X_pred), -1), index=X_pred.index, columns=targets)
@@ -1,4 +1,93 @@
-def predict_from_best_model(X_pred, best_model):
+from frcast.model.artifacts import check_feature_schema, load_model_artifact
+from frcast.tracing import traced
+
+import pandas as pd
+
+
+def load_prediction_model(X_pred, artifact_dir=None):
+    """
+    Load the latest model artifact trained before the first prediction day of ``X_pred``.
+
+    Parameters:
+        X_pred (pd.DataFrame): EFA-indexed prediction features.
+        artifact_dir (str, optional): Artifact root directory, defaults to ``ARTIFACT_DIR``.
+
+    Returns:
+        tuple: ``(model, X_pred, metadata)`` with X_pred checked against (and
+        ordered like) the model's feature schema.
+    """
+    # EFA 1 of a trading day starts at 23:00 of the previous day
+    prediction_date = (X_pred.index.min() + pd.Timedelta(hours=1)).normalize()
+    model, metadata = load_model_artifact(prediction_date - pd.Timedelta(days=1), artifact_dir)
+    return model, check_feature_schema(X_pred, metadata), metadata
+
+
+@traced('predict')
+def predict_from_best_model(X_pred, best_model=None, artifact_dir=None):
+    """
+    Predict with a trained model, or with the latest saved model artifact.
+
+    Without ``best_model``, the latest artifact trained before the first
+    prediction day is loaded, so predicting does not require retraining. Its
+    feature schema is checked against ``X_pred`` and a mismatch is an error.
+
+    Parameters:
+        X_pred (pd.DataFrame): EFA-indexed prediction features.
+        best_model (xgboost.XGBRegressor, optional): Fitted model to use instead of an artifact.
+        artifact_dir (str, optional): Artifact root directory, defaults to ``ARTIFACT_DIR``.
+
+    Returns:
+        np.ndarray: Predicted prices, one per row of X_pred.
+
+    Raises:
+        FileNotFoundError: If no artifact was trained before the prediction day.
+        FeatureSchemaError: If X_pred does not have the model's features.
+    """
+    if best_model is None:
+        best_model, X_pred, _ = load_prediction_model(X_pred, artifact_dir)
     y_pred = best_model.predict(X_pred)
     return y_pred
 
+
+@traced('predict.batch')
+def predict_batch(X_pred, best_model=None, targets=None, artifact_dir=None):
+    """
+    Score a batch of prediction days with one model in a single ``predict`` call.
+
+    ``X_pred`` is typically built for a whole date range with
+    ``get_prediction_features_df(start_date, end_date=end_date)``. Without
+    ``best_model`` the latest artifact trained before the first prediction day is
+    used for every row, as for re-forecasts, what-if runs and backtest scoring of
+    a fixed model.
+
+    Parameters:
+        X_pred (pd.DataFrame): EFA-indexed prediction features of one or more trading days.
+        best_model (xgboost.XGBRegressor, optional): Fitted model to use instead of an artifact.
+        targets (list of str, optional): Target names of a multi-output ``best_model``;
+            a saved model's targets are read from its metadata.
+        artifact_dir (str, optional): Artifact root directory, defaults to ``ARTIFACT_DIR``.
+
+    Returns:
+        pd.DataFrame: Indexed by EFA block start time, with the ``trading_day``, the
+        ``efa_block`` number (1-6) and the prediction: a ``pred`` column for a
+        single-target model, one column per target for a multi-output model.
+
+    Raises:
+        FileNotFoundError: If no artifact was trained before the first prediction day.
+        FeatureSchemaError: If X_pred does not have the model's features.
+    """
+    if best_model is None:
+        best_model, X_pred, metadata = load_prediction_model(X_pred, artifact_dir)
+        targets = metadata.get('targets')
+    y_pred = best_model.predict(X_pred).reshape(len(X_pred), -1)
+    if y_pred.shape[1] == 1:
+        targets = ['pred']
+    elif targets is None or len(targets) != y_pred.shape[1]:
+        targets = [f'pred_{i}' for i in range(y_pred.shape[1])]
+
+    # EFA 1 of a trading day starts at 23:00 of the previous day
+    shifted = X_pred.index + pd.Timedelta(hours=1)
+    predictions = pd.DataFrame({'trading_day': shifted.normalize(), 'efa_block': shifted.hour//4 + 1},
+                               index=X_pred.index)
+    predictions[list(targets)] = y_pred
+    return predictions
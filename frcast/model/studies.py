@@ -0,0 +1,95 @@
+import os
+import optuna
+import pandas as pd
+
+STUDY_DB_PATH = os.environ.get('FRCAST_OPTUNA_DB',
+                               os.path.join(os.path.expanduser('~'), '.cache', 'frcast', 'optuna.db'))
+STUDY_PREFIX = 'xgb_dcl'
+
+
+def get_study_storage(db_path=None):
+    """
+    Return the Optuna storage URL of the local SQLite study database.
+
+    Parameters:
+        db_path (str): Path of the SQLite file, defaults to STUDY_DB_PATH
+            (``~/.cache/frcast/optuna.db``, override with ``FRCAST_OPTUNA_DB``).
+
+    Returns:
+        str: ``sqlite:///`` storage URL usable by ``optuna.create_study``.
+    """
+    db_path = STUDY_DB_PATH if db_path is None else db_path
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    return f'sqlite:///{os.path.abspath(db_path)}'
+
+
+def get_study_name(train_end_date, prefix=STUDY_PREFIX):
+    """Return the study name of one daily tuning run, e.g. ``xgb_dcl_2025-06-12``."""
+    return f'{prefix}_{pd.Timestamp(train_end_date).strftime("%Y-%m-%d")}'
+
+
+def find_previous_study(storage, study_name, prefix=STUDY_PREFIX):
+    """
+    Find the latest study in the storage that precedes ``study_name``.
+
+    Study names end with the training end date, so they sort chronologically.
+
+    Parameters:
+        storage (str or optuna.storages.BaseStorage): Optuna storage.
+        study_name (str): Name of the current study.
+        prefix (str): Only studies with this prefix are considered.
+
+    Returns:
+        optuna.study.Study or None: The previous study, if any.
+    """
+    study_names = sorted(name for name in optuna.study.get_all_study_names(storage)
+                         if name.startswith(prefix + '_') and name < study_name)
+    if not study_names:
+        return None
+    return optuna.load_study(study_name=study_names[-1], storage=storage)
+
+
+def enqueue_warm_start_trials(study, previous_study, top_k=5):
+    """
+    Enqueue the best ``top_k`` completed trials of a previous study into a new study.
+
+    The enqueued parameter sets are evaluated first, on the new study's data,
+    before the sampler proposes new ones.
+
+    Parameters:
+        study (optuna.study.Study): Study to seed.
+        previous_study (optuna.study.Study): Study whose best trials are reused.
+        top_k (int): Number of trials to enqueue.
+
+    Returns:
+        int: Number of enqueued trials.
+    """
+    completed = [trial for trial in previous_study.trials
+                 if trial.state == optuna.trial.TrialState.COMPLETE]
+    completed.sort(key=lambda trial: trial.value)
+    for trial in completed[:top_k]:
+        study.enqueue_trial(trial.params, user_attrs={'warm_start_from': previous_study.study_name})
+    return len(completed[:top_k])
+
+
+def get_best_params_history(storage=None, prefix=STUDY_PREFIX):
+    """
+    Return the best value and parameters of every stored daily study.
+
+    Parameters:
+        storage (str): Optuna storage, defaults to ``get_study_storage()``.
+        prefix (str): Only studies with this prefix are included.
+
+    Returns:
+        pd.DataFrame: One row per study (indexed by study name, in date order) with
+        columns ``best_value``, ``n_trials`` and one column per hyperparameter.
+    """
+    storage = get_study_storage() if storage is None else storage
+    rows = {}
+    for summary in optuna.study.get_all_study_summaries(storage):
+        if not summary.study_name.startswith(prefix + '_') or summary.best_trial is None:
+            continue
+        rows[summary.study_name] = {'best_value': summary.best_trial.value,
+                                    'n_trials': summary.n_trials,
+                                    **summary.best_trial.params}
+    return pd.DataFrame.from_dict(rows, orient='index').sort_index()
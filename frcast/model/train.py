@@ -1,10 +1,13 @@
-
-from sklearn.metrics import root_mean_squared_error, mean_absolute_error
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.model_selection import TimeSeriesSplit
+from frcast.model.artifacts import save_model_artifact
+from frcast.model.studies import STUDY_PREFIX, enqueue_warm_start_trials, find_previous_study, get_study_name
+from frcast.tracing import log_trace_to_mlflow, traced
 
 import mlflow
 import numpy as np
 import optuna
+import os
 import pandas as pd
 import xgboost as xgb
 
@@ -29,21 +32,140 @@ def generate_time_series_splits(X, y, n_splits=3, test_size=3*30*6):
     return list(tscv.split(X, y))
 
 
-def evaluate_xgb_trial(trial, X, y, splits):
+def get_thread_budget(n_workers=1, n_fold_workers=1, n_cpus=None):
+    """
+    Split the available CPU cores between concurrent trials and concurrent folds.
+
+    Each XGBoost model gets ``n_cpus // (n_workers * n_fold_workers)`` threads
+    (at least one), so that all concurrently trained models together use the
+    machine's cores without oversubscribing them.
+
+    Parameters:
+        n_workers (int): Trials evaluated concurrently.
+        n_fold_workers (int): Folds fitted concurrently within a trial.
+        n_cpus (int): Available cores, defaults to the cores this process may run on.
+
+    Returns:
+        int: Threads (``n_jobs``) per XGBoost model.
+    """
+    if n_cpus is None:
+        n_cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    return max(1, n_cpus // (n_workers*n_fold_workers))
+
+
+def align_training_rows(X, y):
+    """
+    Align the target to the feature rows and keep the rows whose labels are all known.
+
+    The target may cover fewer EFA blocks than the features (e.g. auctions without
+    a cleared price) or come in another order; the folds and fits slice both by
+    position, so they must share the same rows.
+
+    Parameters:
+        X (pd.DataFrame): Feature matrix.
+        y (pd.Series or pd.DataFrame): Target variable, or one column per target.
+
+    Returns:
+        tuple: ``(X, y)`` restricted to the rows of X with every label known.
+    """
+    y = y.reindex(X.index)
+    known = (y.notna().all(axis=1) if isinstance(y, pd.DataFrame) else y.notna()).to_numpy()
+    return X[known], y[known]
+
+
+def build_fold_matrices(X, y, splits, max_bin=256):
+    """
+    Materialize every cross-validation fold once as XGBoost quantile matrices.
+
+    The features are converted once to a contiguous float32 array; each fold's
+    training rows become a ``QuantileDMatrix`` (quantile bins computed once) and
+    its validation rows a ``QuantileDMatrix`` sharing those bins. Every Optuna
+    trial then reuses the same matrices instead of re-slicing pandas frames.
+    Contiguous folds (as produced by ``TimeSeriesSplit``) are sliced as views.
+
+    Parameters:
+        X (pd.DataFrame): Feature matrix.
+        y (pd.Series or pd.DataFrame): Target variable, or one column per target.
+        splits (list of tuples): Time series train/validation indices.
+        max_bin (int): Histogram bins per feature.
+
+    Returns:
+        list of tuples: ``(dtrain, dval)`` per fold.
+    """
+    X_values = np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+    y_values = np.ascontiguousarray(np.asarray(y, dtype=np.float32))
+    feature_names = [str(column) for column in X.columns]
+
+    def rows(index):
+        if len(index) and index[-1] - index[0] + 1 == len(index):
+            return slice(index[0], index[-1] + 1)
+        return index
+
+    fold_matrices = []
+    for train_idx, val_idx in splits:
+        train_rows, val_rows = rows(train_idx), rows(val_idx)
+        dtrain = xgb.QuantileDMatrix(X_values[train_rows], label=y_values[train_rows],
+                                     feature_names=feature_names, max_bin=max_bin)
+        dval = xgb.QuantileDMatrix(X_values[val_rows], label=y_values[val_rows],
+                                   feature_names=feature_names, max_bin=max_bin, ref=dtrain)
+        fold_matrices.append((dtrain, dval))
+    return fold_matrices
+
+
+@traced('tuning.fold')
+def _fit_fold(params, n_estimators, early_stopping_rounds, dtrain, dval):
+    evals_result = {}
+    booster = xgb.train(params, dtrain, num_boost_round=n_estimators,
+                        evals=[(dval, 'validation')], evals_result=evals_result,
+                        early_stopping_rounds=early_stopping_rounds, verbose_eval=False)
+    # Validation MAE at the best iteration (the last one without early stopping)
+    validation_mae = evals_result['validation']['mae']
+    best_iteration = booster.best_iteration + 1 if early_stopping_rounds else n_estimators
+    return validation_mae[best_iteration - 1], best_iteration
+
+
+@traced('tuning.trial')
+def evaluate_xgb_trial(trial, X, y, splits, early_stopping_rounds=50, n_fold_workers=1, n_jobs=None,
+                       fold_matrices=None, max_bin=256, multi_strategy=None):
     """
     Evaluate a set of XGBoost hyperparameters within an Optuna trial using time series cross-validation.
 
+    Each fold stops boosting once the validation MAE has not improved for
+    ``early_stopping_rounds`` rounds, and the running mean MAE is reported to
+    Optuna after every fold so that the study's pruner can stop unpromising
+    trials early. The mean best number of boosting rounds across folds is stored
+    in the trial's ``best_n_estimators`` user attribute.
+
+    Folds are trained with the native ``xgb.train`` API on the prebuilt matrices of
+    ``build_fold_matrices``; pass ``fold_matrices`` to reuse them across trials.
+
+    With ``n_fold_workers`` > 1 the folds are fitted concurrently in threads and
+    reported once all of them are done, so pruning then no longer saves fold fits.
+
+    With one target per column of ``y``, a single multi-output model is fitted per
+    fold and its MAE is the mean over all targets; ``multi_strategy`` is stored in
+    the trial's user attributes so ``get_best_params`` returns it.
+
     Parameters:
         trial (optuna.trial.Trial): The Optuna trial object to suggest hyperparameters.
         X (pd.DataFrame): Feature matrix for training and validation.
-        y (pd.Series): Target variable.
+        y (pd.Series or pd.DataFrame): Target variable, or one column per target.
         splits (list of tuples): Precomputed time series train/validation indices.
+        early_stopping_rounds (int or None): Rounds without improvement before a fold stops; None disables it.
+        n_fold_workers (int): Folds fitted concurrently.
+        n_jobs (int or None): XGBoost threads per model, see ``get_thread_budget``.
+        fold_matrices (list of tuples or None): Prebuilt ``(dtrain, dval)`` per fold, built here if None.
+        max_bin (int): Histogram bins per feature when building the fold matrices.
+        multi_strategy (str or None): XGBoost ``multi_strategy`` of multi-target models.
 
     Returns:
         float: Mean cross-validated MAE (mean absolute error) for the given trial's parameters.
+
+    Raises:
+        optuna.TrialPruned: If the pruner stops the trial after one of the folds.
     """
+    n_estimators = trial.suggest_int('n_estimators', 100, 1000)
     params = {
-        'n_estimators': trial.suggest_int('n_estimators', 100, 1000),
         'max_depth': trial.suggest_int('max_depth', 3, 12),
         'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3, log=True),
         'subsample': trial.suggest_float('subsample', 0.5, 1.0),
@@ -51,72 +173,210 @@ def evaluate_xgb_trial(trial, X, y, splits):
         'gamma': trial.suggest_float('gamma', 0, 5),
         'reg_alpha': trial.suggest_float('reg_alpha', 0, 5),
         'reg_lambda': trial.suggest_float('reg_lambda', 0, 5),
-        'random_state': 42
+        'seed': 42,
+        'objective': 'reg:squarederror',
+        'eval_metric': 'mae',
+        'tree_method': 'hist',
+        'max_bin': max_bin,
     }
+    if n_jobs is not None:
+        params['nthread'] = n_jobs
+    if multi_strategy is not None:
+        params['multi_strategy'] = multi_strategy
+        trial.set_user_attr('multi_strategy', multi_strategy)
+    if fold_matrices is None:
+        fold_matrices = build_fold_matrices(X, y, splits, max_bin)
+
+    if n_fold_workers > 1:
+        with ThreadPoolExecutor(max_workers=n_fold_workers) as executor:
+            fold_results = list(executor.map(
+                lambda matrices: _fit_fold(params, n_estimators, early_stopping_rounds, *matrices),
+                fold_matrices))
+    else:
+        fold_results = (_fit_fold(params, n_estimators, early_stopping_rounds, *matrices)
+                        for matrices in fold_matrices)
 
     scores = []
+    best_iterations = []
+    for fold, (score, best_iteration) in enumerate(fold_results):
+        scores.append(score)
+        best_iterations.append(best_iteration)
 
-    for train_idx, val_idx in splits:
-        X_train, X_val = X.iloc[train_idx], X.iloc[val_idx]
-        y_train, y_val = y.iloc[train_idx], y.iloc[val_idx]
+        trial.report(np.mean(scores), step=fold)
+        if trial.should_prune():
+            raise optuna.TrialPruned()
 
-        model = xgb.XGBRegressor(**params)
-        model.fit(X_train, y_train, 
-                  eval_set=[(X_val, y_val)],
-                  verbose=False)
+    trial.set_user_attr('best_n_estimators', int(np.mean(best_iterations)))
+    return np.mean(scores)
 
-        preds = model.predict(X_val)
-        score = mean_absolute_error(y_val, preds)
-        scores.append(score)
+def get_pruner(pruner, n_splits):
+    """
+    Build the Optuna pruner used to stop unpromising trials between CV folds.
 
-    return np.mean(scores)
+    Parameters:
+        pruner (str, optuna.pruners.BasePruner or None): 'median', 'hyperband', None/'none',
+            or a ready pruner instance.
+        n_splits (int): Number of CV folds (the pruning steps of a trial).
 
-def run_xgb_optuna_tuning(X, y, n_trials=50):
+    Returns:
+        optuna.pruners.BasePruner: The pruner.
+    """
+    if isinstance(pruner, optuna.pruners.BasePruner):
+        return pruner
+    if pruner == 'median':
+        return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=0)
+    if pruner == 'hyperband':
+        return optuna.pruners.HyperbandPruner(min_resource=1, max_resource=n_splits)
+    if pruner is None or pruner == 'none':
+        return optuna.pruners.NopPruner()
+    raise ValueError(f"Unknown pruner '{pruner}', expected 'median', 'hyperband' or None")
+
+@traced('tuning.study')
+def run_xgb_optuna_tuning(X, y, n_trials=50, pruner='median', early_stopping_rounds=50,
+                          storage=None, study_name=None, warm_start_top_k=5,
+                          min_trials=10, warm_start_tolerance=0.05, n_workers=1, n_fold_workers=1,
+                          multi_strategy=None, study_prefix=STUDY_PREFIX, n_jobs=None):
     """
     Run hyperparameter optimization for an XGBoost model using Optuna with time series cross-validation.
 
     This function performs hyperparameter tuning using Optuna's Bayesian optimization framework.
     It evaluates each trial with time series splits and returns the full Optuna study object.
 
+    With a ``storage`` (e.g. ``get_study_storage()``), the study is kept on disk under
+    ``study_name`` (by default ``xgb_dcl_<last training date>``) and resumed if it
+    already exists. A new study is warm-started with the best ``warm_start_top_k``
+    trials of the previous day's study. If the best warm-started trial scores within
+    ``warm_start_tolerance`` of the previous best MAE, the previous optimum is still
+    competitive and the study stops at ``min_trials`` trials instead of ``n_trials``.
+
+    ``n_workers`` trials run concurrently in threads (XGBoost releases the GIL while
+    training), each fitting ``n_fold_workers`` folds concurrently; the machine's cores
+    are split between all concurrent models (``get_thread_budget``). Callers that run
+    several tunings at once (e.g. a backtest process pool) pass their share as ``n_jobs``.
+
+    ``y`` may hold one target per column: every trial then fits one multi-output
+    model per fold (see ``evaluate_xgb_trial``), so several targets share a single
+    study, its fold matrices and its pruning.
+
     Parameters:
         X (pd.DataFrame): Feature matrix for model training.
-        y (pd.Series): Target variable.
+        y (pd.Series or pd.DataFrame): Target variable, or one column per target; rows of X without
+            a label are left out (see ``align_training_rows``).
         n_trials (int): Number of Optuna trials to run.
+        pruner (str or optuna.pruners.BasePruner): Fold-level pruner, see ``get_pruner``.
+        early_stopping_rounds (int or None): XGBoost early stopping on each validation fold.
+        storage (str or None): Optuna storage URL; None keeps the study in memory.
+        study_name (str or None): Name of the stored study.
+        warm_start_top_k (int): Trials of the previous study to enqueue.
+        min_trials (int): Trial budget when the warm start is still competitive.
+        warm_start_tolerance (float): Relative MAE margin for a competitive warm start.
+        n_workers (int): Trials evaluated concurrently.
+        n_fold_workers (int): Folds fitted concurrently within each trial.
+        multi_strategy (str or None): XGBoost ``multi_strategy`` of multi-target models,
+            'one_output_per_tree' or 'multi_output_tree'.
+        study_prefix (str): Prefix of stored study names; studies only warm-start
+            from studies with the same prefix.
+        n_jobs (int or None): Threads this tuning may use in total, split between its
+            concurrent trials and folds; None uses all cores.
 
     Returns:
         optuna.study.Study: The Optuna study object containing all trial results.
     """
+    if storage is not None and study_name is None: # named after the window, even if its last blocks lack labels
+        study_name = get_study_name(X.index.max(), study_prefix)
+    X, y = align_training_rows(X, y)
     splits = generate_time_series_splits(X, y)
     optuna.logging.set_verbosity(optuna.logging.WARNING)
 
-    study = optuna.create_study(direction='minimize')
-    study.optimize(lambda trial: evaluate_xgb_trial(trial, X, y, splits),
-                   n_trials=n_trials, show_progress_bar=False)
+    study = optuna.create_study(direction='minimize', pruner=get_pruner(pruner, len(splits)),
+                                storage=storage, study_name=study_name,
+                                load_if_exists=storage is not None)
+    n_jobs = get_thread_budget(n_workers, n_fold_workers, n_cpus=n_jobs)
+    # Fold matrices are built once and shared by every trial
+    fold_matrices = build_fold_matrices(X, y, splits)
+    objective = lambda trial: evaluate_xgb_trial(trial, X, y, splits, early_stopping_rounds,
+                                                 n_fold_workers, n_jobs, fold_matrices,
+                                                 multi_strategy=multi_strategy)
+
+    if 'trial_budget' in study.user_attrs: # resumed study keeps the budget decided on its first run
+        n_trials = study.user_attrs['trial_budget']
+    previous_study = None
+    if storage is not None and len(study.trials) == 0:
+        previous_study = find_previous_study(storage, study_name, study_prefix)
+    n_warm_trials = 0
+    if previous_study is not None:
+        n_warm_trials = enqueue_warm_start_trials(study, previous_study, warm_start_top_k)
+    if n_warm_trials > 0:
+        study.optimize(objective, n_trials=n_warm_trials, n_jobs=n_workers, show_progress_bar=False)
+        warm_values = [trial.value for trial in study.trials if trial.value is not None]
+        if warm_values and min(warm_values) <= previous_study.best_value*(1 + warm_start_tolerance):
+            n_trials = min(n_trials, min_trials)
+        study.set_user_attr('trial_budget', n_trials)
+
+    n_remaining_trials = n_trials - len(study.trials)
+    if n_remaining_trials > 0:
+        study.optimize(objective, n_trials=n_remaining_trials, n_jobs=n_workers, show_progress_bar=False)
     
     # print('Minimum MAE:', study.best_value)
     return study
 
-def train_final_xgb_model_from_study(X, y, study):
+def get_best_params(study):
+    """
+    Return the best trial's hyperparameters, with ``n_estimators`` replaced by the
+    number of boosting rounds early stopping found on the validation folds, and the
+    ``multi_strategy`` of multi-target studies added.
+
+    Parameters:
+        study (optuna.study.Study): Completed Optuna study.
+
+    Returns:
+        dict: XGBRegressor keyword arguments.
+    """
+    best_params = dict(study.best_trial.params)
+    if 'best_n_estimators' in study.best_trial.user_attrs:
+        best_params['n_estimators'] = study.best_trial.user_attrs['best_n_estimators']
+    if 'multi_strategy' in study.best_trial.user_attrs:
+        best_params['multi_strategy'] = study.best_trial.user_attrs['multi_strategy']
+    return best_params
+
+@traced('train.final_fit')
+def train_final_xgb_model_from_study(X, y, study, save_artifact=True, artifact_dir=None):
     """
     Train a final XGBoost model using the best hyperparameters from an Optuna study.
 
     This function extracts the best trial from the Optuna study, instantiates an XGBoost regressor,
     logs the final model parameters and validation MAE to MLflow, and fits the model on the full dataset.
+    The number of estimators is the best iteration found by early stopping during tuning.
+
+    The fitted model is saved as an artifact keyed by the last training date (see
+    ``save_model_artifact``) and logged to the MLflow run, so that prediction can
+    reuse it without retraining. When tracing is enabled (see ``frcast.tracing``),
+    the totals of the spans recorded so far are logged to the run as metrics.
 
     Parameters:
         X (pd.DataFrame): Full feature matrix for training.
-        y (pd.Series): Target variable.
+        y (pd.Series or pd.DataFrame): Target variable, or one column per target (multi-output model);
+            rows of X without a label are left out.
         study (optuna.study.Study): Completed Optuna study with best trial.
+        save_artifact (bool): Save the model and its metadata to the artifact store.
+        artifact_dir (str, optional): Artifact root directory, defaults to ``ARTIFACT_DIR``.
 
     Returns:
         xgboost.XGBRegressor: The trained XGBoost model with optimal hyperparameters.
     """
-    best_params = study.best_trial.params
+    train_end_date = X.index.max().normalize() # the artifact key, even if the last blocks lack labels
+    X, y = align_training_rows(X, y)
+    best_params = get_best_params(study)
     best_model = xgb.XGBRegressor(**best_params)
     
     with mlflow.start_run(run_name="xgb_fit_best_model"):
         mlflow.log_metric("mean_cv_mae", study.best_value)
         mlflow.log_params(best_params)
     
-    best_model.fit(X, y)
+        best_model.fit(X, y)
+        if save_artifact:
+            artifact_path = save_model_artifact(best_model, X, y, best_params, study.best_value,
+                                                train_end_date=train_end_date, artifact_dir=artifact_dir)
+            mlflow.log_artifacts(artifact_path, artifact_path="model")
+        log_trace_to_mlflow()
     return best_model
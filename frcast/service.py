@@ -0,0 +1,343 @@
+"""
+Long-running local forecast service.
+
+Keeps the latest saved model and the prediction features of recent trading days
+in memory and answers HTTP requests for the EFA block forecasts of a trading day:
+
+    GET  /forecast?date=YYYY-MM-DD   forecasts of the six EFA blocks of the trading day
+    GET  /health                     model, cached days and request counters
+    POST /refresh                    refresh the source data and the model now
+
+Source data is refreshed in the background at ``REFRESH_TIMES`` (local time),
+and the model is reloaded when a newer artifact has been saved (e.g. by the
+daily ``main.py`` run). A trading day is forecast by the latest model trained
+before it (as ``load_prediction_model`` does), so a past day is re-forecast by
+the model of that time rather than by one trained on its own prices.
+Concurrent requests for the same day share one feature build, and a day's
+response is cached until the next refresh. Both caches are keyed by the
+model's train end date, and results of a build that a refresh overtook are
+not stored, so neither a replaced model nor outdated source data is served.
+
+The server is plain asyncio (HTTP/1.1 with keep-alive), so it needs no extra
+dependency; feature builds and predictions run in worker threads.
+
+Usage:
+    python -m frcast.service --port 8080
+    curl 'http://127.0.0.1:8080/forecast?date=2025-06-12'
+"""
+from collections import OrderedDict
+from frcast.data.train_predict_data import get_prediction_features_df
+from frcast.model.artifacts import ARTIFACT_DIR, check_feature_schema, list_model_artifacts, load_model_artifact
+from frcast.model.predict import predict_batch
+from urllib.parse import parse_qs, urlsplit
+
+import argparse
+import asyncio
+import json
+import pandas as pd
+import threading
+
+# Local times of the background refreshes: before the 09:00 decision time (overnight
+# margins and demand forecast publications), after the day-ahead EAC results and
+# in the evening for revised forecasts
+REFRESH_TIMES = (pd.Timedelta(hours=8, minutes=30), pd.Timedelta(hours=15), pd.Timedelta(hours=20))
+# Older models kept in memory for re-forecasts of past trading days
+MAX_PAST_MODELS = 4
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+def get_next_refresh_time(now, refresh_times=REFRESH_TIMES):
+    """Return the first scheduled refresh time after ``now``."""
+    now = pd.Timestamp(now)
+    today = now.normalize()
+    candidates = [today + offset for offset in refresh_times]
+    candidates.append(today + pd.Timedelta(days=1) + min(refresh_times))
+    return min(candidate for candidate in candidates if candidate > now)
+
+
+class ForecastService:
+    """
+    In-memory state of the forecast service.
+
+    Parameters:
+        artifact_dir (str, optional): Artifact root directory, defaults to ``ARTIFACT_DIR``.
+        prefetch_days (int): Trading days from tomorrow on whose features are rebuilt
+            on every refresh (one batch build), so that their requests are served warm.
+        max_cached_days (int): Trading days whose features, and whose responses, are kept
+            (least recently used are dropped).
+        refresh_times (tuple of pd.Timedelta): Local times of the background refreshes.
+    """
+
+    def __init__(self, artifact_dir=None, prefetch_days=2, max_cached_days=64, refresh_times=REFRESH_TIMES):
+        self.artifact_dir = ARTIFACT_DIR if artifact_dir is None else artifact_dir
+        self.prefetch_days = prefetch_days
+        self.max_cached_days = max_cached_days
+        self.refresh_times = refresh_times
+        self._model = (None, None, None) # (model, metadata, model_date), swapped as one under the lock
+        self._past_models = OrderedDict() # model_date -> (model, metadata, model_date) of older artifacts
+        self.last_refresh = None
+        self._generation = 0 # incremented by every refresh that drops cache entries
+        self._features = OrderedDict() # (model_date, trading day) -> prediction features
+        self._responses = OrderedDict() # (model_date, trading day) -> encoded JSON response
+        self._inflight = {} # key -> task shared by concurrent identical requests
+        self._lock = threading.Lock() # the caches are updated from worker threads
+        self.stats = {'requests': 0, 'response_cache_hits': 0, 'coalesced': 0, 'feature_builds': 0,
+                      'refreshes': 0, 'errors': 0}
+
+    @property
+    def model(self):
+        return self._model[0]
+
+    @property
+    def metadata(self):
+        return self._model[1]
+
+    @property
+    def model_date(self):
+        return self._model[2]
+
+    def load_latest_model(self):
+        """Load the newest model artifact if it differs from the one in memory; return True if it changed."""
+        dates = list_model_artifacts(self.artifact_dir)
+        if not dates or dates[-1] == self.model_date:
+            return False
+        model, metadata = load_model_artifact(dates[-1], self.artifact_dir)
+        with self._lock: # predictions running meanwhile keep the (model, metadata) they started with
+            self._model = (model, metadata, dates[-1])
+        return True
+
+    def _model_for_day(self, trading_day):
+        """
+        Return the ``(model, metadata, model_date)`` of the latest model trained before ``trading_day``.
+
+        Raises:
+            FileNotFoundError: If no artifact was trained before the trading day.
+        """
+        current_model = self._model
+        last_train_day = f'{trading_day - pd.Timedelta(days=1):%Y-%m-%d}'
+        if current_model[2] is not None and current_model[2] <= last_train_day:
+            return current_model
+        dates = [date for date in list_model_artifacts(self.artifact_dir) if date <= last_train_day]
+        if not dates:
+            raise FileNotFoundError(f'No model artifact in {self.artifact_dir} trained before '
+                                    f'{trading_day:%Y-%m-%d}')
+        past_model = self._get_cached(self._past_models, dates[-1])
+        if past_model is None:
+            past_model = (*load_model_artifact(dates[-1], self.artifact_dir), dates[-1])
+            with self._lock:
+                self._past_models[dates[-1]] = past_model
+                while len(self._past_models) > MAX_PAST_MODELS:
+                    self._past_models.popitem(last=False)
+        return past_model
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _get_cached(self, cache, key):
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _store_cached(self, cache, items, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation: # a refresh dropped what was built
+                return
+            for key, value in items:
+                cache[key] = value
+                cache.move_to_end(key)
+            while len(cache) > self.max_cached_days:
+                cache.popitem(last=False)
+
+    def _store_features(self, model_date, X, generation=None):
+        trading_days = (X.index + pd.Timedelta(hours=1)).normalize()
+        self._store_cached(self._features, [((model_date, day), X[trading_days == day])
+                                            for day in trading_days.unique()], generation)
+
+    def _build_features(self, start_date, end_date, metadata):
+        self._count('feature_builds')
+        # Only the features of the model are built, so sources it does not use are not fetched
+        features = None if metadata is None else metadata.get('feature_names')
+        return get_prediction_features_df(start_date, end_date=end_date, features=features)
+
+    def _refresh(self):
+        tomorrow = pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+        self.load_latest_model()
+        _, metadata, model_date = self._model
+        with self._lock:
+            # Days not yet delivered may have new forecasts and auction results; past days are final.
+            # Entries of a replaced model are never read again.
+            for cache in (self._features, self._responses):
+                for key in [key for key in cache if key[0] != model_date or key[1] >= tomorrow]:
+                    del cache[key]
+            self._generation += 1 # builds started before now are not stored
+        if self.prefetch_days > 0:
+            X = self._build_features(tomorrow, tomorrow + pd.Timedelta(days=self.prefetch_days - 1), metadata)
+            if not X.empty:
+                self._store_features(model_date, X)
+        self.last_refresh = pd.Timestamp.now()
+        self._count('refreshes')
+
+    async def _coalesced(self, key, function, *args):
+        """Run function in a worker thread, sharing one run between concurrent calls with the same key."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(function, *args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self._count('coalesced')
+        return await asyncio.shield(task)
+
+    async def refresh(self):
+        """Reload a newer model and rebuild the features of the prefetched days."""
+        await self._coalesced(('refresh',), self._refresh)
+
+    def _predict(self, trading_day, current_model, generation):
+        model, metadata, model_date = current_model
+        X = self._get_cached(self._features, (model_date, trading_day))
+        if X is None:
+            X = self._build_features(trading_day, trading_day, metadata)
+            if X.empty:
+                raise ValueError(f'No features available for {trading_day:%Y-%m-%d}')
+            self._store_features(model_date, X, generation)
+        predictions = predict_batch(check_feature_schema(X, metadata), model, targets=metadata.get('targets'))
+        blocks = [{'start': start.isoformat(), **row}
+                  for start, row in zip(predictions.index, predictions.drop(columns='trading_day').to_dict('records'))]
+        return json.dumps({'trading_day': f'{trading_day:%Y-%m-%d}', 'model_train_end_date': model_date,
+                           'efa_blocks': blocks}).encode('utf-8')
+
+    async def forecast(self, trading_day):
+        """Return the encoded JSON forecast of a trading day, from the response cache when possible."""
+        trading_day = pd.Timestamp(trading_day).normalize()
+        generation = self._generation
+        # The whole request uses one model, even if a refresh replaces it
+        current_model = await asyncio.to_thread(self._model_for_day, trading_day)
+        key = (current_model[2], trading_day)
+        response = self._get_cached(self._responses, key)
+        if response is not None:
+            self._count('response_cache_hits')
+            return response
+        # Requests after a refresh do not join a build it overtook
+        response = await self._coalesced(('forecast', generation, *key), self._predict, trading_day, current_model,
+                                         generation)
+        self._store_cached(self._responses, [(key, response)], generation)
+        return response
+
+    def health(self):
+        model_date = self.model_date
+        with self._lock:
+            cached_days = [day for date, day in self._features if date == model_date]
+        return json.dumps({'status': 'ok' if self.model is not None else 'no model',
+                           'model_train_end_date': model_date,
+                           'last_refresh': None if self.last_refresh is None else self.last_refresh.isoformat(),
+                           'cached_days': [f'{day:%Y-%m-%d}' for day in cached_days],
+                           'stats': self.stats}).encode('utf-8')
+
+    async def refresh_periodically(self):
+        """Refresh at every scheduled refresh time; a failed refresh is reported and retried at the next one."""
+        while True:
+            now = pd.Timestamp.now()
+            await asyncio.sleep((get_next_refresh_time(now, self.refresh_times) - now).total_seconds())
+            try:
+                await self.refresh()
+            except Exception as error:
+                print('Scheduled refresh failed:', error)
+
+    async def handle_request(self, method, target):
+        """Return ``(status, body)`` of one HTTP request."""
+        url = urlsplit(target)
+        self._count('requests')
+        if url.path == '/health':
+            return 200, self.health()
+        if url.path == '/refresh':
+            if method != 'POST':
+                return 405, _error('Use POST /refresh')
+            await self.refresh()
+            return 200, self.health()
+        if url.path != '/forecast':
+            return 404, _error(f'Unknown path {url.path}')
+        if self.model is None:
+            return 503, _error(f'No model artifact in {self.artifact_dir}')
+        try:
+            trading_day = pd.Timestamp(parse_qs(url.query)['date'][0])
+        except (KeyError, ValueError):
+            return 400, _error('Expected /forecast?date=YYYY-MM-DD')
+        try:
+            return 200, await self.forecast(trading_day)
+        except FileNotFoundError as error: # no model trained before the day
+            return 404, _error(str(error))
+        except Exception as error:
+            self._count('errors')
+            return 500, _error(str(error))
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if int(headers.get('content-length', 0)):
+                    await reader.readexactly(int(headers['content-length']))
+                status, body = await self.handle_request(method, target)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(f'HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n'
+                             f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+                             f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        """Load the model, refresh once and serve until cancelled."""
+        try:
+            await self.refresh()
+        except Exception as error: # e.g. the NESO API is unreachable; requests build features on demand
+            print('Initial refresh failed:', error)
+            self.load_latest_model()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        refresher = asyncio.ensure_future(self.refresh_periodically())
+        print(f'Forecast service listening on http://{host}:{port} (model {self.model_date})', flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            refresher.cancel()
+
+
+def _error(message):
+    return json.dumps({'error': message}).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve next-day FR price forecasts over HTTP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--artifact-dir', help='model artifact directory, defaults to FRCAST_MODEL_DIR')
+    parser.add_argument('--prefetch-days', type=int, default=2,
+                        help='trading days from tomorrow rebuilt on every refresh')
+    args = parser.parse_args()
+    service = ForecastService(args.artifact_dir, prefetch_days=args.prefetch_days)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+from contextlib import contextmanager, nullcontext
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+TRACE_FILE = os.environ.get('FRCAST_TRACE') # tracing is enabled at import when set to a file path
+
+_enabled = False
+_trace_memory = False
+_trace_file = None
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+_counters = {'bytes_downloaded': 0, 'requests': 0}
+# Shared do-nothing span returned while tracing is disabled; its dict absorbs any attributes set on it
+_NULL_SPAN = nullcontext({})
+
+
+def enable_tracing(trace_file=None, memory=False):
+    """
+    Start recording spans.
+
+    Parameters:
+        trace_file (str, optional): Path ``write_trace`` writes to by default.
+        memory (bool): Also trace Python allocations (tracemalloc) to report the
+            peak memory of every span; slows allocation-heavy code noticeably.
+    """
+    global _enabled, _trace_memory, _trace_file
+    _trace_file = trace_file
+    _trace_memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+
+
+def disable_tracing():
+    """Stop recording spans (recorded spans are kept until ``reset_trace``)."""
+    global _enabled
+    _enabled = False
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_tracing():
+    return _enabled
+
+
+def reset_trace():
+    """Drop all recorded spans."""
+    with _lock:
+        _spans.clear()
+
+
+def count(name, value=1):
+    """Add to a process-wide counter (e.g. ``bytes_downloaded``); spans report its change while they were open."""
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + value
+
+
+def span(name, **attributes):
+    """
+    Time a named stage of the pipeline.
+
+    Use as ``with span('fetch.fr_prices') as attrs: ...`` and set ``attrs['rows']``
+    (or any other JSON-serializable attribute) inside the block. Each span records
+    wall time, process CPU time, the bytes and requests downloaded while it was
+    open (across threads), the peak traced memory above its start when memory
+    tracing is on, and the process max RSS. While tracing is disabled a shared
+    no-op context is returned, so instrumented code costs one function call.
+
+    Parameters:
+        name (str): Dotted span name, e.g. ``features.train``.
+        **attributes: Initial attributes of the span.
+
+    Returns:
+        context manager yielding the span's attribute dict.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _record_span(name, attributes)
+
+
+def traced(name):
+    """
+    Decorator wrapping every call of a function in ``span(name)``.
+
+    When the function returns a DataFrame or Series (or a tuple or dict of them),
+    the span's ``rows`` attribute is set to the length of the first one.
+
+    Parameters:
+        name (str): Dotted span name.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _record_span(name, {}) as attributes:
+                result = function(*args, **kwargs)
+                first = result
+                if isinstance(result, (tuple, dict)) and result:
+                    first = next(iter(result.values())) if isinstance(result, dict) else result[0]
+                if hasattr(first, 'shape') and hasattr(first, 'index'):
+                    attributes['rows'] = len(first)
+                return result
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def _record_span(name, attributes):
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1] if stack else None
+    memory = _trace_memory and tracemalloc.is_tracing()
+    if memory:
+        if parent is not None: # keep the parent's peak before resetting it for this span
+            parent['_peak'] = max(parent['_peak'], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    record = {'name': name, 'parent': parent['name'] if parent else None, 'depth': len(stack),
+              'thread': threading.get_ident(), 'attributes': dict(attributes), '_peak': 0,
+              '_memory_start': tracemalloc.get_traced_memory()[0] if memory else 0}
+    with _lock:
+        counters_start = dict(_counters)
+    stack.append(record)
+    start_time, start_wall, start_cpu = time.time(), time.perf_counter(), time.process_time()
+    try:
+        yield record['attributes']
+    finally:
+        record['wall_s'] = time.perf_counter() - start_wall
+        record['cpu_s'] = time.process_time() - start_cpu
+        record['start'] = start_time
+        stack.pop()
+        with _lock:
+            for counter, value in _counters.items():
+                record[counter] = value - counters_start.get(counter, 0)
+        if memory:
+            record['_peak'] = max(record['_peak'], tracemalloc.get_traced_memory()[1])
+            record['peak_mb'] = (record['_peak'] - record['_memory_start'])/2**20
+            if parent is not None:
+                parent['_peak'] = max(parent['_peak'], record['_peak'])
+        if resource is not None:
+            record['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+        with _lock:
+            _spans.append({key: value for key, value in record.items() if not key.startswith('_')})
+
+
+def get_spans():
+    """Return a copy of the recorded spans, in the order they finished."""
+    with _lock:
+        return list(_spans)
+
+
+def summarize_spans(spans=None):
+    """
+    Aggregate the recorded spans by name.
+
+    Returns:
+        dict: span name -> ``count`` and the totals of ``wall_s``, ``cpu_s``,
+        ``bytes_downloaded``, ``requests`` and ``rows``, plus the maximum ``peak_mb``.
+    """
+    summary = {}
+    for record in get_spans() if spans is None else spans:
+        totals = summary.setdefault(record['name'], {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+                                                     'bytes_downloaded': 0, 'requests': 0, 'rows': 0})
+        totals['count'] += 1
+        for key in ('wall_s', 'cpu_s', 'bytes_downloaded', 'requests'):
+            totals[key] += record.get(key, 0)
+        totals['rows'] += record['attributes'].get('rows', 0) or 0
+        if 'peak_mb' in record:
+            totals['peak_mb'] = max(totals.get('peak_mb', 0.0), record['peak_mb'])
+    return summary
+
+
+def write_trace(trace_file=None):
+    """
+    Write the recorded spans to a JSON trace file.
+
+    The file uses the Chrome trace event format (open it in Perfetto or
+    chrome://tracing); the ``spans`` member holds the raw span records and
+    ``summary`` the per-name totals of ``summarize_spans``.
+
+    Parameters:
+        trace_file (str, optional): Output path, defaults to the path given to
+            ``enable_tracing`` or ``FRCAST_TRACE``.
+
+    Returns:
+        str: The path written.
+    """
+    trace_file = trace_file or _trace_file
+    if trace_file is None:
+        raise ValueError('No trace file given and none set with enable_tracing or FRCAST_TRACE')
+    spans = get_spans()
+    events = [{'name': record['name'], 'ph': 'X', 'pid': os.getpid(), 'tid': record['thread'],
+               'ts': record['start']*1e6, 'dur': record['wall_s']*1e6,
+               'args': {key: value for key, value in record.items()
+                        if key not in ('name', 'thread', 'start', 'wall_s')}}
+              for record in spans]
+    os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+    with open(trace_file, 'w') as f:
+        json.dump({'traceEvents': events, 'spans': spans, 'summary': summarize_spans(spans)}, f, indent=1, default=str)
+    return trace_file
+
+
+def log_trace_to_mlflow(spans=None):
+    """
+    Log the per-name span totals as metrics of the active MLflow run.
+
+    Metrics are named ``span.<name>.<metric>`` (wall_s, cpu_s, count, rows,
+    bytes_downloaded, requests, peak_mb). Does nothing when tracing is disabled.
+    """
+    if not _enabled:
+        return
+    import mlflow
+    metrics = {f'span.{name}.{metric}': float(value)
+               for name, totals in summarize_spans(spans).items() for metric, value in totals.items()}
+    if metrics:
+        mlflow.log_metrics(metrics)
+
+
+if TRACE_FILE:
+    enable_tracing(TRACE_FILE)
+    atexit.register(write_trace)
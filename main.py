@@ -1,26 +1,62 @@
+import argparse
 import frcast
+from frcast.model.multi_target import MULTI_TARGET_ARTIFACT_DIR
 import pandas as pd
 
-def main():
-    '''Predicts DCL pricing for next day as delivery day 
-    (EFA 1: 23:00 of today to EFA 6: 19:00 of the next day)'''
-    # Collect train dataset for one-year back
-    X, y = frcast.get_train_features_target_df()
-    # Spliting into train (9 months data) and validation set (3 months data)
-    splits = frcast.generate_time_series_splits(X,y, n_splits=4, test_size = 3*30*6)
-    # Hyperparameters tuning
-    optuna_study = frcast.run_xgb_optuna_tuning(X, y, n_trials=50)
-    # Fit the best-model
-    best_model = frcast.train_final_xgb_model_from_study(X, y, optuna_study)
+def main(retrain=False):
+    '''Predicts DCL pricing for next day as delivery day
+    (EFA 1: 23:00 of today to EFA 6: 19:00 of the next day)
+
+    The model trained up to today is reused from the artifact store if it exists;
+    otherwise yesterday's model is updated on the new training window (with a full
+    tune -> fit rebuild weekly, on drift, or with retrain=True).'''
+    today = pd.Timestamp.now().normalize()
+    if(retrain or today.strftime('%Y-%m-%d') not in frcast.list_model_artifacts()):
+        # Collect train dataset for one-year back
+        X, y = frcast.get_train_features_target_df()
+        # Incremental update of yesterday's model, or hyperparameter tuning + fit on full rebuilds
+        # (studies stored on disk and warm-started from the previous day's study; model saved to the artifact store)
+        _, update = frcast.update_xgb_model(X, y, force_rebuild=retrain, n_trials=50,
+                                            storage=frcast.get_study_storage())
+        print(f"Model update: {update}")
     # Features dataset for the next day
     X_pred = frcast.get_prediction_features_df()
-    # Prediction from the next day
-    y_pred = best_model.predict(X_pred)
+    # Prediction for the next day from the latest saved model
+    y_pred = frcast.predict_from_best_model(X_pred)
     y_pred = pd.Series(data = y_pred, index = X_pred.index)
     print("Predicted DCL Prices:")
     print(y_pred)
-    
-    return y
+
+    return y_pred
+
+def main_all_services(retrain=False):
+    '''Predicts next-day clearing prices of every FR service (DCL, DCH, DML, DMH, DRL, DRH)
+    with one multi-output model built from a single feature build and tuning pass'''
+    today = pd.Timestamp.now().normalize()
+    if(retrain or today.strftime('%Y-%m-%d') not in frcast.list_model_artifacts(MULTI_TARGET_ARTIFACT_DIR)):
+        X, Y = frcast.get_train_features_target_df(targets = frcast.FR_SERVICE_TARGETS)
+        frcast.train_multi_target_model(X, Y, n_trials = 50, storage = frcast.get_study_storage())
+    X_pred = frcast.get_prediction_features_df()
+    y_pred = frcast.predict_multi_target(X_pred)
+    print("Predicted FR Prices:")
+    print(y_pred)
+
+    return y_pred
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description = 'Forecast next-day DCL prices')
+    parser.add_argument('--retrain', action = 'store_true',
+                        help = 'retrain even if a model trained up to today is saved')
+    parser.add_argument('--all-services', action = 'store_true',
+                        help = 'forecast every FR service with one multi-output model')
+    parser.add_argument('--trace', metavar = 'PATH',
+                        help = 'write a JSON trace of the pipeline stages to PATH')
+    args = parser.parse_args()
+    if(args.trace):
+        frcast.enable_tracing(args.trace, memory = True)
+    if(args.all_services):
+        main_all_services(retrain = args.retrain)
+    else:
+        main(retrain = args.retrain)
+    if(args.trace):
+        print(f"Trace written to {frcast.write_trace()}")
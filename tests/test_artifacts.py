@@ -0,0 +1,97 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+
+from frcast.data.time_periods import get_efa_index
+from frcast.model.artifacts import (METADATA_FILE, MODEL_FILE, FeatureSchemaError, check_feature_schema,
+                                    get_data_fingerprint, list_model_artifacts, load_model_artifact,
+                                    save_model_artifact)
+
+PARAMS = {'n_estimators': 20, 'max_depth': 3, 'learning_rate': 0.3}
+
+
+@pytest.fixture
+def training_data():
+    """A month of EFA blocks ending on 2025-06-10, with a target that is a function of the features."""
+    efa_index = get_efa_index(pd.Timestamp('2025-05-11'), pd.Timestamp('2025-06-10'))
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(len(efa_index), 3)), index=efa_index, columns=['a', 'b', 'c'])
+    y = (10*X['a'] + X['b']).rename('dcl_price')
+    return X, y
+
+
+def fit(X, y):
+    return xgb.XGBRegressor(**PARAMS).fit(X, y)
+
+
+def test_artifact_round_trip(training_data, tmp_path):
+    X, y = training_data
+    model = fit(X, y)
+
+    path = save_model_artifact(model, X, y, PARAMS, cv_mae=1.5, artifact_dir=str(tmp_path),
+                               extra_metadata={'study_name': 'xgb_dcl_2025-06-10'})
+    loaded, metadata = load_model_artifact(artifact_dir=str(tmp_path))
+
+    assert path == os.path.join(str(tmp_path), '2025-06-10')
+    assert sorted(os.listdir(path)) == sorted([MODEL_FILE, METADATA_FILE])
+    np.testing.assert_array_equal(loaded.predict(X), model.predict(X))
+    assert metadata['train_end_date'] == '2025-06-10' # the trading day of the last block
+    assert metadata['feature_names'] == ['a', 'b', 'c'] and metadata['targets'] == ['dcl_price']
+    assert metadata['n_rows'] == len(X) and metadata['params'] == PARAMS and metadata['cv_mae'] == 1.5
+    assert metadata['study_name'] == 'xgb_dcl_2025-06-10'
+    assert metadata['data_fingerprint'] == get_data_fingerprint(X, y)
+
+
+def test_data_fingerprint_changes_with_the_data(training_data):
+    X, y = training_data
+    changed = X.copy()
+    changed.iloc[5, 0] += 1e-9
+
+    assert get_data_fingerprint(X, y) == get_data_fingerprint(X.copy(), y.copy())
+    assert get_data_fingerprint(changed, y) != get_data_fingerprint(X, y)
+    assert get_data_fingerprint(X.rename(columns={'c': 'd'}), y) != get_data_fingerprint(X, y)
+    assert get_data_fingerprint(X, y + 1) != get_data_fingerprint(X, y)
+
+
+def test_artifact_of_several_targets(training_data, tmp_path):
+    X, y = training_data
+    Y = pd.DataFrame({'dcl_price': y, 'dch_price': -y})
+
+    save_model_artifact(fit(X, Y), X, Y, PARAMS, artifact_dir=str(tmp_path))
+
+    assert load_model_artifact(artifact_dir=str(tmp_path))[1]['targets'] == ['dcl_price', 'dch_price']
+
+
+def test_load_the_latest_artifact_trained_up_to_a_date(training_data, tmp_path):
+    X, y = training_data
+    for train_end_date in ['2025-06-08', '2025-06-10', '2025-06-09']:
+        save_model_artifact(fit(X, y), X, y, PARAMS, train_end_date=pd.Timestamp(train_end_date),
+                            artifact_dir=str(tmp_path))
+    os.makedirs(tmp_path / '2025-06-11') # an unfinished artifact, without metadata
+
+    assert list_model_artifacts(str(tmp_path)) == ['2025-06-08', '2025-06-09', '2025-06-10']
+    assert load_model_artifact('2025-06-09 23:00', str(tmp_path))[1]['train_end_date'] == '2025-06-09'
+    assert load_model_artifact(artifact_dir=str(tmp_path))[1]['train_end_date'] == '2025-06-10'
+    with pytest.raises(FileNotFoundError):
+        load_model_artifact('2025-06-07', str(tmp_path))
+    assert list_model_artifacts(str(tmp_path / 'missing')) == []
+
+
+def test_check_feature_schema_orders_the_features():
+    metadata = {'feature_names': ['a', 'b', 'c'], 'train_end_date': '2025-06-10'}
+    X = pd.DataFrame({'c': [3.0], 'a': [1.0], 'b': [2.0]})
+
+    assert list(check_feature_schema(X, metadata).columns) == ['a', 'b', 'c']
+
+
+@pytest.mark.parametrize('columns, message', [(['a', 'b'], r"missing \['c'\]"),
+                                              (['a', 'b', 'c', 'd'], r"unexpected \['d'\]")])
+def test_check_feature_schema_rejects_other_features(columns, message):
+    metadata = {'feature_names': ['a', 'b', 'c'], 'train_end_date': '2025-06-10'}
+
+    with pytest.raises(FeatureSchemaError, match=message):
+        check_feature_schema(pd.DataFrame(columns=columns), metadata)
@@ -0,0 +1,148 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from frcast.data.time_periods import get_efa_index
+from frcast.model import backtest, backtest_store
+from frcast.model.backtest_store import (BacktestConfigError, claim_shard, complete_shard, enqueue_shards,
+                                         init_run, list_completed_days, load_backtest_results,
+                                         read_day_results, release_stale_claims, write_day_results)
+
+CONFIG = {'target': 'dcl_price', 'start_date': '2025-01-15', 'end_date': '2025-01-20', 'n_trials': 1,
+          'retune_every': 3, 'lookback_days': 7, 'shard_days': 3}
+DEAD_PID = 999999
+
+
+def make_day_results(day, pred=1.0):
+    """Result rows of the six EFA blocks of a trading day."""
+    efa_index = get_efa_index(day, day)
+    return pd.DataFrame({'trading_day': day, 'efa_block': range(1, 7), 'pred': pred, 'actual': 2.0, 'naive': 3.0,
+                         'params': '{}', 'tuned': True, 'tune_seconds': 0.0, 'fit_seconds': 0.0,
+                         'predict_seconds': 0.0, 'n_train': 42, 'worker': 1}, index=efa_index)
+
+
+def queue_files(run_dir):
+    return sorted(os.listdir(os.path.join(run_dir, backtest_store.QUEUE_DIR)))
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    run_dir = str(tmp_path / 'run')
+    init_run(run_dir, CONFIG)
+    return run_dir
+
+
+def test_init_run_accepts_the_same_configuration(run_dir):
+    assert init_run(run_dir, dict(CONFIG)) == CONFIG
+
+
+def test_init_run_rejects_another_configuration(run_dir):
+    with pytest.raises(BacktestConfigError):
+        init_run(run_dir, {**CONFIG, 'n_trials': 2})
+
+
+def test_completed_days_are_listed_and_loaded(run_dir):
+    days = pd.to_datetime(['2025-01-17', '2025-01-15', '2025-01-16'])
+    for pred, day in enumerate(days):
+        write_day_results(run_dir, make_day_results(day, pred))
+
+    assert list(list_completed_days(run_dir)) == sorted(days)
+    pd.testing.assert_frame_equal(read_day_results(run_dir, days[0]),
+                                  make_day_results(days[0], 0).rename_axis('efa_start'), check_dtype=False,
+                                  check_freq=False)
+    results = load_backtest_results(run_dir, '2025-01-16', '2025-01-17')
+    assert len(results) == 2*6
+    assert sorted(results['trading_day'].unique()) == list(days[[2, 0]])
+
+
+def test_load_without_completed_days(run_dir):
+    results = load_backtest_results(run_dir)
+
+    assert results.empty
+    assert list(results.columns) == backtest_store.RESULT_COLUMNS
+
+
+def test_enqueue_skips_queued_and_claimed_shards(run_dir):
+    shards = [(pd.Timestamp('2025-01-15'), pd.Timestamp('2025-01-17')),
+              (pd.Timestamp('2025-01-18'), pd.Timestamp('2025-01-20'))]
+
+    assert enqueue_shards(run_dir, shards) == 2
+    claim_shard(run_dir)
+    assert enqueue_shards(run_dir, shards) == 0
+    assert len(queue_files(run_dir)) == 2
+
+
+def test_claim_takes_the_earliest_waiting_shard(run_dir):
+    enqueue_shards(run_dir, [(pd.Timestamp('2025-01-18'), pd.Timestamp('2025-01-20')),
+                             (pd.Timestamp('2025-01-15'), pd.Timestamp('2025-01-17'))])
+
+    claim_path, first_day, last_day = claim_shard(run_dir)
+
+    assert (first_day, last_day) == (pd.Timestamp('2025-01-15'), pd.Timestamp('2025-01-17'))
+    assert os.path.basename(claim_path) == f'2025-01-15_2025-01-17.{backtest_store._worker_id()}.claimed'
+    assert claim_shard(run_dir)[1] == pd.Timestamp('2025-01-18')
+    assert claim_shard(run_dir) is None
+
+
+def test_complete_removes_the_claim(run_dir):
+    enqueue_shards(run_dir, [(pd.Timestamp('2025-01-15'), pd.Timestamp('2025-01-17'))])
+    claim_path, _, _ = claim_shard(run_dir)
+
+    complete_shard(claim_path)
+
+    assert queue_files(run_dir) == []
+
+
+def test_release_puts_back_the_claims_of_dead_workers_of_this_host(run_dir):
+    queue_dir = os.path.join(run_dir, backtest_store.QUEUE_DIR)
+    host = backtest_store._host()
+    claims = {'2025-01-15_2025-01-17': f'{host}-{DEAD_PID}', # dead worker of this host
+              '2025-01-18_2025-01-20': f'{host}-{os.getpid()}', # running worker
+              '2025-01-21_2025-01-23': f'other-host-{DEAD_PID}'} # worker of another host, cannot be checked
+    for shard, worker in claims.items():
+        open(os.path.join(queue_dir, f'{shard}.{worker}.claimed'), 'w').close()
+
+    assert release_stale_claims(run_dir) == 1
+    assert queue_files(run_dir) == ['2025-01-15_2025-01-17.todo',
+                                    f'2025-01-18_2025-01-20.{host}-{os.getpid()}.claimed',
+                                    f'2025-01-21_2025-01-23.other-host-{DEAD_PID}.claimed']
+    assert claim_shard(run_dir)[1] == pd.Timestamp('2025-01-15')
+
+
+@pytest.fixture
+def backtest_data():
+    """Random features, target and DCL prices from the lookback to the last day of CONFIG."""
+    efa_index = get_efa_index(pd.Timestamp('2025-01-08'), pd.Timestamp(CONFIG['end_date']))
+    rng = np.random.default_rng(0)
+    X_all = pd.DataFrame(rng.normal(size=(len(efa_index), 3)), index=efa_index, columns=['a', 'b', 'c'])
+    y_all = pd.Series(rng.normal(size=len(efa_index)), index=efa_index, name='dcl_price')
+    return X_all, y_all, y_all.to_frame()
+
+
+def test_resumed_shard_runs_only_the_missing_days_with_the_block_params(run_dir, backtest_data, monkeypatch):
+    tunings = []
+
+    def tune(X_train, y_train, n_trials, n_jobs=None):
+        tunings.append(X_train.index[-1])
+        return {'n_estimators': 5, 'max_depth': 2, 'learning_rate': 0.1 + 0.1*len(tunings)}
+
+    monkeypatch.setattr(backtest, '_tune_training_window', tune)
+    first_day, last_day = pd.Timestamp('2025-01-15'), pd.Timestamp('2025-01-20')
+    assert backtest._run_shard(run_dir, CONFIG, backtest_data, first_day, last_day, n_jobs=1) == 6
+    first_params = {day: read_day_results(run_dir, day)['params'].iloc[0] for day in list_completed_days(run_dir)}
+
+    # A worker died after the first day of each tuning block
+    for day in pd.to_datetime(['2025-01-16', '2025-01-17', '2025-01-19', '2025-01-20']):
+        os.remove(backtest_store._day_path(run_dir, day))
+    assert backtest._run_shard(run_dir, CONFIG, backtest_data, first_day, last_day, n_jobs=1) == 4
+
+    assert len(tunings) == 2 # no tuning when resuming
+    assert len(list_completed_days(run_dir)) == 6
+    resumed = {day: read_day_results(run_dir, day) for day in list_completed_days(run_dir)}
+    assert {day: results['params'].iloc[0] for day, results in resumed.items()} == first_params
+    assert json.loads(first_params[pd.Timestamp('2025-01-20')])['learning_rate'] == pytest.approx(0.3)
+    assert [day for day, results in resumed.items() if results['tuned'].iloc[0]] == list(
+        pd.to_datetime(['2025-01-15', '2025-01-18']))
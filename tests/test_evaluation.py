@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from frcast.data.time_periods import get_efa_index
+from frcast.model.evaluation import ERROR_SUMS, evaluate_forecasts, get_error_sums, get_price_quantile_edges
+
+
+@pytest.fixture
+def results():
+    """Backtest-like results over two trading months, with missing actual, baseline and forecast values."""
+    efa_index = get_efa_index(pd.Timestamp('2025-01-20'), pd.Timestamp('2025-02-10'))
+    rng = np.random.default_rng(0)
+    actual = rng.gamma(2.0, 2.0, len(efa_index))
+    results = pd.DataFrame({'actual': actual,
+                            'naive': actual + rng.normal(0, 2.0, len(efa_index)),
+                            'pred': actual + rng.normal(0.3, 1.0, len(efa_index)),
+                            'other': actual + rng.normal(-0.5, 1.5, len(efa_index))}, index=efa_index)
+    results.iloc[3, 0] = np.nan # actual
+    results.iloc[10, 1] = np.nan # baseline
+    results.iloc[[20, 21], 2] = np.nan # one model only
+    return results
+
+
+def direct_metrics(results, model, rows=None):
+    """MAE, RMSE, bias and skill of one model on the rows where it, the actual and the baseline are known."""
+    rows = np.ones(len(results), dtype=bool) if rows is None else np.asarray(rows)
+    valid = rows & results[[model, 'actual', 'naive']].notna().all(axis=1).to_numpy()
+    errors = (results[model] - results['actual']).to_numpy()[valid]
+    baseline_mae = np.mean(np.abs((results['naive'] - results['actual']).to_numpy()[valid]))
+    mae = np.mean(np.abs(errors))
+    return {'n': valid.sum(), 'mae': mae, 'rmse': np.sqrt(np.mean(errors**2)), 'bias': np.mean(errors),
+            'skill': 1 - mae/baseline_mae, 'baseline_mae': baseline_mae}
+
+
+def assert_metrics(metrics_row, expected):
+    assert metrics_row['n'] == expected['n']
+    for metric in ['mae', 'rmse', 'bias', 'skill', 'baseline_mae']:
+        assert metrics_row[metric] == pytest.approx(expected[metric], rel=1e-12)
+
+
+def test_error_sums_match_the_errors(results):
+    sums = get_error_sums(results, ['pred'])
+
+    valid = results[['pred', 'actual', 'naive']].notna().all(axis=1)
+    errors = (results['pred'] - results['actual'])[valid]
+    assert list(sums.columns.get_level_values('sum')) == ERROR_SUMS
+    assert sums[('pred', 'n')].iloc[0] == valid.sum() == len(results) - 4
+    assert sums[('pred', 'abs_error')].iloc[0] == pytest.approx(errors.abs().sum())
+    assert sums[('pred', 'squared_error')].iloc[0] == pytest.approx((errors**2).sum())
+    assert sums[('pred', 'error')].iloc[0] == pytest.approx(errors.sum())
+    assert sums[('pred', 'baseline_abs_error')].iloc[0] == pytest.approx(
+        (results['naive'] - results['actual'])[valid].abs().sum())
+
+
+def test_overall_metrics_match_a_direct_calculation(results):
+    metrics = evaluate_forecasts(results, models=['pred', 'other'])
+
+    for model in ['naive', 'pred', 'other']:
+        assert_metrics(metrics.loc[model].iloc[0], direct_metrics(results, model))
+    assert metrics.loc['naive', 'skill'].iloc[0] == 0
+
+
+def test_monthly_metrics_group_by_trading_month(results):
+    metrics = evaluate_forecasts(results, by='month')
+
+    # EFA 1 of 1 February starts at 23:00 on 31 January
+    trading_month = (results.index + pd.Timedelta(hours=1)).to_period('M')
+    assert list(metrics.loc['pred'].index) == [pd.Period('2025-01'), pd.Period('2025-02')]
+    for month in metrics.loc['pred'].index:
+        assert_metrics(metrics.loc[('pred', month)], direct_metrics(results, 'pred', trading_month == month))
+
+
+def test_metrics_by_efa_block_and_price_quantile(results):
+    metrics = evaluate_forecasts(results, by=['efa_block', 'price_quantile'], price_quantiles=3)
+
+    edges = get_price_quantile_edges(results['actual'], 3)
+    efa_block = (results.index.hour + 1) % 24 // 4 + 1
+    price_quantile = np.searchsorted(edges, results['actual'].to_numpy(), side='right') + 1
+    assert metrics.attrs['price_edges'] == pytest.approx(list(edges))
+    for (block, quantile), row in metrics.loc['pred'].iterrows():
+        assert_metrics(row, direct_metrics(results, 'pred', (efa_block == block) & (price_quantile == quantile)))
+    assert metrics.loc['pred', 'n'].sum() == len(results) - 4
+
+
+def test_chunked_evaluation_matches_the_whole_frame(results):
+    whole = evaluate_forecasts(results, by=['month', 'weekday'])
+    # The January groups are split across chunks
+    chunks = [results.iloc[:50], results.iloc[50:51], results.iloc[51:]]
+
+    chunked = evaluate_forecasts(iter(chunks), by=['month', 'weekday'])
+
+    pd.testing.assert_frame_equal(chunked, whole, rtol=1e-12)
+
+
+def test_unknown_group_key(results):
+    with pytest.raises(ValueError):
+        evaluate_forecasts(results, by='season')
@@ -0,0 +1,114 @@
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from frcast.data.feature_graph import FeatureNode, get_lag_parameters, plan_features, resolve_features
+from frcast.data.time_periods import get_efa_index
+
+START_DATE, END_DATE = pd.Timestamp('2025-06-11'), pd.Timestamp('2025-06-13')
+
+
+def test_plan_features_in_dependency_order():
+    plan = plan_features(['dcl_price_lag_6', 'month', 'negative_reserve', 'dcl_price_roll_42_mean'])
+
+    assert list(plan) == ['margins', 'fr_prices', 'margins_efa', 'fr_price_lags', 'temporal']
+    # A source gets the columns of every node depending on it
+    assert plan['fr_prices'] == plan['fr_price_lags'] == ['dcl_price_lag_6', 'dcl_price_roll_42_mean']
+    assert plan['margins'] == plan['margins_efa'] == ['negative_reserve']
+
+
+def test_plan_features_with_an_unknown_feature():
+    with pytest.raises(ValueError, match = 'wind_speed'):
+        plan_features(['month', 'wind_speed'])
+
+
+def test_get_lag_parameters():
+    columns = ['dcl_price_lag_6', 'dcl_price_lag_12', 'dcl_price_roll_42_mean', 'dcl_price_roll_42_std',
+               'dcl_price_roll_84_mean', 'drl_price_week_lag_1', 'drl_price_roll_42_max']
+
+    lags, rolling, weekly = get_lag_parameters(columns, parameters_rolling = {'drl_price': {'lag': 12}})
+
+    assert lags == {'dcl_price': [6, 12]}
+    assert rolling == {'dcl_price': {'windows': [42, 84], 'stats': ['mean', 'std']},
+                       'drl_price': {'windows': [42], 'stats': ['max'], 'lag': 12}}
+    assert weekly == {'drl_price': [1]}
+
+
+@pytest.fixture
+def stub_nodes():
+    '''A small feature graph of stub nodes, with the names of the nodes that ran'''
+    calls = []
+    lock = threading.Lock()
+
+    def record(name, value):
+        with lock:
+            calls.append(name)
+        return value
+
+    def prices(request, columns):
+        return record('prices', pd.Series(np.arange(len(request['efa_index']), dtype = float),
+                                          index = request['efa_index']))
+
+    def price_features(request, columns, prices):
+        frame = pd.DataFrame({'price': prices, 'price_double': 2*prices})
+        return record('price_features', frame)
+
+    def price_lags(request, columns, prices):
+        out = request['lag_out'](columns) # written straight into the matrix when consecutive
+        values = np.column_stack([prices.shift(int(column.rsplit('_', 1)[1])) for column in columns])
+        if(out is None):
+            return record('price_lags', pd.DataFrame(values, index = prices.index, columns = columns))
+        out[:] = values
+        return record('price_lags', pd.DataFrame(out, index = prices.index, columns = columns, copy = False))
+
+    def calendar(request, columns):
+        return record('calendar', {column: getattr(request['efa_index'], column) for column in columns})
+
+    nodes = [FeatureNode('prices', prices),
+             FeatureNode('unused_source', lambda request, columns: record('unused_source', pd.DataFrame())),
+             FeatureNode('price_features', price_features, inputs = ['prices'], columns = ['price', 'price_double']),
+             FeatureNode('unused_features', lambda request, columns, unused: None, inputs = ['unused_source'],
+                         columns = ['other']),
+             FeatureNode('price_lags', price_lags, inputs = ['prices'], pattern = re.compile(r'lag_\d+')),
+             FeatureNode('calendar', calendar, columns = ['month', 'day'], integer = True)]
+    return nodes, calls
+
+
+def test_resolve_features_runs_only_the_needed_nodes(stub_nodes):
+    nodes, calls = stub_nodes
+    features = ['day', 'price_double', 'lag_1', 'lag_2', 'month', 'price_double']
+
+    X = resolve_features(features, START_DATE, END_DATE, nodes = nodes)
+
+    efa_index = get_efa_index(START_DATE, END_DATE)
+    prices = pd.Series(np.arange(len(efa_index), dtype = float), index = efa_index)
+    assert sorted(calls) == ['calendar', 'price_features', 'price_lags', 'prices']
+    assert list(X.columns) == ['day', 'price_double', 'lag_1', 'lag_2', 'month'] # requested order, once each
+    assert X.index.equals(efa_index)
+    assert X['day'].dtype == np.int8 and X['lag_1'].dtype == np.float32
+    np.testing.assert_array_equal(X['price_double'], 2*prices)
+    np.testing.assert_array_equal(X['lag_2'], prices.shift(2))
+    np.testing.assert_array_equal(X['month'], efa_index.month)
+
+
+def test_resolve_features_with_lags_that_are_not_consecutive(stub_nodes):
+    nodes, calls = stub_nodes
+
+    X = resolve_features(['lag_1', 'price', 'lag_3'], START_DATE, END_DATE, nodes = nodes, max_workers = 1)
+
+    prices = pd.Series(np.arange(len(X), dtype = float), index = X.index)
+    assert list(X.columns) == ['lag_1', 'price', 'lag_3']
+    np.testing.assert_array_equal(X['lag_1'], prices.shift(1))
+    np.testing.assert_array_equal(X['lag_3'], prices.shift(3))
+
+
+def test_resolve_no_features(stub_nodes):
+    nodes, calls = stub_nodes
+
+    X = resolve_features([], START_DATE, END_DATE, nodes = nodes)
+
+    assert calls == []
+    assert X.shape == (len(get_efa_index(START_DATE, END_DATE)), 0)
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from frcast.data.feature_matrix import FeatureMatrix
+from frcast.data.time_periods import get_efa_index
+
+EFA_INDEX = get_efa_index(pd.Timestamp('2025-06-11'), pd.Timestamp('2025-06-12'))
+
+
+@pytest.fixture
+def matrix():
+    return FeatureMatrix(EFA_INDEX, ['a', 'b', 'c', 'd'], ['month', 'working day'])
+
+
+def test_storage_dtypes_and_initial_values(matrix):
+    assert matrix.float_values.dtype == np.float32 and matrix.float_values.shape == (12, 4)
+    assert matrix.int_values.dtype == np.int8 and matrix.int_values.shape == (12, 2)
+    assert np.isnan(matrix.float_values).all()
+    assert matrix.memory_footprint() == {'rows': 12, 'columns': 6, 'bytes': 12*4*4 + 12*2, 'bytes_64bit': 12*6*8}
+
+
+def test_view_is_written_in_place(matrix):
+    view = matrix.view(['b', 'c'])
+    view[:] = 1.5
+
+    assert np.may_share_memory(view, matrix.float_values)
+    np.testing.assert_array_equal(matrix.float_values[:, 1:3], 1.5)
+    assert np.isnan(matrix.float_values[:, [0, 3]]).all()
+    # A frame over the view shares the memory too (resolve_features then skips writing it)
+    frame = pd.DataFrame(view, index = EFA_INDEX, columns = ['b', 'c'], copy = False)
+    assert np.may_share_memory(frame.to_numpy(), matrix.float_values)
+
+
+def test_view_of_columns_that_are_not_consecutive(matrix):
+    with pytest.raises(ValueError):
+        matrix.view(['a', 'c'])
+    with pytest.raises(ValueError):
+        matrix.view(['month'])
+
+
+def test_write_matches_rows_and_casts_to_float32(matrix):
+    index = EFA_INDEX[[1, 2, 5]].append(pd.DatetimeIndex(['2025-06-20 03:00'])) # last row off the grid
+    matrix.write(pd.DataFrame({'d': [1, 2, 3, 4], 'a': [0.1, np.nan, 0.3, 0.4]}, index = index))
+
+    X = matrix.to_frame()
+    np.testing.assert_array_equal(X['d'].iloc[[1, 2, 5]], [1, 2, 3])
+    np.testing.assert_array_equal(X['a'].iloc[[1, 5]], np.float32([0.1, 0.3]))
+    assert X[['a', 'd']].notna().sum().tolist() == [2, 3]
+
+
+def test_write_of_an_unknown_column(matrix):
+    with pytest.raises(KeyError):
+        matrix.write(pd.DataFrame({'e': [1.0]}, index = EFA_INDEX[:1]))
+
+
+def test_to_frame_column_order_and_dtypes(matrix):
+    matrix.write(pd.DataFrame({'c': 2.0}, index = EFA_INDEX))
+    matrix.write_int('working day', 1)
+    matrix.write_int('month', EFA_INDEX.month)
+
+    X = matrix.to_frame()
+
+    assert list(X.columns) == ['a', 'b', 'c', 'd', 'month', 'working day'] # float columns first
+    assert X.dtypes.tolist() == [np.float32]*4 + [np.int8]*2
+    assert X.index.equals(EFA_INDEX)
+    assert X['month'].tolist() == list(EFA_INDEX.month) and (X['working day'] == 1).all()
+
+
+def test_to_frame_of_float_columns_shares_the_matrix_memory():
+    matrix = FeatureMatrix(EFA_INDEX, ['a', 'b'])
+
+    X = matrix.to_frame()
+
+    assert np.may_share_memory(X.to_numpy(), matrix.float_values)
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+
+from frcast.data.time_periods import get_efa_index
+from frcast.model import incremental
+from frcast.model.artifacts import load_model_artifact, save_model_artifact
+from frcast.model.incremental import update_xgb_model
+
+PARAMS = {'n_estimators': 20, 'max_depth': 3, 'learning_rate': 0.3}
+TODAY = pd.Timestamp('2025-06-10')
+YESTERDAY = TODAY - pd.Timedelta(days=1)
+
+
+@pytest.fixture
+def training_data():
+    """Sixty days of EFA blocks up to TODAY, with a target that is a function of the features."""
+    efa_index = get_efa_index(TODAY - pd.Timedelta(days=59), TODAY)
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(len(efa_index), 3)), index=efa_index, columns=['a', 'b', 'c'])
+    y = (10*X['a'] + X['b']).rename('dcl_price')
+    return X, y
+
+
+@pytest.fixture
+def rebuilds(monkeypatch):
+    """Replaces the tuning and final fit of full rebuilds by a small fit, recording the rebuilds."""
+    calls = []
+
+    def tune(X, y, **kwargs):
+        calls.append(kwargs)
+        return 'study'
+
+    def fit_from_study(X, y, study, artifact_dir=None):
+        X, y = incremental.align_training_rows(X, y)
+        model = xgb.XGBRegressor(**PARAMS).fit(X, y)
+        save_model_artifact(model, X, y, PARAMS, cv_mae=1.0, artifact_dir=artifact_dir)
+        return model
+
+    monkeypatch.setattr(incremental, 'run_xgb_optuna_tuning', tune)
+    monkeypatch.setattr(incremental, 'train_final_xgb_model_from_study', fit_from_study)
+    return calls
+
+
+def save_previous_model(X, y, artifact_dir, last_full_rebuild=YESTERDAY, daily_mae=(), cv_mae=1.0):
+    """Yesterday's artifact, fitted on the window without today's blocks."""
+    X_previous, y_previous = X[X.index < TODAY - pd.Timedelta(hours=1)], y[y.index < TODAY - pd.Timedelta(hours=1)]
+    model = xgb.XGBRegressor(**PARAMS).fit(X_previous, y_previous)
+    save_model_artifact(model, X_previous, y_previous, PARAMS, cv_mae=cv_mae, artifact_dir=artifact_dir,
+                        extra_metadata={'last_full_rebuild': f'{last_full_rebuild:%Y-%m-%d}',
+                                        'daily_mae': list(daily_mae)})
+    return model
+
+
+def test_continue_adds_trees_to_yesterday_s_model(training_data, rebuilds, tmp_path):
+    X, y = training_data
+    previous_model = save_previous_model(X, y, str(tmp_path), last_full_rebuild=TODAY - pd.Timedelta(days=3))
+
+    model, how = update_xgb_model(X, y, mode='continue', n_new_rounds=5, artifact_dir=str(tmp_path))
+
+    assert how == 'continue' and rebuilds == []
+    assert model.get_booster().num_boosted_rounds() == previous_model.get_booster().num_boosted_rounds() + 5
+    saved_model, metadata = load_model_artifact(TODAY, str(tmp_path))
+    assert metadata['train_end_date'] == '2025-06-10' and metadata['update_mode'] == 'continue'
+    assert metadata['last_full_rebuild'] == '2025-06-07' # carried over
+    assert len(metadata['daily_mae']) == 1 # scored on today's blocks
+    np.testing.assert_array_equal(saved_model.predict(X), model.predict(X))
+
+
+def test_refresh_keeps_the_trees_and_updates_the_leaves(training_data, rebuilds, tmp_path):
+    X, y = training_data
+    previous_model = save_previous_model(X, y, str(tmp_path))
+    y = y + 5 # the leaf values must move to the new level
+
+    model, how = update_xgb_model(X, y, mode='refresh', artifact_dir=str(tmp_path))
+
+    assert how == 'refresh' and rebuilds == []
+    assert model.get_booster().num_boosted_rounds() == previous_model.get_booster().num_boosted_rounds()
+    assert np.mean(model.predict(X) - previous_model.predict(X)) > 2
+
+
+def test_rebuild_without_a_previous_model(training_data, rebuilds, tmp_path):
+    X, y = training_data
+
+    model, how = update_xgb_model(X, y, artifact_dir=str(tmp_path), n_trials=3)
+
+    assert how == 'rebuild: no previous model'
+    assert rebuilds == [{'n_trials': 3}]
+    assert load_model_artifact(TODAY, str(tmp_path))[1]['train_end_date'] == '2025-06-10'
+
+
+def test_forced_rebuild(training_data, rebuilds, tmp_path):
+    X, y = training_data
+    save_previous_model(X, y, str(tmp_path))
+
+    assert update_xgb_model(X, y, force_rebuild=True, artifact_dir=str(tmp_path))[1] == 'rebuild: forced'
+
+
+@pytest.mark.parametrize('days_since_rebuild, how', [(6, 'continue'), (7, 'rebuild: schedule')])
+def test_scheduled_rebuild(training_data, rebuilds, tmp_path, days_since_rebuild, how):
+    X, y = training_data
+    save_previous_model(X, y, str(tmp_path), last_full_rebuild=TODAY - pd.Timedelta(days=days_since_rebuild))
+
+    assert update_xgb_model(X, y, rebuild_every=7, artifact_dir=str(tmp_path))[1] == how
+
+
+@pytest.mark.parametrize('daily_mae, how', [([4.0]*6, 'rebuild: drift'), # mean MAE far above the CV MAE
+                                            ([4.0]*5, 'continue'), # fewer days than the drift window
+                                            ([0.1]*6, 'continue')])
+def test_drift_rebuild(training_data, rebuilds, tmp_path, daily_mae, how):
+    X, y = training_data
+    save_previous_model(X, y, str(tmp_path), daily_mae=daily_mae, cv_mae=1.0)
+
+    assert update_xgb_model(X, y, drift_window=7, drift_threshold=0.25, artifact_dir=str(tmp_path))[1] == how
+
+
+def test_unknown_mode(training_data, tmp_path):
+    X, y = training_data
+
+    with pytest.raises(ValueError):
+        update_xgb_model(X, y, mode='append', artifact_dir=str(tmp_path))
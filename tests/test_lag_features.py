@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from frcast.data.lag_features import EFA_BLOCK, build_lag_features, get_lag_feature_names, get_lookback_blocks
+from frcast.data.time_periods import get_efa_index
+
+EFA_INDEX = get_efa_index(pd.Timestamp('2025-03-01'), pd.Timestamp('2025-03-20'))
+PARAMETERS_LAGS = {'dcl_price': [1, 6, 12], 'drl_price': [6]}
+PARAMETERS_ROLLING = {'dcl_price': {'windows': [6, 42], 'stats': ['min', 'max', 'mean', 'std', 'median', 'sum']},
+                      'drl_price': {'windows': [12], 'stats': ['mean', 'sum'], 'lag': 1}}
+PARAMETERS_WEEKLY = {'dcl_price': [1, 3], 'drl_price': [2]}
+
+
+def make_prices(start='2025-02-10 23:00', end='2025-03-20 19:00', seed=0):
+    '''
+    FR prices with gaps: NaN values, missing blocks and a day without any price,
+    starting less than three weeks before EFA_INDEX (short of the week_lag_3 lookback)
+    '''
+    index = pd.date_range(start, end, freq = '4h')
+    rng = np.random.default_rng(seed)
+    prices = pd.DataFrame(rng.gamma(2, 3, (len(index), 2)), index = index, columns = ['dcl_price', 'drl_price'])
+    prices.iloc[rng.choice(len(index), 20, replace = False), 0] = np.nan
+    prices.loc['2025-03-09 23:00': '2025-03-10 19:00'] = np.nan # a whole day: empty 6-block windows
+    return prices.drop(prices.index[rng.choice(len(index), 15, replace = False)])
+
+
+def pandas_reference(prices, efa_index, parameters_lags, parameters_rolling, parameters_weekly):
+    '''The lag features with pandas shift and rolling (skipping NaN) on the contiguous EFA grid'''
+    history = get_lookback_blocks(parameters_lags, parameters_rolling, parameters_weekly)
+    grid = pd.date_range(efa_index[0] - history*EFA_BLOCK, efa_index[-1], freq = EFA_BLOCK)
+    prices = prices.reindex(grid)
+    features = {}
+    for parameter, lags in parameters_lags.items():
+        for lag in lags:
+            features[f'{parameter}_lag_{lag}'] = prices[parameter].shift(lag)
+    for parameter, rolling in parameters_rolling.items():
+        for window in rolling['windows']:
+            for stat in rolling['stats']:
+                windows = prices[parameter].rolling(window, min_periods = 1)
+                features[f'{parameter}_roll_{window}_{stat}'] = windows.agg(stat).shift(rolling.get('lag', 6))
+    for parameter, weeks in parameters_weekly.items():
+        for week in weeks:
+            features[f'{parameter}_week_lag_{week}'] = prices[parameter].shift(42*week)
+    return pd.DataFrame(features).loc[efa_index]
+
+
+def test_lag_features_match_pandas_shift_and_rolling():
+    prices = make_prices()
+
+    lag_df = build_lag_features(prices, EFA_INDEX, PARAMETERS_LAGS, PARAMETERS_ROLLING, PARAMETERS_WEEKLY)
+
+    reference = pandas_reference(prices, EFA_INDEX, PARAMETERS_LAGS, PARAMETERS_ROLLING, PARAMETERS_WEEKLY)
+    assert list(lag_df.columns) == get_lag_feature_names(PARAMETERS_LAGS, PARAMETERS_ROLLING, PARAMETERS_WEEKLY)
+    pd.testing.assert_frame_equal(lag_df, reference[lag_df.columns], check_freq = False, rtol = 1e-12)
+    # The lookback edges and the day without prices are covered
+    assert lag_df['dcl_price_week_lag_3'].iloc[:12].isna().all()
+    assert lag_df['dcl_price_roll_6_sum'].isna().any()
+
+
+def test_lag_features_of_prices_starting_within_the_output():
+    prices = make_prices(start = '2025-03-05 23:00')
+
+    lag_df = build_lag_features(prices, EFA_INDEX, PARAMETERS_LAGS, PARAMETERS_ROLLING, PARAMETERS_WEEKLY)
+
+    reference = pandas_reference(prices, EFA_INDEX, PARAMETERS_LAGS, PARAMETERS_ROLLING, PARAMETERS_WEEKLY)
+    pd.testing.assert_frame_equal(lag_df, reference[lag_df.columns], check_freq = False, rtol = 1e-12)
+    assert lag_df.iloc[:24].isna().all().all()
+
+
+def test_lag_features_written_into_out():
+    prices = make_prices()
+    parameters = ({'dcl_price': [6]}, {'dcl_price': {'windows': [6], 'stats': ['mean']}}, {'dcl_price': [1, 2]})
+    out = np.zeros((len(EFA_INDEX), 4), dtype = np.float32) # e.g. a view of the feature matrix
+
+    lag_df = build_lag_features(prices, EFA_INDEX, *parameters, out = out)
+
+    assert np.may_share_memory(lag_df.to_numpy(), out)
+    reference = pandas_reference(prices, EFA_INDEX, *parameters)
+    np.testing.assert_allclose(out, reference[lag_df.columns].to_numpy(), rtol = 1e-6)
+
+
+@pytest.mark.parametrize('parameters, lookback', [(({'dcl_price': [6, 12]},), 12),
+                                                  (({}, {'dcl_price': {'windows': [42], 'stats': ['mean']}}), 47),
+                                                  (({}, {'dcl_price': {'windows': [6], 'stats': ['mean'], 'lag': 1}},
+                                                    {'dcl_price': [2]}), 84)])
+def test_lookback_blocks(parameters, lookback):
+    assert get_lookback_blocks(*parameters) == lookback
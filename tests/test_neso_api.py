@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.neso_standin import make_datasets, start_server
+from frcast.data import neso_api, neso_cache
+from frcast.data.br_price import fetch_br_price_and_volume
+from frcast.data.fr_prices import FR_AUCTION_RESOURCE_ID, get_historical_fr_price
+from frcast.data.neso_api import NesoApiError, decode_records, fetch_date_range
+from frcast.data.system_demand import DEMAND_FORECAST_RESOURCE_ID, fetch_demand_forecast
+from frcast.data.system_margins import fetch_forecasted_margins
+
+DATASETS = make_datasets('2025-01-01', '2025-03-31')
+
+
+@pytest.fixture
+def standin(monkeypatch, tmp_path):
+    '''Starts a stand-in datastore (start_server arguments) that the client and the cache point at'''
+    servers = []
+
+    def start(datasets=DATASETS, **kwargs):
+        server, api_url, stats = start_server(datasets, **kwargs)
+        servers.append(server)
+        monkeypatch.setattr(neso_api, 'NESO_API_URL', api_url)
+        return stats
+
+    monkeypatch.setattr(neso_api, 'BACKOFF_FACTOR', 0)
+    monkeypatch.setattr(neso_api, '_session', None) # a new session with the patched backoff
+    monkeypatch.setattr(neso_cache, 'CACHE_DIR', str(tmp_path))
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def expected_ids(start_date, end_date):
+    '''Ids of the FR auction records from start_date to end_date (inclusive), in date order'''
+    records = DATASETS[FR_AUCTION_RESOURCE_ID]
+    query_end = f'{pd.Timestamp(end_date) + pd.Timedelta(days = 1):%Y-%m-%d}'
+    in_range = (records['deliveryStart'] >= start_date) & (records['deliveryStart'] < query_end)
+    return records.loc[in_range, '_id'].tolist()
+
+
+def fetch_fr(start_date, end_date, **kwargs):
+    return fetch_date_range(FR_AUCTION_RESOURCE_ID, 'deliveryStart', start_date, end_date, **kwargs)
+
+
+def test_windows_are_fetched_concurrently_and_merged_in_order(standin):
+    stats = standin()
+
+    records = fetch_fr('2025-01-01', '2025-03-15', window_days = 31, max_workers = 3)
+
+    assert stats['requests'] == 3 # Jan 1-31, Feb 1 - Mar 3, Mar 4-15
+    assert records['_id'].tolist() == expected_ids('2025-01-01', '2025-03-15')
+
+
+def test_typed_windows_with_a_schema(standin):
+    standin()
+    schema = {'deliveryStart': 'datetime64[ns]', 'auctionProduct': 'str', 'clearingPrice': 'float64'}
+
+    records = fetch_fr('2025-01-01', '2025-02-10', schema = schema)
+
+    assert list(records.columns) == list(schema)
+    assert records['deliveryStart'].dtype == 'datetime64[ns]'
+    assert records['deliveryStart'].is_monotonic_increasing
+    assert len(records) == len(expected_ids('2025-01-01', '2025-02-10'))
+
+
+def test_truncated_window_is_bisected(standin):
+    # About 36 FR records per day: a 5-day window is split until each part fits
+    stats = standin(row_limit = 100)
+
+    records = fetch_fr('2025-01-06', '2025-01-10', window_days = 5)
+
+    assert stats['requests'] > 1
+    assert records['_id'].tolist() == expected_ids('2025-01-06', '2025-01-10')
+
+
+def test_day_over_the_row_limit_raises(standin):
+    standin(row_limit = 10)
+
+    with pytest.raises(NesoApiError, match = 'row limit'):
+        fetch_fr('2025-01-06', '2025-01-06')
+
+
+def test_rate_limits_and_server_errors_are_retried(standin):
+    stats = standin(fail_statuses = [429, 503, 500])
+
+    records = fetch_fr('2025-01-06', '2025-01-07')
+
+    assert stats['requests'] == 4
+    assert records['_id'].tolist() == expected_ids('2025-01-06', '2025-01-07')
+
+
+def test_failure_after_all_retries_raises(standin):
+    stats = standin(fail_statuses = [502]*(neso_api.MAX_RETRIES + 1))
+
+    with pytest.raises(NesoApiError):
+        fetch_fr('2025-01-06', '2025-01-07')
+    assert stats['requests'] == neso_api.MAX_RETRIES + 1
+
+
+def test_api_error_response_raises_without_retry(standin):
+    stats = standin()
+
+    with pytest.raises(NesoApiError):
+        fetch_date_range('unknown-resource', 'deliveryStart', '2025-01-06', '2025-01-07')
+    assert stats['requests'] == 1
+
+
+@pytest.mark.parametrize('fetch', [get_historical_fr_price, fetch_br_price_and_volume, fetch_demand_forecast,
+                                   fetch_forecasted_margins])
+def test_fetchers_propagate_api_errors(standin, fetch):
+    # Every request fails: the fetchers must raise rather than return empty frames
+    standin(fail_statuses = [500]*100)
+
+    with pytest.raises(NesoApiError):
+        fetch(pd.Timestamp('2025-02-01'), pd.Timestamp('2025-02-03'))
+
+
+def test_decode_records_with_missing_values():
+    records = [{'name': 'DCL', 'start': '2025-01-01T22:00:00', 'price': '4.5', 'time': 100},
+               {'name': None, 'start': None, 'price': None, 'time': None},
+               {'price': 3, 'time': 2330}] # missing keys
+    schema = {'name': 'str', 'start': 'datetime64[ns]', 'price': 'float64', 'time': 'int64'}
+
+    decoded = decode_records(records, schema)
+
+    assert list(decoded.columns) == list(schema)
+    assert decoded['name'].iloc[0] == 'DCL' and decoded['name'].iloc[1:].isna().all()
+    assert decoded['start'].dtype == 'datetime64[ns]'
+    assert decoded['start'].iloc[0] == pd.Timestamp('2025-01-01 22:00') and decoded['start'].iloc[1:].isna().all()
+    np.testing.assert_array_equal(decoded['price'].to_numpy(), [4.5, np.nan, 3.0])
+    assert decoded['time'].dtype == 'Int64'
+    assert decoded['time'].tolist() == [100, pd.NA, 2330]
+
+
+def test_decode_records_keeps_numpy_ints_without_missing_values():
+    decoded = decode_records([{'time': 100}, {'time': 2330}], {'time': 'int64'})
+
+    assert decoded['time'].dtype == np.int64
+
+
+def test_demand_forecast_with_a_null_cardinal_point_time(standin):
+    datasets = dict(DATASETS)
+    demand = datasets[DEMAND_FORECAST_RESOURCE_ID].astype({'CP_ST_TIME': object})
+    demand.loc[demand['TARGETDATE'] == '2025-02-02', 'CP_ST_TIME'] = None
+    datasets[DEMAND_FORECAST_RESOURCE_ID] = demand
+    standin(datasets)
+
+    demand_forecast = fetch_demand_forecast(pd.Timestamp('2025-02-01'), pd.Timestamp('2025-02-03'))
+
+    assert not demand_forecast.empty
+    assert demand_forecast.index.notna().all()
@@ -0,0 +1,118 @@
+import os
+
+import pandas as pd
+import pytest
+
+from frcast.data import neso_cache
+
+RESOURCE_ID = 'test-resource'
+DATE_COLUMN = 'deliveryStart'
+
+
+class FakeDatastore:
+    '''Serves records like neso_api.fetch_date_range and records the requested date ranges'''
+
+    def __init__(self, records):
+        self.records = records
+        self.requests = []
+
+    def fetch_date_range(self, resource_id, date_column, start_date, end_date, where=None, schema=None):
+        self.requests.append((start_date, end_date))
+        days = self.records[date_column].dt.normalize()
+        return self.records[(days >= start_date) & (days <= end_date)].reset_index(drop = True)
+
+
+def make_records(start_date, end_date, price=1.0):
+    '''Six 4-hourly records per delivery day (03:00 to 23:00)'''
+    starts = pd.date_range(pd.Timestamp(start_date) + pd.Timedelta(hours = 3),
+                           pd.Timestamp(end_date) + pd.Timedelta(hours = 23), freq = '4h')
+    return pd.DataFrame({DATE_COLUMN: starts, 'clearingPrice': price})
+
+
+@pytest.fixture
+def datastore(monkeypatch):
+    datastore = FakeDatastore(make_records('2025-01-01', '2025-01-31'))
+    monkeypatch.setattr(neso_cache, 'fetch_date_range', datastore.fetch_date_range)
+    return datastore
+
+
+def fetch(cache_dir, start_date, end_date):
+    return neso_cache.fetch_cached_records(RESOURCE_ID, DATE_COLUMN, start_date, end_date, cache_dir = str(cache_dir))
+
+
+def test_miss_fetches_the_range_once_and_caches_it(datastore, tmp_path):
+    records = fetch(tmp_path, '2025-01-03', '2025-01-05')
+
+    assert datastore.requests == [(pd.Timestamp('2025-01-03'), pd.Timestamp('2025-01-05'))]
+    assert len(records) == 3*6
+    dataset_dir = neso_cache.get_dataset_cache_dir(RESOURCE_ID, cache_dir = str(tmp_path))
+    assert neso_cache.read_manifest(dataset_dir) == [[pd.Timestamp('2025-01-03'), pd.Timestamp('2025-01-05')]]
+    assert sorted(name for name in os.listdir(dataset_dir) if name.endswith('.parquet')) == [
+        'delivery_date=2025-01-03.parquet', 'delivery_date=2025-01-04.parquet', 'delivery_date=2025-01-05.parquet']
+
+
+def test_hit_reads_the_cache_without_requests(datastore, tmp_path):
+    first = fetch(tmp_path, '2025-01-03', '2025-01-05')
+    second = fetch(tmp_path, '2025-01-03', '2025-01-05')
+
+    assert len(datastore.requests) == 1
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_partial_hit_fetches_only_the_missing_days(datastore, tmp_path):
+    fetch(tmp_path, '2025-01-03', '2025-01-05')
+    records = fetch(tmp_path, '2025-01-01', '2025-01-08')
+
+    assert datastore.requests[1:] == [(pd.Timestamp('2025-01-01'), pd.Timestamp('2025-01-02')),
+                                      (pd.Timestamp('2025-01-06'), pd.Timestamp('2025-01-08'))]
+    assert len(records) == 8*6
+    assert records[DATE_COLUMN].is_monotonic_increasing
+    dataset_dir = neso_cache.get_dataset_cache_dir(RESOURCE_ID, cache_dir = str(tmp_path))
+    assert neso_cache.read_manifest(dataset_dir) == [[pd.Timestamp('2025-01-01'), pd.Timestamp('2025-01-08')]]
+
+
+def test_today_and_future_days_are_refetched(monkeypatch, tmp_path):
+    today = pd.Timestamp.now().normalize()
+    yesterday, tomorrow = today - pd.Timedelta(days = 1), today + pd.Timedelta(days = 1)
+    datastore = FakeDatastore(make_records(yesterday, tomorrow, price = 1.0))
+    monkeypatch.setattr(neso_cache, 'fetch_date_range', datastore.fetch_date_range)
+    fetch(tmp_path, yesterday, tomorrow)
+
+    # Results of today and tomorrow are revised; yesterday's are final and read from the cache
+    datastore.records = make_records(yesterday, tomorrow, price = 2.0)
+    records = fetch(tmp_path, yesterday, tomorrow)
+
+    assert datastore.requests == [(yesterday, tomorrow), (today, tomorrow)]
+    dataset_dir = neso_cache.get_dataset_cache_dir(RESOURCE_ID, cache_dir = str(tmp_path))
+    assert neso_cache.read_manifest(dataset_dir) == [[yesterday, yesterday]]
+    days = records[DATE_COLUMN].dt.normalize()
+    assert (records.loc[days == yesterday, 'clearingPrice'] == 1.0).all()
+    assert (records.loc[days >= today, 'clearingPrice'] == 2.0).all()
+    assert len(records) == 3*6
+
+
+def test_refetched_day_without_records_drops_its_stale_partition(monkeypatch, tmp_path):
+    today = pd.Timestamp.now().normalize()
+    tomorrow = today + pd.Timedelta(days = 1)
+    datastore = FakeDatastore(make_records(today, tomorrow))
+    monkeypatch.setattr(neso_cache, 'fetch_date_range', datastore.fetch_date_range)
+    fetch(tmp_path, today, tomorrow)
+
+    # Tomorrow's records are withdrawn; the earlier partition must not be served
+    datastore.records = make_records(today, today)
+    records = fetch(tmp_path, today, tomorrow)
+
+    assert len(datastore.requests) == 2
+    assert (records[DATE_COLUMN].dt.normalize() == today).all()
+    assert len(records) == 6
+    dataset_dir = neso_cache.get_dataset_cache_dir(RESOURCE_ID, cache_dir = str(tmp_path))
+    assert not os.path.exists(os.path.join(dataset_dir, f'delivery_date={tomorrow:%Y-%m-%d}.parquet'))
+
+
+def test_empty_range_returns_an_empty_frame(datastore, tmp_path):
+    records = fetch(tmp_path, '2025-03-01', '2025-03-02')
+
+    assert records.empty
+    assert len(datastore.requests) == 1
+    assert fetch(tmp_path, '2025-03-01', '2025-03-02').empty
+    assert len(datastore.requests) == 1 # past days without records are final too
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.bench_auction_pivot import SERVICES, reference_pivot
+from frcast.data.preprocessing import aggregate_sp_to_efa, pivot_auction_results
+
+PANDAS_STATISTICS = ['min', 'max', 'mean', 'median', 'sum', 'std', 'var', 'count', 'first', 'last']
+
+
+def local_settlement_periods(start, end):
+    '''Tz-naive local start times of the settlement periods between start and end (EFA 1 to EFA 6)'''
+    return pd.date_range(pd.Timestamp(start, tz = 'Europe/London'), pd.Timestamp(end, tz = 'Europe/London'),
+                         freq = '30min', inclusive = 'left').tz_localize(None)
+
+
+def make_series(index, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(100, 20, (len(index), 2))
+    values[5, 1] = np.nan
+    return pd.DataFrame(values, index = index, columns = ['price', 'volume'])
+
+
+def assert_matches_resample(agg_df, df):
+    '''Checks the pandas statistics against pandas resampling (count comes out as float)'''
+    reference = df.resample('4h', origin = 'start').agg(PANDAS_STATISTICS)
+    reference.columns = ['_'.join(column).lower() for column in reference.columns]
+    pd.testing.assert_frame_equal(agg_df[reference.columns], reference, check_freq = False, check_dtype = False)
+
+
+def test_regular_day_matches_resample():
+    df = make_series(local_settlement_periods('2025-06-11 23:00', '2025-06-12 23:00'))
+
+    agg_df = aggregate_sp_to_efa(df, PANDAS_STATISTICS)
+
+    assert len(agg_df) == 6
+    assert_matches_resample(agg_df, df)
+
+
+def test_short_day_has_two_empty_periods_in_efa_1():
+    # 2025-03-30: clocks go forward at 01:00, local 01:00 and 01:30 do not exist
+    df = make_series(local_settlement_periods('2025-03-29 23:00', '2025-03-30 23:00'))
+
+    agg_df = aggregate_sp_to_efa(df, PANDAS_STATISTICS)
+
+    assert len(df) == 46
+    assert list(agg_df.index) == list(pd.date_range('2025-03-29 23:00', '2025-03-30 19:00', freq = '4h'))
+    assert agg_df['price_count'].tolist() == [6, 8, 8, 8, 8, 8]
+    assert_matches_resample(agg_df, df)
+
+
+def test_long_day_aggregates_both_repeated_periods_in_efa_1():
+    # 2025-10-26: clocks go back at 02:00, local 01:00 and 01:30 occur twice
+    df = make_series(local_settlement_periods('2025-10-25 23:00', '2025-10-26 23:00'))
+
+    agg_df = aggregate_sp_to_efa(df, PANDAS_STATISTICS + ['ramp', 'q90'])
+
+    assert len(df) == 50
+    assert list(agg_df.index) == list(pd.date_range('2025-10-25 23:00', '2025-10-26 19:00', freq = '4h'))
+    assert agg_df['price_count'].tolist() == [10, 8, 8, 8, 8, 8]
+    assert_matches_resample(agg_df, df)
+    efa_1 = df['price'].iloc[:10]
+    assert agg_df['price_ramp'].iloc[0] == pytest.approx(efa_1.iloc[-1] - efa_1.iloc[0])
+    assert agg_df['price_q90'].iloc[0] == pytest.approx(efa_1.quantile(0.9))
+
+
+def test_columns_selects_the_computed_aggregates():
+    df = make_series(local_settlement_periods('2025-03-29 23:00', '2025-03-31 23:00'))
+
+    agg_df = aggregate_sp_to_efa(df, ['min', 'mean'], columns = ['volume_mean', 'price_min'])
+
+    assert sorted(agg_df.columns) == ['price_min', 'volume_mean']
+    assert len(agg_df) == 12
+
+
+def test_empty_frame():
+    assert aggregate_sp_to_efa(pd.DataFrame(), ['mean']).empty
+
+
+def auction_records(start, end, service, seed=0):
+    '''
+    Auction results of every delivery period between the local times start and end, with UTC
+    delivery starts, followed by duplicated records (price -1) that the pivot must drop
+    '''
+    products, freq = SERVICES[service]
+    periods = pd.date_range(pd.Timestamp(start, tz = 'Europe/London'), pd.Timestamp(end, tz = 'Europe/London'),
+                            freq = '30min', inclusive = 'left')
+    local = periods.tz_localize(None)
+    on_grid = (local - local.normalize() + pd.Timedelta(hours = 1)) % pd.Timedelta(freq) == pd.Timedelta(0)
+    utc_starts = periods[on_grid].tz_convert('UTC').tz_localize(None)
+    rng = np.random.default_rng(seed)
+    records = pd.DataFrame({'delivery_start': np.repeat(utc_starts.to_numpy(), len(products)),
+                            'auction_product': np.tile(products, len(utc_starts)),
+                            'clearing_price': rng.gamma(2, 2, len(utc_starts)*len(products)).round(2),
+                            'cleared_volume': rng.integers(0, 500, len(utc_starts)*len(products)).astype(float)})
+    records['delivery_end'] = records['delivery_start'] + pd.Timedelta(freq)
+    duplicates = records.sample(frac = 0.2, random_state = seed).assign(clearing_price = -1.0)
+    return pd.concat([records, duplicates], ignore_index = True)
+
+
+@pytest.mark.parametrize('service', ['fr', 'br'])
+@pytest.mark.parametrize('start, end, n_periods', [('2025-03-29 23:00', '2025-03-30 23:00', 46),
+                                                   ('2025-10-25 23:00', '2025-10-26 23:00', 50),
+                                                   ('2025-03-28 23:00', '2025-04-01 23:00', 4*48 - 2)])
+def test_auction_pivot_matches_the_previous_implementation(service, start, end, n_periods):
+    records = auction_records(start, end, service)
+
+    pivoted = pivot_auction_results(records, ('price', 'volume'), SERVICES[service][1])
+
+    if(service == 'br'): # settlement periods of the clock-change days (the repeated hour is a duplicate)
+        assert records['delivery_start'].nunique() == n_periods
+    for value in ('price', 'volume'):
+        pd.testing.assert_frame_equal(pivoted[value], reference_pivot(records, value), check_freq = False)
+    assert (pivoted['price'] != -1).all().all() # the first record wins
+
+
+def test_auction_pivot_leaves_out_records_without_start_or_product():
+    records = auction_records('2025-10-25 23:00', '2025-10-27 23:00', 'fr')
+    unplaced = records.iloc[[0, 7, 40]].copy()
+    unplaced.iloc[0, unplaced.columns.get_loc('auction_product')] = None
+    unplaced.iloc[1, unplaced.columns.get_loc('auction_product')] = np.nan
+    unplaced.iloc[2, unplaced.columns.get_loc('delivery_start')] = pd.NaT
+    # Placed first, they would win their cell if they were not dropped
+    with_unplaced = pd.concat([unplaced.assign(clearing_price = -2.0), records], ignore_index = True)
+
+    pivoted = pivot_auction_results(with_unplaced, ('price',))
+
+    pd.testing.assert_frame_equal(pivoted['price'], reference_pivot(records, 'price'), check_freq = False)
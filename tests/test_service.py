@@ -0,0 +1,145 @@
+import asyncio
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+
+from frcast import service as service_module
+from frcast.data.time_periods import get_efa_index
+from frcast.model.artifacts import save_model_artifact
+from frcast.service import ForecastService
+
+TOMORROW = pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+
+
+def save_model(artifact_dir, train_end_date, offset):
+    """A model predicting a + offset, saved as trained up to train_end_date."""
+    efa_index = get_efa_index(pd.Timestamp('2025-01-01'), pd.Timestamp('2025-01-31'))
+    X = pd.DataFrame({'a': np.arange(len(efa_index)) % 7, 'b': 0.0}, index=efa_index)
+    y = (X['a'] + offset).rename('dcl_price')
+    model = xgb.XGBRegressor(n_estimators=20, max_depth=3).fit(X, y)
+    save_model_artifact(model, X, y, {}, train_end_date=train_end_date, artifact_dir=artifact_dir)
+
+
+class FeatureSource:
+    """Stub prediction features (a = number of the build) whose first build can be held back."""
+
+    def __init__(self, hold_first=False):
+        self.builds = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not hold_first:
+            self.release.set()
+
+    def __call__(self, start_date, end_date=None, features=None):
+        self.builds += 1
+        build = self.builds
+        self.started.set()
+        if build == 1:
+            self.release.wait(10)
+        efa_index = get_efa_index(start_date, end_date)
+        return pd.DataFrame({'a': float(build), 'b': 0.0}, index=efa_index)[features]
+
+
+@pytest.fixture
+def artifact_dir(tmp_path):
+    save_model(str(tmp_path), '2025-06-10', offset=100)
+    save_model(str(tmp_path), '2025-06-12', offset=200)
+    return str(tmp_path)
+
+
+def make_service(artifact_dir, monkeypatch, features):
+    monkeypatch.setattr(service_module, 'get_prediction_features_df', features)
+    service = ForecastService(artifact_dir, prefetch_days=0)
+    service.load_latest_model()
+    return service
+
+
+def decode(response):
+    return json.loads(response.decode('utf-8'))
+
+
+async def wait_until(condition):
+    for _ in range(1000):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise TimeoutError
+
+
+def test_concurrent_requests_share_one_build(artifact_dir, monkeypatch):
+    features = FeatureSource(hold_first=True)
+    service = make_service(artifact_dir, monkeypatch, features)
+
+    async def requests():
+        first = asyncio.ensure_future(service.forecast(TOMORROW))
+        second = asyncio.ensure_future(service.forecast(TOMORROW))
+        await wait_until(lambda: service.stats['coalesced'] == 1)
+        features.release.set()
+        return await first, await second, await service.forecast(TOMORROW)
+
+    first, second, cached = asyncio.run(requests())
+
+    assert first == second == cached
+    assert features.builds == 1
+    assert service.stats['response_cache_hits'] == 1
+    assert len(decode(first)['efa_blocks']) == 6
+
+
+def test_refresh_during_a_build_drops_its_results(artifact_dir, monkeypatch):
+    features = FeatureSource(hold_first=True)
+    service = make_service(artifact_dir, monkeypatch, features)
+
+    async def requests():
+        stale = asyncio.ensure_future(service.forecast(TOMORROW))
+        await asyncio.to_thread(features.started.wait, 10)
+        await service.refresh()
+        fresh = await service.forecast(TOMORROW) # does not join the build the refresh overtook
+        features.release.set()
+        return await stale, fresh, await service.forecast(TOMORROW)
+
+    stale, fresh, cached = asyncio.run(requests())
+
+    assert features.builds == 2
+    assert stale != fresh
+    assert cached == fresh # not overwritten by the stale response
+    assert service.stats['coalesced'] == 0
+    model_date = service.model_date
+    np.testing.assert_array_equal(service._features[(model_date, TOMORROW)]['a'], 2.0)
+
+
+def test_refresh_drops_the_cached_responses_of_coming_days(artifact_dir, monkeypatch):
+    features = FeatureSource()
+    service = make_service(artifact_dir, monkeypatch, features)
+
+    async def requests():
+        await service.forecast(TOMORROW)
+        await service.refresh()
+        return await service.forecast(TOMORROW)
+
+    asyncio.run(requests())
+
+    assert features.builds == 2
+    assert service.stats['response_cache_hits'] == 0
+
+
+def test_past_days_use_the_model_trained_before_them(artifact_dir, monkeypatch):
+    service = make_service(artifact_dir, monkeypatch, FeatureSource())
+
+    async def requests():
+        return {day: await service.handle_request('GET', f'/forecast?date={day}')
+                for day in ['2025-06-13', '2025-06-12', '2025-06-11', '2025-06-10']}
+
+    responses = asyncio.run(requests())
+
+    assert service.model_date == '2025-06-12'
+    assert [status for status, _ in responses.values()] == [200, 200, 200, 404]
+    model_dates = {day: decode(body)['model_train_end_date'] for day, (status, body) in responses.items()
+                   if status == 200}
+    assert model_dates == {'2025-06-13': '2025-06-12', '2025-06-12': '2025-06-10', '2025-06-11': '2025-06-10'}
+    prediction = decode(responses['2025-06-12'][1])['efa_blocks'][0]['pred']
+    assert 100 < prediction < 150 # the model predicting a + 100, not the newest one (a + 200)
+    assert list(service._past_models) == ['2025-06-10'] # loaded once
@@ -0,0 +1,104 @@
+import numpy as np
+import optuna
+import pandas as pd
+import pytest
+
+from frcast.data.time_periods import get_efa_index
+from frcast.model.studies import (enqueue_warm_start_trials, find_previous_study, get_best_params_history,
+                                  get_study_name, get_study_storage)
+from frcast.model.train import run_xgb_optuna_tuning
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return get_study_storage(str(tmp_path / 'studies' / 'optuna.db'))
+
+
+def add_study(storage, name, values):
+    """A stored study with one completed trial of parameter x per value (and a pruned one)."""
+    study = optuna.create_study(storage=storage, study_name=name)
+    for value in values:
+        study.add_trial(optuna.trial.create_trial(params={'x': value}, value=value,
+                                                  distributions={'x': optuna.distributions.FloatDistribution(0, 10)}))
+    study.add_trial(optuna.trial.create_trial(params={'x': 0.0}, state=optuna.trial.TrialState.PRUNED,
+                                              distributions={'x': optuna.distributions.FloatDistribution(0, 10)}))
+    return study
+
+
+def test_study_storage_and_names(storage, tmp_path):
+    assert storage == f'sqlite:///{tmp_path}/studies/optuna.db'
+    assert (tmp_path / 'studies').is_dir()
+    assert get_study_name(pd.Timestamp('2025-06-12 19:00')) == 'xgb_dcl_2025-06-12'
+    assert get_study_name('2025-06-12', prefix='xgb_all') == 'xgb_all_2025-06-12'
+
+
+def test_find_previous_study(storage):
+    for name in ['xgb_dcl_2025-06-09', 'xgb_dcl_2025-06-11', 'xgb_all_2025-06-12', 'xgb_dcl_2025-06-13']:
+        add_study(storage, name, [1.0])
+
+    assert find_previous_study(storage, 'xgb_dcl_2025-06-13').study_name == 'xgb_dcl_2025-06-11'
+    assert find_previous_study(storage, 'xgb_dcl_2025-06-11').study_name == 'xgb_dcl_2025-06-09'
+    assert find_previous_study(storage, 'xgb_dcl_2025-06-09') is None
+    assert find_previous_study(storage, 'xgb_all_2025-06-14', prefix='xgb_all').study_name == 'xgb_all_2025-06-12'
+
+
+def test_enqueue_the_best_completed_trials(storage):
+    previous_study = add_study(storage, 'xgb_dcl_2025-06-11', [5.0, 2.0, 7.0, 3.0])
+    study = optuna.create_study(storage=storage, study_name='xgb_dcl_2025-06-12')
+
+    assert enqueue_warm_start_trials(study, previous_study, top_k=3) == 3
+    waiting = study.get_trials(states=[optuna.trial.TrialState.WAITING])
+    assert [trial.system_attrs['fixed_params'] for trial in waiting] == [{'x': 2.0}, {'x': 3.0}, {'x': 5.0}]
+    assert all(trial.user_attrs['warm_start_from'] == 'xgb_dcl_2025-06-11' for trial in waiting)
+    assert enqueue_warm_start_trials(optuna.create_study(), previous_study, top_k=10) == 4 # not the pruned one
+
+
+def test_best_params_history(storage):
+    add_study(storage, 'xgb_dcl_2025-06-12', [4.0, 1.5])
+    add_study(storage, 'xgb_dcl_2025-06-11', [2.5])
+    add_study(storage, 'xgb_all_2025-06-11', [0.5])
+
+    history = get_best_params_history(storage)
+
+    assert list(history.index) == ['xgb_dcl_2025-06-11', 'xgb_dcl_2025-06-12']
+    assert history['best_value'].tolist() == [2.5, 1.5] and history['x'].tolist() == [2.5, 1.5]
+    assert history['n_trials'].tolist() == [2, 3]
+
+
+@pytest.fixture
+def daily_windows():
+    """Features and target of two consecutive daily training windows."""
+    efa_index = get_efa_index(pd.Timestamp('2024-06-01'), pd.Timestamp('2025-06-12'))
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(len(efa_index), 3)), index=efa_index, columns=['a', 'b', 'c'])
+    y = (10*X['a'] + X['b']).rename('dcl_price')
+    return (X.iloc[:-6], y.iloc[:-6]), (X.iloc[6:], y.iloc[6:])
+
+
+@pytest.mark.parametrize('warm_start_tolerance, n_trials', [(10.0, 2), # competitive: min_trials
+                                                            (-1.0, 3)]) # never competitive: n_trials
+def test_daily_study_warm_starts_from_the_previous_day(storage, daily_windows, warm_start_tolerance, n_trials):
+    (X_previous, y_previous), (X, y) = daily_windows
+    tuning = {'storage': storage, 'pruner': None, 'early_stopping_rounds': 5, 'n_jobs': 1}
+    previous_study = run_xgb_optuna_tuning(X_previous, y_previous, n_trials=2, **tuning)
+
+    study = run_xgb_optuna_tuning(X, y, n_trials=3, warm_start_top_k=2, min_trials=2,
+                                  warm_start_tolerance=warm_start_tolerance, **tuning)
+
+    assert (previous_study.study_name, study.study_name) == ('xgb_dcl_2025-06-11', 'xgb_dcl_2025-06-12')
+    assert len(study.trials) == n_trials and study.user_attrs['trial_budget'] == n_trials
+    warm_trials = study.trials[:2]
+    assert [trial.params for trial in warm_trials] == [trial.params for trial in
+                                                       sorted(previous_study.trials, key=lambda trial: trial.value)]
+    assert all(trial.user_attrs['warm_start_from'] == 'xgb_dcl_2025-06-11' for trial in warm_trials)
+
+
+def test_stored_study_is_resumed(storage, daily_windows):
+    _, (X, y) = daily_windows
+    tuning = {'storage': storage, 'pruner': None, 'early_stopping_rounds': 5, 'n_jobs': 1}
+    run_xgb_optuna_tuning(X, y, n_trials=1, **tuning)
+
+    study = run_xgb_optuna_tuning(X, y, n_trials=2, **tuning)
+
+    assert len(optuna.study.get_all_study_names(storage)) == 1
+    assert len(study.trials) == 2 # one more trial, not two
@@ -0,0 +1,169 @@
+import numpy as np
+import optuna
+import pandas as pd
+import pytest
+
+from frcast.data.time_periods import get_efa_index
+from frcast.model import train
+from frcast.model.train import (align_training_rows, evaluate_xgb_trial, generate_time_series_splits,
+                                get_best_params, get_pruner, get_thread_budget, run_xgb_optuna_tuning)
+
+FIXED_PARAMS = {'n_estimators': 300, 'max_depth': 3, 'learning_rate': 0.3, 'subsample': 1.0,
+                'colsample_bytree': 1.0, 'gamma': 0.0, 'reg_alpha': 0.0, 'reg_lambda': 1.0}
+# Too few, too small steps: far from the target after every fold
+UNDERFIT_PARAMS = {**FIXED_PARAMS, 'n_estimators': 100, 'learning_rate': 0.01}
+
+
+@pytest.fixture
+def training_data():
+    """A year and a half of EFA blocks with a target that is a simple function of the features."""
+    efa_index = get_efa_index(pd.Timestamp('2024-01-01'), pd.Timestamp('2025-06-30'))
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(len(efa_index), 3)), index=efa_index, columns=['a', 'b', 'c'])
+    y = (10*X['a'] + X['b']).rename('dcl_price')
+    return X, y
+
+
+def with_gap(y):
+    """The target without two weeks of blocks (e.g. missing auctions), like the FR prices of a training window."""
+    return y.drop(y.index[1000:1084])
+
+
+def test_align_training_rows_drops_blocks_without_labels(training_data):
+    X, y = training_data
+    y = with_gap(y)
+    y.iloc[5] = np.nan
+
+    X_aligned, y_aligned = align_training_rows(X, y.iloc[::-1]) # any order
+
+    assert len(X_aligned) == len(y_aligned) == len(X) - 84 - 1
+    assert X_aligned.index.equals(y_aligned.index)
+    pd.testing.assert_series_equal(y_aligned, (10*X_aligned['a'] + X_aligned['b']).rename('dcl_price'))
+
+
+def test_align_training_rows_of_several_targets(training_data):
+    X, y = training_data
+    Y = pd.DataFrame({'dcl_price': y, 'dch_price': y.where(y.index != y.index[7])})
+
+    X_aligned, Y_aligned = align_training_rows(X, Y)
+
+    assert len(X_aligned) == len(Y_aligned) == len(X) - 1
+    assert y.index[7] not in X_aligned.index
+
+
+@pytest.fixture
+def fixed_first_trial(monkeypatch):
+    """Studies start with the FIXED_PARAMS trial rather than a random one."""
+    create_study = optuna.create_study
+
+    def create_fixed_study(*args, **kwargs):
+        study = create_study(*args, **kwargs)
+        study.enqueue_trial(FIXED_PARAMS)
+        return study
+
+    monkeypatch.setattr(train.optuna, 'create_study', create_fixed_study)
+
+
+def test_tuning_with_a_gap_in_the_target(training_data, fixed_first_trial):
+    X, y = training_data
+
+    study = run_xgb_optuna_tuning(X, with_gap(y), n_trials=2, pruner=None, n_jobs=1) # the fixed trial counts
+
+    # Labels matching their feature rows: the target is learned (misaligned rows would give an MAE near 8)
+    assert study.best_value < 2
+
+
+def run_trials(X, y, trials, pruner, early_stopping_rounds=50, n_fold_workers=1):
+    """A study evaluating the given parameter sets in order, with the given pruner."""
+    splits = generate_time_series_splits(X, y)
+    study = optuna.create_study(direction='minimize', pruner=get_pruner(pruner, len(splits)))
+    for params in trials:
+        study.enqueue_trial(params)
+    study.optimize(lambda trial: evaluate_xgb_trial(trial, X, y, splits, early_stopping_rounds, n_fold_workers,
+                                                    n_jobs=1),
+                   n_trials=len(trials))
+    return study
+
+
+def test_unpromising_trial_is_pruned_after_its_first_fold(training_data):
+    X, y = training_data
+
+    study = run_trials(X, y, [FIXED_PARAMS, UNDERFIT_PARAMS], optuna.pruners.MedianPruner(n_startup_trials=1))
+
+    completed, underfit = study.trials
+    assert completed.state == optuna.trial.TrialState.COMPLETE and len(completed.intermediate_values) == 3
+    assert underfit.state == optuna.trial.TrialState.PRUNED
+    assert list(underfit.intermediate_values) == [0] # stopped after the first fold
+
+
+def test_every_fold_runs_without_a_pruner(training_data):
+    X, y = training_data
+
+    study = run_trials(X, y, [FIXED_PARAMS, UNDERFIT_PARAMS], None)
+
+    assert [trial.state for trial in study.trials] == [optuna.trial.TrialState.COMPLETE]*2
+    assert study.trials[1].value == study.trials[1].intermediate_values[2] # running mean over the folds
+
+
+def test_early_stopping_sets_the_boosting_rounds(training_data):
+    X, y = training_data
+
+    study = run_trials(X, y, [{**FIXED_PARAMS, 'n_estimators': 1000}], None, early_stopping_rounds=5)
+
+    best_n_estimators = study.best_trial.user_attrs['best_n_estimators']
+    assert 0 < best_n_estimators < 1000
+    assert get_best_params(study)['n_estimators'] == best_n_estimators
+
+
+@pytest.mark.parametrize('pruner, pruner_type', [('median', optuna.pruners.MedianPruner),
+                                                 ('hyperband', optuna.pruners.HyperbandPruner),
+                                                 (None, optuna.pruners.NopPruner),
+                                                 ('none', optuna.pruners.NopPruner)])
+def test_get_pruner(pruner, pruner_type):
+    assert isinstance(get_pruner(pruner, 3), pruner_type)
+
+
+def test_get_unknown_pruner():
+    with pytest.raises(ValueError):
+        get_pruner('percentile', 3)
+
+
+@pytest.mark.parametrize('n_workers, n_fold_workers, n_cpus, n_jobs', [(1, 1, 8, 8), (2, 1, 8, 4), (2, 2, 8, 2),
+                                                                       (3, 1, 8, 2), (4, 4, 8, 1), (1, 3, 1, 1)])
+def test_thread_budget_splits_the_cores(n_workers, n_fold_workers, n_cpus, n_jobs):
+    assert get_thread_budget(n_workers, n_fold_workers, n_cpus) == n_jobs
+
+
+def test_thread_budget_of_the_process_cores(monkeypatch):
+    monkeypatch.setattr(train.os, 'sched_getaffinity', lambda pid: {0, 1, 2, 3, 4, 5}, raising=False)
+
+    assert get_thread_budget(2) == 3
+
+
+def test_concurrent_folds_give_the_sequential_score(training_data):
+    X, y = training_data
+
+    sequential = run_trials(X, y, [FIXED_PARAMS], None)
+    concurrent = run_trials(X, y, [FIXED_PARAMS], None, n_fold_workers=3)
+
+    assert concurrent.best_value == sequential.best_value
+    assert concurrent.best_trial.intermediate_values == sequential.best_trial.intermediate_values
+    assert concurrent.best_trial.user_attrs == sequential.best_trial.user_attrs
+
+
+def test_concurrent_trials_share_the_thread_budget(training_data, monkeypatch):
+    X, y = training_data
+    threads = []
+    fit_fold = train._fit_fold
+
+    def recording_fit_fold(params, *args):
+        threads.append(params['nthread'])
+        return fit_fold(params, *args)
+
+    monkeypatch.setattr(train, '_fit_fold', recording_fit_fold)
+
+    study = run_xgb_optuna_tuning(X, y, n_trials=3, pruner=None, early_stopping_rounds=5, n_workers=2,
+                                  n_fold_workers=2, n_jobs=4)
+
+    assert [trial.state for trial in study.trials] == [optuna.trial.TrialState.COMPLETE]*3
+    assert threads == [1]*9 # 4 cores for 2 trials x 2 folds at a time
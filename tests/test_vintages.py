@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+from frcast.data.vintages import build_vintage_table, get_decision_times, lookup_as_of
+
+
+def local_half_hours(start, end):
+    '''Tz-naive local start times of the settlement periods between start and end, as published by NESO'''
+    return pd.date_range(pd.Timestamp(start, tz = 'Europe/London'), pd.Timestamp(end, tz = 'Europe/London'),
+                         freq = '30min', inclusive = 'left').tz_localize(None)
+
+
+def make_vintages(rows):
+    '''Vintage table from (target_time, publish_time, value) rows'''
+    rows = pd.DataFrame(rows, columns = ['target_time', 'publish_time', 'value'])
+    return build_vintage_table(pd.to_datetime(rows['target_time']), pd.to_datetime(rows['publish_time']),
+                               rows[['value']])
+
+
+def test_decision_time_is_9am_the_day_before_the_trading_day():
+    target_times = pd.DatetimeIndex(['2025-06-11 22:30', '2025-06-11 23:00', '2025-06-12 00:00',
+                                     '2025-06-12 22:30', '2025-06-12 23:00'])
+
+    decision_times = get_decision_times(target_times)
+
+    assert list(decision_times) == list(pd.DatetimeIndex(['2025-06-10 09:00', '2025-06-11 09:00', '2025-06-11 09:00',
+                                                          '2025-06-11 09:00', '2025-06-12 09:00']))
+
+
+def test_as_of_caps_the_decision_times():
+    target_times = pd.DatetimeIndex(['2025-06-11 23:00', '2025-06-12 23:00', '2025-06-13 23:00'])
+
+    decision_times = get_decision_times(target_times, as_of = '2025-06-12 12:00')
+
+    assert list(decision_times) == list(pd.DatetimeIndex(['2025-06-11 09:00', '2025-06-12 09:00', '2025-06-12 12:00']))
+
+
+def test_short_day_periods_share_one_decision_time():
+    # 2025-03-30: clocks go forward at 01:00, the trading day has 46 settlement periods
+    target_times = local_half_hours('2025-03-29 23:00', '2025-03-30 23:00')
+
+    decision_times = get_decision_times(target_times)
+
+    assert len(target_times) == 46
+    assert (decision_times == pd.Timestamp('2025-03-29 09:00')).all()
+    assert get_decision_times([pd.Timestamp('2025-03-30 23:00')])[0] == pd.Timestamp('2025-03-30 09:00')
+
+
+def test_long_day_periods_share_one_decision_time():
+    # 2025-10-26: clocks go back at 02:00, 01:00 to 01:30 occur twice on a trading day of 50 settlement periods
+    target_times = local_half_hours('2025-10-25 23:00', '2025-10-26 23:00')
+
+    decision_times = get_decision_times(target_times)
+
+    assert len(target_times) == 50
+    assert target_times.duplicated().sum() == 2
+    assert (decision_times == pd.Timestamp('2025-10-25 09:00')).all()
+    assert get_decision_times([pd.Timestamp('2025-10-26 23:00')])[0] == pd.Timestamp('2025-10-26 09:00')
+
+
+def test_lookup_returns_the_latest_vintage_published_by_the_decision_time():
+    vintages = make_vintages([
+        ('2025-06-12 00:00', '2025-06-10 12:00', 1.0),
+        ('2025-06-12 00:00', '2025-06-11 09:00', 2.0), # published at the decision time: usable
+        ('2025-06-12 00:00', '2025-06-11 12:00', 3.0), # published after the decision time
+        ('2025-06-13 00:00', '2025-06-11 12:00', 4.0),
+        ('2025-06-13 00:00', '2025-06-12 08:00', 5.0),
+    ])
+    target_times = pd.DatetimeIndex(['2025-06-12 00:00', '2025-06-13 00:00'])
+
+    as_of_values = lookup_as_of(vintages, target_times, get_decision_times(target_times))
+
+    assert list(as_of_values.index) == list(target_times)
+    assert as_of_values['value'].tolist() == [2.0, 5.0]
+    assert list(as_of_values['publish_time']) == list(pd.DatetimeIndex(['2025-06-11 09:00', '2025-06-12 08:00']))
+
+
+def test_lookup_takes_the_last_revision_of_one_publish_time():
+    vintages = make_vintages([
+        ('2025-06-12 00:00', '2025-06-10 12:00', 1.0),
+        ('2025-06-12 00:00', '2025-06-10 12:00', 1.5),
+    ])
+
+    as_of_values = lookup_as_of(vintages, pd.DatetimeIndex(['2025-06-12 00:00']), [pd.Timestamp('2025-06-11 09:00')])
+
+    assert as_of_values['value'].tolist() == [1.5]
+
+
+def test_lookup_is_nan_when_nothing_was_published_in_time():
+    vintages = make_vintages([
+        ('2025-06-12 00:00', '2025-06-11 12:00', 1.0),
+        ('2025-06-13 00:00', '2025-06-10 12:00', 2.0),
+    ])
+    # Published too late, and a target without any vintage
+    target_times = pd.DatetimeIndex(['2025-06-12 00:00', '2025-06-14 00:00'])
+
+    as_of_values = lookup_as_of(vintages, target_times, get_decision_times(target_times))
+
+    assert as_of_values['value'].isna().all()
+    assert as_of_values['publish_time'].isna().all()
+
+
+def test_lookup_on_clock_change_days():
+    short_day = local_half_hours('2025-03-29 23:00', '2025-03-30 23:00')
+    long_day = local_half_hours('2025-10-25 23:00', '2025-10-26 23:00')
+    target_times = short_day.append(long_day)
+    rows = ([(time, '2025-03-28 12:00', 1.0) for time in short_day]
+            + [(time, '2025-03-29 08:00', 2.0) for time in short_day]
+            + [(time, '2025-03-29 10:00', 3.0) for time in short_day] # after the decision time
+            + [(time, '2025-10-25 08:00', 4.0) for time in long_day])
+    vintages = make_vintages(rows)
+
+    as_of_values = lookup_as_of(vintages, target_times, get_decision_times(target_times))
+
+    assert len(as_of_values) == 46 + 50
+    np.testing.assert_array_equal(as_of_values['value'].to_numpy(), [2.0]*46 + [4.0]*50)
+
+
+def test_lookup_on_an_empty_table():
+    vintages = make_vintages([])
+    target_times = pd.DatetimeIndex(['2025-06-12 00:00', '2025-06-13 00:00'])
+
+    as_of_values = lookup_as_of(vintages, target_times, get_decision_times(target_times))
+
+    assert list(as_of_values.index) == list(target_times)
+    assert as_of_values['value'].isna().all()